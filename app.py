@@ -1,13 +1,34 @@
-
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
+import cash_store
+import cash_profiler
+import cash_engine
+import cash_metrics
+import cash_optimizer
+import cash_cube
+import cash_daily
+import cash_drilldown
+import cash_ledger
+import cash_daily_store
+import cash_rollup
+import cash_sample
+import cash_parallel
+import cash_service
+import cash_snapshot
 
 # --- 共通設定 ---
 st.set_page_config(layout="wide")
+cash_engine.setup_fonts()
 st.title("キャッシュ生産性 × 現金増減 × 資金ショート予測アプリ")
-mode = st.radio("モード選択", ["CSVファイルから分析", "月別手入力で分析"])
+# 接続が切れたりサーバーを再起動したりしても、URL の ?sid= が同じなら前回の入力と計算結果から再開する
+snapshot = cash_snapshot.session("app")
+modes = ["CSVファイルから分析", "月別手入力で分析"]
+restored_mode = snapshot.restored("mode", modes[0])
+mode = st.radio("モード選択", modes, index=modes.index(restored_mode) if restored_mode in modes else 0)
+snapshot.keep("mode", mode)
+profiler = cash_profiler.Profiler("app")
 
 # --- モード1: CSVファイルアップロードによる分析 ---
 if mode == "CSVファイルから分析":
@@ -15,140 +36,310 @@ if mode == "CSVファイルから分析":
         st.header("操作パネル")
         uploaded_file = st.file_uploader("CSVファイルをアップロード", type=["csv"])
         if uploaded_file:
-            try:
-                df = pd.read_csv(uploaded_file, encoding="utf-8")
-            except UnicodeDecodeError:
-                df = pd.read_csv(uploaded_file, encoding="shift-jis")
-
-            df["生産開始日"] = pd.to_datetime(df["生産開始日"], errors="coerce")
-            df["出荷日"] = pd.to_datetime(df["出荷日"], errors="coerce")
-            df["リードタイム"] = (df["出荷日"] - df["生産開始日"]).dt.days.clip(lower=1)
+            cash_engine.remember_upload("orders", uploaded_file)
+        elif cash_engine.current_upload("orders"):
+            st.caption(f"📄 {cash_engine.current_upload('orders').name}（読み込み済み）")
 
-            df["スループット"] = df["売上単価"] - df["材料費"] - df["外注費"]
-            df["TP/LT"] = df["スループット"] / df["リードタイム"]
+    loaded, job = cash_engine.load("orders", cash_engine.parse_orders, "CSV読み込み", cash_sample.show_preview)
+    if loaded is not None:
+        df, product_index, cube = loaded
+        profiler.add_job(job, {"標本抽出": "ingest", "派生指標": "derive", "製品索引": "aggregate", "月別集計": "aggregate",
+                               cash_parallel.ORDERS_STAGE: "ingest"})
 
-            st.subheader("アップロードデータ")
+        st.subheader("アップロードデータ")
+        with profiler.stage("render", "st.dataframe"):
             st.dataframe(df)
 
-            st.subheader("製品別統計情報")
-            stats_df = df.groupby("品名")[["スループット", "TP/LT"]].agg(["mean", "max", "min", "std"])
+        st.subheader("製品別統計情報")
+        with profiler.stage("aggregate", "groupby 品名"):
+            stats_df = df.groupby("品名", observed=True)[["スループット", "TP/LT"]].agg(["mean", "max", "min", "std"])
+        with profiler.stage("render", "製品別統計"):
             st.dataframe(stats_df)
 
-            st.subheader("キャッシュ生産性バブルチャート")
+        st.subheader("キャッシュ生産性バブルチャート")
+        with profiler.stage("render", "px.scatter"):
             fig = px.scatter(df, x="TP/LT", y="スループット", color="品名", size="出荷数",
                             hover_data=["品名", "スループット", "TP/LT", "リードタイム"])
+        with profiler.stage("render", "st.plotly_chart"):
             st.plotly_chart(fig, use_container_width=True)
 
+        # 取り込み時に作った製品別索引から、選んだ製品の行だけを取り出す
+        st.subheader("製品別ドリルダウン")
+        with profiler.stage("render", "製品別ドリルダウン"):
+            cash_drilldown.show_product_drilldown(df, product_index, "app_drilldown")
+
+        with profiler.stage("export", "to_csv"):
             csv = df.to_csv(index=False).encode('utf-8-sig')
-            st.download_button("結果をCSVでダウンロード", csv, "result.csv", "text/csv")
+        st.download_button("結果をCSVでダウンロード", csv, "result.csv", "text/csv")
+
+        # 制約工程の稼働日数のもとで、TP/LTの高い製品から需要を割り当てる
+        st.subheader("制約条件付き 製品ミックス最適化")
+        total_days = float(df["リードタイム"].sum())
+        capacity_days = st.number_input("制約工程の稼働可能日数（日）", min_value=0.0,
+                                        value=round(total_days * 0.8, 1), step=1.0)
+        st.caption("各受注のリードタイム（生産開始日〜出荷日の日数）を、その受注が制約工程を占有する日数とみなしています。")
+        with profiler.stage("aggregate", "製品ミックス最適化"):
+            mix_df, baseline_tp, optimal_tp, mix_rate = cash_optimizer.mix_scenario(df, capacity_days)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("現状ミックスのスループット", f"{baseline_tp:,.0f}")
+        col2.metric("最適ミックスのスループット", f"{optimal_tp:,.0f}", f"{mix_rate:+.1%}")
+        col3.metric("使用日数", f"{mix_df['使用日数'].sum():,.1f} / {capacity_days:,.1f}")
+        st.dataframe(mix_df[mix_df["採用数"] > 0], use_container_width=True)
+        # 月別手入力モードの感度分析に、1ヶ月あたりのスループット増分（円 → 万円）を平均増減に足すシナリオとして渡す
+        mix_gain = cash_optimizer.monthly_gain(df, baseline_tp, optimal_tp) / 10000
+        st.session_state["mix_scenario"] = {"label": f"最適ミックス ({mix_gain:+,.1f}万円/月)", "delta": mix_gain}
+        st.caption(f"最適ミックスによるスループットの増分（月あたり {mix_gain:+,.1f}万円）は、"
+                   "「月別手入力で分析」の感度分析で平均現金増減に加えたシナリオとして表示されます。")
+
+        # 受注ごとの支出（生産開始日）と回収（出荷日＋回収サイト）から日次の現金残高を計算
+        st.subheader("日次キャッシュシミュレーション")
+        col1, col2 = st.columns(2)
+        opening_cash = col1.number_input("シミュレーション開始時の現金残高（円）", value=0.0, step=100000.0)
+        payment_term = col2.slider("売上の回収サイト（日）", min_value=0, max_value=180, value=30)
+        with profiler.stage("forecast", "日次シミュレーション"):
+            daily, excluded = cash_daily.simulate_daily_cash(df, opening_cash, payment_term)
+            summary = cash_daily.shortage_summary(daily)
+            hidden = cash_daily.hidden_monthly_shortages(daily)
+
+        if excluded:
+            st.warning(f"⚠️ 生産開始日または入金日が、生産開始日の中央値から前後 {cash_daily.WINDOW_DAYS:,}日を外れる {excluded:,}件は、"
+                       "日付の入力ミスとみなして日次シミュレーションから除外しました。")
+        if summary["初回ショート日"] is not None:
+            st.error(f"🚨 {summary['初回ショート日']:%Y-%m-%d} に現金残高がマイナスになります"
+                     f"（最低 {summary['最低残高']:,.0f}円 / {summary['最低残高日']:%Y-%m-%d}、"
+                     f"マイナス日数 {summary['ショート日数']}日）")
+        elif len(daily):
+            st.success("✅ シミュレーション期間中に現金残高がマイナスになる日はありません。")
+
+        fig_daily, ax_daily = plt.subplots(figsize=(10, 4))
+        ax_daily.plot(daily.index, daily["現金残高"], linewidth=1)
+        ax_daily.axhline(0, color="red", linestyle="--")
+        ax_daily.set_title("日次 現金残高推移")
+        ax_daily.set_xlabel("日付")
+        ax_daily.set_ylabel("現金残高（円）")
+        ax_daily.grid(True)
+        with profiler.stage("render", "日次残高"):
+            st.pyplot(fig_daily)
+
+        if len(hidden):
+            st.warning("⚠️ 月末残高はプラスでも、月中に資金ショートしている月があります。")
+            st.dataframe(hidden, use_container_width=True)
+
+        # 取り込み時に作った出荷月×製品のキューブから月別の加重平均TP/LTを求め、日次残高の月末値と突き合わせる
+        st.subheader("出荷月別の加重平均TP/LTと現金増減")
+        with profiler.stage("aggregate", "出荷月別集計"):
+            cash_cube.show_monthly(cube, daily, "app_cube")
+
+        col1, col2 = st.columns([3, 1])
+        daily_entity = col1.text_input("保存先の事業体", value=cash_store.DEFAULT_ENTITY, key="daily_entity")
+        if col2.button("日次残高を保存") and len(daily):
+            try:
+                cash_daily_store.write(daily_entity, daily)
+                st.success(f"{daily_entity} の日次残高（{len(daily)}日分）を保存しました。")
+            except ValueError as e:
+                st.error(f"保存できませんでした：{e}")
+
+    with st.expander("保存済みの日次残高"):
+        cash_daily.show_stored_daily("app_daily")
 
 # --- モード2: 月別手入力による分析 ---
 else:
-    months = st.multiselect("分析対象の月（例: 2024-01）を選択", options=[
-        "2024-01", "2024-02", "2024-03", "2024-04", "2024-05", "2024-06", "2024-07", "2024-08"
-    ], default=["2024-01", "2024-02", "2024-03"])
-    
-    monthly_data = {}
-    for month in months:
+    # 保存済みの履歴（事業体 × 月）を読み込んで入力欄の初期値にする。前回のセッションの入力があればそちらを優先する
+    restored = snapshot.restored("inputs", {})
+    restored_entity = restored.get("entity")
+    with st.sidebar:
+        st.header("履歴データ")
+        entities = cash_store.list_entities()
+        if entities:
+            options = entities + ["（新規）"]
+            index = options.index(restored_entity) if restored_entity in entities else len(entities) if restored_entity else 0
+            entity = st.selectbox("事業体", options=options, index=index)
+        else:
+            entity = "（新規）"
+        if entity == "（新規）":
+            entity = st.text_input("事業体名", value=restored_entity or cash_store.DEFAULT_ENTITY)
+        stored_months = cash_store.list_months(entity)
+    if restored_entity != entity:
+        restored = {}
+
+    # 分析期間は開始月と月数で指定する（120ヶ月などの長い履歴でも、入力欄は編集中の1ヶ月分だけ作る）
+    col1, col2 = st.columns(2)
+    start_month = col1.text_input("開始月（YYYY-MM）",
+                                  value=restored.get("start_month", stored_months[0] if stored_months else "2024-01"))
+    month_count = col2.number_input("月数", min_value=1, max_value=240,
+                                    value=min(restored.get("month_count", len(stored_months) or 3), 240))
+
+    # 未保存の編集は (事業体, 月) ごとにセッションに持つ。編集していない月は保存済みの月別集計を使う
+    edits = st.session_state.setdefault("_month_edits", snapshot.restored("edits", {}))
+    editor = st.session_state.setdefault("_month_editor", {"open": None, "serial": 0, "base": None})
+    snapshot.keep("edits", edits)
+
+    try:
+        months = cash_store.month_labels(start_month, int(month_count))
+    except ValueError:
+        # 分析は飛ばすが、入力と編集中の表はスナップショットに残す（このあとの保存・計測は通常どおり行う）
+        st.error(f"開始月「{start_month}」は YYYY-MM 形式で入力してください。")
+        months = None
+        snapshot.keep("inputs", {"entity": entity, "start_month": start_month, "month_count": int(month_count),
+                                 "month": restored.get("month")})
+
+    if months is not None:
+        month = st.selectbox("編集する月", months,
+                             index=months.index(restored["month"]) if restored.get("month") in months else len(months) - 1,
+                             format_func=lambda m: f"{m}（未保存の編集あり）" if (entity, m) in edits else m)
+        snapshot.keep("inputs", {"entity": entity, "start_month": start_month, "month_count": int(month_count),
+                                 "month": month})
         st.markdown(f"### 📦 {month}")
-        with st.expander(f"{month} の製品データ入力"):
-            df = st.data_editor(
-                pd.DataFrame([{"製品名": "", "TP（万円）": 0.0, "LT（日）": 1}], columns=["製品名", "TP（万円）", "LT（日）"]),
-                key=month,
-                num_rows="dynamic"
-            )
-            cash_start = st.number_input(f"{month}の期首現金残高（万円）", key=f"{month}_start", value=0.0)
-            cash_end = st.number_input(f"{month}の期末現金残高（万円）", key=f"{month}_end", value=0.0)
-            monthly_data[month] = {"df": df, "start": cash_start, "end": cash_end}
-
-    results = []
-    monthly_cash_diff = []
-
-    for month, data in monthly_data.items():
-        df = data["df"].dropna()
-        df["TP/LT"] = df["TP（万円）"] / df["LT（日）"]
-        df["TP²/LT"] = df["TP（万円）"]**2 / df["LT（日）"]
-        total_tp = df["TP（万円）"].sum()
-        weighted_tp_lt = df["TP²/LT"].sum() / total_tp if total_tp > 0 else 0
-        cash_diff = data["end"] - data["start"]
-        results.append({
-            "月": month,
-            "加重平均TP/LT": weighted_tp_lt,
-            "現金増減額（万円）": cash_diff
-        })
-        monthly_cash_diff.append(cash_diff)
-
-    if results:
-        result_df = pd.DataFrame(results)
-        st.markdown("## グラフ：加重平均キャッシュ生産性 vs 現金増減額")
-        fig, ax = plt.subplots()
-        ax.scatter(result_df["加重平均TP/LT"], result_df["現金増減額（万円）"], color='blue')
-        for i, row in result_df.iterrows():
-            ax.annotate(row["月"], (row["加重平均TP/LT"], row["現金増減額（万円）"]),
-                        textcoords="offset points", xytext=(5, 5), ha='left')
-        ax.set_xlabel("加重平均キャッシュ生産性")
-        ax.set_ylabel("現金増減額")
-        ax.set_title("月別：加重平均キャッシュ生産性と現金増減額の関係")
-        ax.grid(True)
-        st.pyplot(fig)
-
-        st.markdown("## 資金ショート時期予測")
-        try:
-            total_months = len(results)
-            total_cash_diff = sum(monthly_cash_diff)
-            avg_monthly_cash_diff = total_cash_diff / total_months if total_months > 0 else 0
-            latest_cash = list(monthly_data.values())[-1]["end"]
-
-            if avg_monthly_cash_diff < 0:
-                months_until_short = latest_cash / abs(avg_monthly_cash_diff)
-                future_months = [i+1 for i in range(12)]
-                future_cash = [latest_cash + avg_monthly_cash_diff * m for m in future_months]
-
-                st.write(f"📉 現在の期末現金残高: {latest_cash:.1f}万円")
-                st.write(f"📉 平均月間現金減少: {avg_monthly_cash_diff:.1f}万円")
-                st.write(f"🚨 資金ショート予測: 約 {months_until_short:.1f} ヶ月後")
-
-                fig2, ax2 = plt.subplots()
-                ax2.plot(future_months, future_cash, marker='o', linestyle='-')
-                ax2.axhline(0, color='red', linestyle='--')
-                ax2.set_title("将来の現金残高予測")
-                ax2.set_xlabel("現在からの月数")
-                ax2.set_ylabel("予測現金残高（万円）")
-                ax2.grid(True)
-                st.pyplot(fig2)
+        if editor["open"] != (entity, month):
+            # 別の月を開いたときだけ初期値を読み直す（開いている間は同じ初期値のまま編集を重ねる）
+            editor["open"], editor["serial"] = (entity, month), editor["serial"] + 1
+            if (entity, month) in edits:
+                editor["base"] = edits[(entity, month)]
             else:
-                st.success("現在は資金ショートの兆候は見られません。")
-        except Exception as e:
-            st.error("資金ショート予測でエラーが発生しました。")
-
-        st.markdown("## 結果表")
-        st.dataframe(result_df)
-        csv = result_df.to_csv(index=False).encode("utf-8-sig")
-        st.download_button("CSVをダウンロード", csv, "cash_summary.csv", "text/csv")
-
-        st.markdown("## 感度分析：TP/LT改善シナリオによる収支改善効果")
-        if total_months > 0 and avg_monthly_cash_diff < 0:
-            scenarios = {
-                "現状維持 (0%)": 0.00,
-                "軽度改善 (+10%)": 0.10,
-                "中度改善 (+20%)": 0.20,
-                "高度改善 (+30%)": 0.30,
-            }
-
-            base_tp_lt = result_df["加重平均TP/LT"].mean()
-            fig3, ax3 = plt.subplots()
-            future_months = list(range(1, 13))
-
-            for label, improve_rate in scenarios.items():
-                improved_tp_lt = base_tp_lt * (1 + improve_rate)
-                adjusted_cash_diff = avg_monthly_cash_diff * (1 + improve_rate)
-                future_cash = [latest_cash + adjusted_cash_diff * m for m in future_months]
-                ax3.plot(future_months, future_cash, marker='o', label=label)
-
-            ax3.axhline(0, color='black', linestyle='--')
-            ax3.set_title("TP/LT改善シナリオ別：将来の現金残高予測")
-            ax3.set_xlabel("現在からの月数")
-            ax3.set_ylabel("予測現金残高（万円）")
-            ax3.legend()
-            ax3.grid(True)
-            st.pyplot(fig3)
+                with profiler.stage("ingest", "履歴読み込み"):
+                    cash_start, cash_end, products = cash_store.load_month(entity, month)
+                if products.empty:
+                    products = pd.DataFrame([{"製品名": "", "TP（万円）": 0.0, "LT（日）": 1, "出荷数": 0}],
+                                            columns=cash_store.PRODUCT_COLUMNS)
+                # key は計算結果のキャッシュのキー（表の中身ではなく、どこから読んだか）
+                editor["base"] = {"df": products, "start": float(cash_start or 0.0), "end": float(cash_end or 0.0),
+                                  "key": ("store", entity, month, cash_store.signature(entity))}
+        base, serial = editor["base"], editor["serial"]
+        df = st.data_editor(base["df"], key=f"month_editor_{serial}", num_rows="dynamic")
+        cash_start = st.number_input(f"{month}の期首現金残高（万円）", key=f"month_start_{serial}", value=base["start"])
+        cash_end = st.number_input(f"{month}の期末現金残高（万円）", key=f"month_end_{serial}", value=base["end"])
+        # 値だけを比べる（data_editor が列の型を変えただけ（int → float など）の表は編集とみなさない）
+        unchanged = df.astype(object).equals(base["df"].astype(object))
+        if (entity, month) in edits or not (unchanged and cash_start == base["start"] and cash_end == base["end"]):
+            # 編集した表のキーは、初期値のキーと data_editor の差分（編集した行だけの小さな辞書）から作る
+            key = (base["key"], st.session_state.get(f"month_editor_{serial}"), cash_start, cash_end)
+            edits[(entity, month)] = {"df": df, "start": cash_start, "end": cash_end, "key": key}
+
+        pending = sorted(m for e, m in edits if e == entity)
+        if pending and st.sidebar.button("入力内容を履歴に保存"):
+            for m in pending:
+                data = edits.pop((entity, m))
+                cash_store.save_month(entity, m, data["start"], data["end"], data["df"])
+            editor["open"] = None
+            stored_months = cash_store.list_months(entity)
+            st.sidebar.success(f"{entity} の {len(pending)} ヶ月分を保存しました。")
+            pending = []
+        if pending:
+            st.sidebar.caption(f"未保存の編集: {', '.join(pending)}")
+
+        with profiler.stage("aggregate", "月別加重平均"):
+            # 保存済みの月は事業体全体の月別集計（保存内容が変わったときだけ再計算）から取り出し、編集中の月だけ計算し直す
+            signature = cash_store.signature(entity)
+            pending_edits = {m: edits[(entity, m)] for m in pending}
+
+            def build_month_table():
+                table = cash_rollup.store_monthly(entity, signature).reindex(months).fillna(0.0)
+                for m, data in pending_edits.items():
+                    if m in table.index:
+                        table.loc[m] = [data["start"], data["end"], cash_metrics.tp_weighted(data["df"])]
+                return table
+
+            edit_keys = {m: data["key"] for m, data in pending_edits.items()}
+            month_table = snapshot.result("month_table", (entity, signature, months, edit_keys), build_month_table)
+            ledger = cash_ledger.MonthlyLedger(
+                months,
+                **{"加重平均TP/LT": month_table["加重平均TP/LT"],
+                   "現金増減額（万円）": month_table["期末現金残高"] - month_table["期首現金残高"]})
+
+        if len(ledger):
+            result_df = ledger.frame()
+            st.markdown("## グラフ：加重平均キャッシュ生産性 vs 現金増減額")
+            fig, ax = plt.subplots()
+            ax.scatter(ledger["加重平均TP/LT"], ledger["現金増減額（万円）"], color='blue')
+            ledger.annotate(ax, "加重平均TP/LT", "現金増減額（万円）", textcoords="offset points", xytext=(5, 5), ha='left')
+            ax.set_xlabel("加重平均キャッシュ生産性")
+            ax.set_ylabel("現金増減額")
+            ax.set_title("月別：加重平均キャッシュ生産性と現金増減額の関係")
+            ax.grid(True)
+            with profiler.stage("render", "散布図"):
+                st.pyplot(fig)
+
+            st.markdown("## 資金ショート時期予測")
+            try:
+                scenarios = {
+                    "現状維持 (0%)": 0.00,
+                    "軽度改善 (+10%)": 0.10,
+                    "中度改善 (+20%)": 0.20,
+                    "高度改善 (+30%)": 0.30,
+                }
+                # 製品ミックス最適化の増分は率ではなく、平均増減に足す月あたりの額
+                mix = st.session_state.get("mix_scenario")
+                deltas = [mix["delta"]] if mix else []
+
+                with profiler.stage("forecast", "平均減少ペース"):
+                    total_months = len(ledger)
+                    latest_cash = float(month_table["期末現金残高"].iloc[-1])
+                    # 予測と感度分析のシナリオは計算サービス（未設定ならこのプロセス）でまとめて求める
+                    changes = ledger["現金増減額（万円）"].tolist()
+                    forecast = snapshot.result(
+                        "forecast", (latest_cash, changes, list(scenarios.values()), deltas),
+                        lambda: cash_service.call("forecast", last_cash=latest_cash, changes=changes, horizon=12,
+                                                  rates=list(scenarios.values()), deltas=deltas))
+                    avg_monthly_cash_diff = forecast["平均増減"]
+
+                if avg_monthly_cash_diff < 0:
+                    with profiler.stage("forecast", "12ヶ月予測"):
+                        months_until_short = forecast["ショートまでの月数"]
+                        future_months = [i+1 for i in range(12)]
+                        future_cash = forecast["将来残高"]
+
+                    st.write(f"📉 現在の期末現金残高: {latest_cash:.1f}万円")
+                    st.write(f"📉 平均月間現金減少: {avg_monthly_cash_diff:.1f}万円")
+                    st.write(f"🚨 資金ショート予測: 約 {months_until_short:.1f} ヶ月後")
+
+                    fig2, ax2 = plt.subplots()
+                    ax2.plot(future_months, future_cash, marker='o', linestyle='-')
+                    ax2.axhline(0, color='red', linestyle='--')
+                    ax2.set_title("将来の現金残高予測")
+                    ax2.set_xlabel("現在からの月数")
+                    ax2.set_ylabel("予測現金残高（万円）")
+                    ax2.grid(True)
+                    with profiler.stage("render", "将来残高予測"):
+                        st.pyplot(fig2)
+                else:
+                    st.success("現在は資金ショートの兆候は見られません。")
+            except Exception as e:
+                st.error("資金ショート予測でエラーが発生しました。")
+
+            st.markdown("## 結果表")
+            st.dataframe(result_df)
+            with profiler.stage("export", "to_csv"):
+                csv = result_df.to_csv(index=False).encode("utf-8-sig")
+            st.download_button("CSVをダウンロード", csv, "cash_summary.csv", "text/csv")
+
+            st.markdown("## 感度分析：TP/LT改善シナリオによる収支改善効果")
+            if total_months > 0 and avg_monthly_cash_diff < 0:
+                fig3, ax3 = plt.subplots()
+                future_months = list(range(1, 13))
+
+                with profiler.stage("sensitivity", f"{len(scenarios)}シナリオ"):
+                    for label, improve_rate in scenarios.items():
+                        future_cash = forecast["シナリオ"][str(improve_rate)]
+                        ax3.plot(future_months, future_cash, marker='o', label=label)
+                    if mix:
+                        ax3.plot(future_months, forecast["加算シナリオ"][str(mix["delta"])], marker='o', label=mix["label"])
+
+                ax3.axhline(0, color='black', linestyle='--')
+                ax3.set_title("TP/LT改善シナリオ別：将来の現金残高予測")
+                ax3.set_xlabel("現在からの月数")
+                ax3.set_ylabel("予測現金残高（万円）")
+                ax3.legend()
+                ax3.grid(True)
+                with profiler.stage("render", "感度分析"):
+                    st.pyplot(fig3)
+
+
+    # 保存済みの全期間を四半期・年度・直近Nヶ月などでまとめる（累積和の索引で期間ごとに即時集計）
+    if stored_months:
+        st.markdown(f"## 期間別集計（{entity} の保存済み履歴）")
+        with profiler.stage("aggregate", "期間別集計の索引"):
+            rollup_index = cash_rollup.store_index(entity, cash_store.signature(entity))
+        cash_rollup.show_rollups(rollup_index, "app_rollup")
+
+snapshot.save()
+profiler.finish()
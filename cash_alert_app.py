@@ -3,16 +3,13 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-import os
+import io
+import cash_engine
+import cash_alerts
+import cash_ledger
 
-# 日本語フォント設定
-import matplotlib.font_manager as fm
-jp_fonts = ["IPAexGothic", "Noto Sans CJK JP", "IPAGothic", "TakaoGothic"]
-available_fonts = set(f.name for f in fm.fontManager.ttflist)
-for font in jp_fonts:
-    if font in available_fonts:
-        plt.rcParams["font.family"] = font
-        break
+# 日本語フォント設定（統合アプリと共通）
+cash_engine.setup_fonts()
 
 st.title("キャッシュフロー感度分析＆資金ショート警告")
 
@@ -20,7 +17,8 @@ st.sidebar.header("入力")
 months = st.sidebar.number_input("期間（月）", min_value=1, max_value=24, value=6)
 
 # 月別データ入力
-data = []
+ledger = cash_ledger.MonthlyLedger.allocate([f"{i+1}ヶ月目" for i in range(months)],
+                                            ["期首現金", "期末現金", "加重平均TP/LT", "現金増減"])
 for i in range(months):
     st.subheader(f"{i+1}ヶ月目の入力")
     col1, col2, col3 = st.columns(3)
@@ -31,21 +29,17 @@ for i in range(months):
     with col3:
         weighted_tp_lt = st.number_input(f"{i+1}ヶ月目: 加重平均TP/LT", key=f"tp_lt_{i}", min_value=0.0)
 
-    data.append({
-        "期首現金": cash_start,
-        "期末現金": cash_end,
-        "加重平均TP/LT": weighted_tp_lt,
-        "現金増減": cash_end - cash_start
-    })
+    ledger["期首現金"][i] = cash_start
+    ledger["期末現金"][i] = cash_end
+    ledger["加重平均TP/LT"][i] = weighted_tp_lt
+    ledger["現金増減"][i] = cash_end - cash_start
 
-df = pd.DataFrame(data)
+df = ledger.frame()
 
 # グラフ表示
 st.subheader("グラフ：加重平均TP/LT × 現金増減")
 fig, ax = plt.subplots()
-x = df["加重平均TP/LT"]
-y = df["現金増減"]
-ax.scatter(x, y)
+ax.scatter(ledger["加重平均TP/LT"], ledger["現金増減"])
 
 ax.set_xlabel("加重平均キャッシュ生産性 (TP/LT)")
 ax.set_ylabel("現金増減額")
@@ -54,27 +48,45 @@ st.pyplot(fig)
 # 資金ショート予測
 st.subheader("資金ショートの予測")
 
-future_balance = df["期末現金"].tolist()
-zero_month = None
-for i, val in enumerate(future_balance):
-    if val < 0:
-        zero_month = i
-        break
-
-# 画像パス関数
-def show_image_and_message(image_file, message, color="info"):
-    st.image(f"images/{image_file}", width=120)
-    getattr(st, color)(message)
+# 入力期間内で期末現金がマイナスになる月からレベルを判定（ルールエンジンで評価）
+alert = cash_alerts.evaluate(df.assign(事業体="入力データ", 月=np.arange(len(df))), {"project": False}).iloc[0]
+zero_month = None if np.isnan(alert["ショート月"]) else int(alert["ショート月"])
 
 # 警告表示
-if zero_month is not None:
-    if zero_month == 0:
-        show_image_and_message("danger.png", "💥 今月中に資金がショートします。即時対応が必要です。", "error")
-    elif zero_month == 1:
-        show_image_and_message("warning.png", "⚠️ 1ヶ月以内に資金ショートの可能性あり。今すぐ対策を。", "error")
-    elif 2 <= zero_month <= 3:
-        show_image_and_message("alarm.png", f"🚨 {zero_month}ヶ月以内に現金が枯渇予測。TP/LT見直しを。", "warning")
-    elif 4 <= zero_month <= 11:
-        show_image_and_message("info.png", f"ℹ️ {zero_month}ヶ月後にショートの予測。今のうちに改善を。", "info")
-else:
-    show_image_and_message("safe.png", "✅ 今後12ヶ月以内に資金ショートの心配はありません。", "success")
+messages = {
+    "danger": ("💥 今月中に資金がショートします。即時対応が必要です。", "error"),
+    "warning": ("⚠️ 1ヶ月以内に資金ショートの可能性あり。今すぐ対策を。", "error"),
+    "alarm": (f"🚨 {zero_month}ヶ月以内に現金が枯渇予測。TP/LT見直しを。", "warning"),
+    "info": (f"ℹ️ {zero_month}ヶ月後にショートの予測。今のうちに改善を。", "info"),
+    "safe": ("✅ 今後12ヶ月以内に資金ショートの心配はありません。", "success"),
+}
+level = cash_alerts.series_level(zero_month)
+if level is not None:
+    message, color = messages[level]
+    cash_alerts.show_image_and_message(level, message, color)
+
+# --- 複数事業体の一括アラート ---
+st.subheader("複数事業体の一括アラート")
+st.caption("列：事業体, 月, 期末現金, 加重平均TP/LT（各事業体の今月以降の月別計画）")
+st.sidebar.header("アラートルール")
+rules = {
+    "shortage_threshold": st.sidebar.number_input("ショート判定の残高閾値", value=0.0),
+    "trend_window": st.sidebar.number_input("トレンド判定の月数", min_value=1, max_value=12, value=3),
+    "tp_lt_drop": st.sidebar.slider("TP/LT低下の警告ライン（%）", 0, 100, 20) / 100,
+}
+batch_file = st.file_uploader("事業体別データ（CSV）", type=["csv"])
+if batch_file is not None:
+    cash_engine.remember_upload("entities", batch_file)
+upload = cash_engine.current_upload("entities")
+if upload is not None:
+    batch_df = pd.read_csv(io.BytesIO(upload.data))
+    report, evaluated = cash_alerts.get_engine().evaluate(batch_df, rules)
+    counts = report["区分"].value_counts()
+    cols = st.columns(len(cash_alerts.LEVELS))
+    for col, level in zip(cols, cash_alerts.LEVELS):
+        label = cash_alerts.LEVEL_LABELS[level]
+        col.metric(label, int(counts.get(label, 0)))
+    st.caption(f"{len(report)} 事業体中 {evaluated} 事業体を再評価しました（入力が変わっていない事業体は前回結果を使用）。")
+    st.dataframe(report, use_container_width=True)
+    st.download_button("📥 アラート一覧をCSVでダウンロード", report.to_csv(index=False).encode("utf-8-sig"),
+                       file_name="cash_alerts.csv")
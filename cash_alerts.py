@@ -0,0 +1,191 @@
+import os
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# 資金ショート警告のルールエンジン。
+# 事業体×月の行列に展開し、閾値・トレンド悪化・TP/LT低下のルールを全事業体まとめて評価する。
+LEVELS = ["danger", "warning", "alarm", "info", "safe"]
+LEVEL_LABELS = {"danger": "危険", "warning": "警告", "alarm": "注意", "info": "情報", "safe": "安全"}
+IMAGES = {level: f"{level}.png" for level in LEVELS}
+
+DEFAULT_RULES = {
+    "shortage_threshold": 0.0,  # この残高を下回ったらショート扱い
+    "project": True,            # 入力期間内に下回らない場合、平均増減で期間後を予測する
+    "trend_window": 3,          # 直近何ヶ月の現金増減を見るか
+    "tp_lt_drop": 0.2,          # 直近TP/LTが過去平均からこの割合以上低下したら警告
+}
+INPUT_COLUMNS = ["事業体", "月", "期末現金", "加重平均TP/LT"]
+
+
+# ショートまでの月数（入力期間の先頭月 = 0）→ 警告レベル
+def level_for(zero_month):
+    zero_month = np.asarray(zero_month, dtype=float)
+    return np.select(
+        [zero_month == 0, zero_month == 1, (zero_month >= 2) & (zero_month <= 3), (zero_month >= 4) & (zero_month <= 11)],
+        ["danger", "warning", "alarm", "info"],
+        default="safe",
+    )
+
+
+# 1系列の画面（cash_alert_app / cash_full_app）の判定：入力期間内にショートしなければ safe、
+# 12ヶ月目以降のショートは表示しない（None）。トレンド・TP/LTのルールはレベルに使わない
+def series_level(zero_month):
+    if zero_month is None:
+        return "safe"
+    if zero_month >= 12:
+        return None
+    return str(level_for(zero_month))
+
+
+def _matrix(frame, column, e_codes, m_codes, shape):
+    matrix = np.full(shape, np.nan)
+    matrix[e_codes, m_codes] = pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=float)
+    return matrix
+
+
+def _first_last_valid(matrix):
+    valid = ~np.isnan(matrix)
+    first = np.argmax(valid, axis=1)
+    last = matrix.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    return first, last, valid.any(axis=1)
+
+
+def _window(matrix, end, length, start):
+    # 各行の end 列までの直近 length 列（行ごとに位置をそろえる。start より前は NaN）
+    cols = end[:, None] - length + 1 + np.arange(length)
+    taken = np.take_along_axis(matrix, np.clip(cols, 0, max(matrix.shape[1] - 1, 0)), axis=1)
+    return np.where((cols >= start[:, None]) & (cols >= 0), taken, np.nan)
+
+
+def _nanmean(matrix):
+    # 全欠損の行は NaN（警告は出さない）
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmean(matrix, axis=1)
+
+
+def evaluate(frame, rules=None):
+    rules = {**DEFAULT_RULES, **(rules or {})}
+    e_codes, entities = pd.factorize(frame["事業体"])
+    m_codes, months = pd.factorize(frame["月"], sort=True)
+    shape = (len(entities), len(months))
+    closing = _matrix(frame, "期末現金", e_codes, m_codes, shape)
+    tp_lt = _matrix(frame, "加重平均TP/LT", e_codes, m_codes, shape)
+    w = int(rules["trend_window"])
+
+    # 月数は事業体ごとに「最初に入力のある月 = 0」で数える（他の事業体の月範囲に依存しない）
+    first, last, has_data = _first_last_valid(closing)
+
+    # 閾値ルール：入力期間内で最初に閾値を下回る月
+    below = closing < rules["shortage_threshold"]
+    has_actual = below.any(axis=1)
+    zero_month = np.where(has_actual, np.argmax(below, axis=1) - first, np.nan)
+
+    # 期末現金の月次増減（欠損月は前月値で埋めて差分）。直近w ヶ月分を行ごとに取り出す
+    filled = pd.DataFrame(closing).ffill(axis=1).to_numpy()
+    change = np.diff(filled, axis=1, prepend=np.nan)
+    recent = _window(change, last, w, first + 1)
+    recent_mean = _nanmean(recent)
+    last_cash = np.where(has_data, closing[np.arange(shape[0]), last], np.nan)
+
+    if rules["project"]:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ahead = np.ceil((last_cash - rules["shortage_threshold"]) / -recent_mean)
+        projected = (~has_actual) & (recent_mean < 0) & np.isfinite(ahead)
+        zero_month = np.where(projected, last - first + np.maximum(ahead, 1), zero_month)
+
+    # トレンド悪化ルール：直近w ヶ月の増減がすべてマイナス
+    with np.errstate(invalid="ignore"):
+        declining = np.all(recent < 0, axis=1)
+
+    # TP/LT低下ルール：直近値 vs それ以前w ヶ月の平均
+    tp_first, tp_last, tp_has = _first_last_valid(tp_lt)
+    latest_tp_lt = np.where(tp_has, tp_lt[np.arange(shape[0]), tp_last], np.nan)
+    prior = _window(tp_lt, tp_last - 1, w, tp_first)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tp_lt_change = latest_tp_lt / _nanmean(prior) - 1
+    tp_lt_dropped = tp_lt_change <= -rules["tp_lt_drop"]
+
+    level = level_for(zero_month)
+    level = np.where((level == "safe") & (declining | tp_lt_dropped), "info", level)
+
+    messages = []
+    for zm, dec, drop, chg in zip(zero_month, declining, tp_lt_dropped, tp_lt_change):
+        parts = []
+        if not np.isnan(zm):
+            parts.append(f"{int(zm)}ヶ月目に残高が閾値を下回る予測")
+        if dec:
+            parts.append(f"直近{w}ヶ月連続で現金減少")
+        if drop:
+            parts.append(f"TP/LTが{-chg:.0%}低下")
+        messages.append("・".join(parts) or "問題なし")
+
+    return pd.DataFrame({
+        "事業体": entities,
+        "レベル": level,
+        "ショート月": zero_month,
+        "直近期末現金": last_cash,
+        "直近平均増減": recent_mean,
+        "TP/LT変化率": tp_lt_change,
+        "内容": messages,
+    })
+
+
+def rank(report):
+    severity = report["レベル"].map({level: i for i, level in enumerate(LEVELS)})
+    order = np.lexsort((report["直近平均増減"].fillna(np.inf), report["ショート月"].fillna(np.inf), severity))
+    ranked = report.iloc[order].reset_index(drop=True)
+    ranked.insert(1, "区分", ranked["レベル"].map(LEVEL_LABELS))
+    return ranked
+
+
+# --- 差分評価：入力が変わった事業体だけを再評価する ---
+class AlertEngine:
+    def __init__(self):
+        self._cache = {}
+        self._rules_key = None
+        self._lock = threading.Lock()
+
+    def _digests(self, frame):
+        row_hash = pd.util.hash_pandas_object(frame[INPUT_COLUMNS], index=False)
+        return row_hash.groupby(frame["事業体"].to_numpy()).sum()
+
+    def evaluate(self, frame, rules=None):
+        with self._lock:
+            return self._evaluate(frame, rules)
+
+    def _evaluate(self, frame, rules):
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        rules_key = tuple(sorted(rules.items()))
+        if rules_key != self._rules_key:
+            self._cache.clear()
+            self._rules_key = rules_key
+
+        digests = self._digests(frame)
+        # 今回の入力にない事業体の結果は捨てる（エンジンはプロセスで共有しているので、残すと増え続ける）
+        for entity in self._cache.keys() - set(digests.index):
+            del self._cache[entity]
+        changed = [e for e, d in digests.items() if self._cache.get(e, (None,))[0] != d]
+        if changed:
+            subset = frame[frame["事業体"].isin(changed)]
+            for row in evaluate(subset, rules).to_dict("records"):
+                self._cache[row["事業体"]] = (digests[row["事業体"]], row)
+
+        report = pd.DataFrame([self._cache[e][1] for e in digests.index])
+        return rank(report), len(changed)
+
+
+@st.cache_resource
+def get_engine():
+    return AlertEngine()
+
+
+def show_image_and_message(level, message, color="info"):
+    image_path = os.path.join("images", IMAGES[level])
+    if os.path.exists(image_path):
+        st.image(image_path, width=120)
+    getattr(st, color)(message)
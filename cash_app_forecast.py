@@ -1,69 +1,125 @@
-
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
-import matplotlib.font_manager as fm
+import cash_store
+import cash_ledger
+import cash_metrics
+import cash_whatif
+import cash_daily
+import cash_engine
+import cash_snapshot
 
-# 日本語フォントの自動選択
-jp_fonts = ["IPAexGothic", "Noto Sans CJK JP", "IPAGothic", "TakaoGothic"]
-available_fonts = set(f.name for f in fm.fontManager.ttflist)
-for font in jp_fonts:
-    if font in available_fonts:
-        plt.rcParams["font.family"] = font
-        break
+# 日本語フォント設定（統合アプリと共通）
+cash_engine.setup_fonts()
 
 st.title("キャッシュ生産性分析 + 散布図 + 感度分析 + ゼロ月数予測")
 
-months = st.number_input("分析対象月数", min_value=1, max_value=24, value=6)
+# 接続が切れたりサーバーを再起動したりしても、URL の ?sid= が同じなら前回の入力と計算結果から再開する
+snapshot = cash_snapshot.session("forecast")
+restored = snapshot.restored("inputs", {})
+
+# 保存済み履歴の読み込み
+st.sidebar.header("履歴データ")
+entity = st.sidebar.text_input("事業体", value=restored.get("entity", cash_store.DEFAULT_ENTITY))
+stored_months = cash_store.list_months(entity)
+if restored.get("entity") != entity:
+    restored = {}
+start_month = st.sidebar.text_input("開始月（YYYY-MM）",
+                                    value=restored.get("start_month", stored_months[0] if stored_months else "2024-01"))
+
+months = st.number_input("分析対象月数", min_value=1, max_value=24,
+                         value=restored.get("months", min(len(stored_months), 24) or 6))
+month_keys = cash_store.month_labels(start_month, months)
+if restored.get("start_month") != start_month or restored.get("months") != months:
+    restored = {}
+
+cash_hist = cash_store.load_cash(entity, month_keys[0], month_keys[-1]).set_index("月")
+product_hist = cash_store.load_products(entity, month_keys[0], month_keys[-1])
+stored_products = {m: g for m, g in product_hist.groupby("月")}
+
+cash_defaults = [1000] + [0] * months
+for i, month in enumerate(month_keys):
+    if month in cash_hist.index:
+        cash_defaults[i] = float(cash_hist.at[month, "期首現金残高"])
+        cash_defaults[i + 1] = float(cash_hist.at[month, "期末現金残高"])
+
 cash_balances = []
-for i in range(months + 1):
-    cash = st.number_input(f"{i+1}ヶ月目 期首現金残高（万円）", value=1000 if i == 0 else 0)
+for i, default in enumerate(restored.get("cash", cash_defaults)):
+    cash = st.number_input(f"{i+1}ヶ月目 期首現金残高（万円）", value=default)
     cash_balances.append(cash)
 
 st.markdown("### 月別 製品データ入力（TP・LT・出荷数）")
 monthly_product_data = {}
 
+# 表のキー（計算結果のキャッシュ用）：表の中身ではなく、初期値の読み込み元と data_editor の差分。
+# 戻した表は前回のキーをそのまま使う（編集していなければ前回の計算結果が使える）
+table_keys = {}
+store_source = ("store", cash_store.signature(entity))
+
+restored_tables = restored.get("tables", {})
 for i in range(months):
     st.markdown(f"**{i+1}ヶ月目 製品データ**")
+    if month_keys[i] in restored_tables:
+        initial_df = restored_tables[month_keys[i]]
+        source = restored["table_keys"][month_keys[i]]
+    elif month_keys[i] in stored_products:
+        initial_df = stored_products[month_keys[i]][cash_store.PRODUCT_COLUMNS].reset_index(drop=True)
+        source = store_source
+    else:
+        initial_df = pd.DataFrame([{"製品名": "", "TP（万円）": 0.0, "LT（日）": 1, "出荷数": 0}],
+                                  columns=["製品名", "TP（万円）", "LT（日）", "出荷数"])
+        source = ("new",)
     df = st.data_editor(
-        pd.DataFrame([{"製品名": "", "TP（万円）": 0.0, "LT（日）": 1, "出荷数": 0}],
-                     columns=["製品名", "TP（万円）", "LT（日）", "出荷数"]),
-        key=f"month_{i}",
+        initial_df,
+        key=f"month_{entity}_{month_keys[i]}",
         num_rows="dynamic"
     )
     monthly_product_data[i] = df
+    delta = st.session_state.get(f"month_{entity}_{month_keys[i]}")
+    table_keys[month_keys[i]] = (source, delta) if delta and any(delta.values()) else source
+snapshot.keep("inputs", {"entity": entity, "start_month": start_month, "months": months, "cash": cash_balances,
+                         "tables": {month_keys[i]: monthly_product_data[i] for i in range(months)},
+                         "table_keys": table_keys})
+
+if st.sidebar.button("入力内容を履歴に保存"):
+    for i, month in enumerate(month_keys):
+        cash_store.save_month(entity, month, cash_balances[i], cash_balances[i + 1], monthly_product_data[i])
+    st.sidebar.success(f"{entity} の {months} ヶ月分を保存しました。")
 
 # 製品別TP/LT傾向データ準備
-results = []
-for i in range(months):
-    df = monthly_product_data[i]
-    df = df[(df["TP（万円）"] > 0) & (df["LT（日）"] > 0) & (df["出荷数"] > 0)]
-
-    tp_total = (df["TP（万円）"] * df["出荷数"]).sum()
-    lt_total = (df["LT（日）"] * df["出荷数"]).sum()
-    weighted_tp_lt = tp_total / lt_total if lt_total > 0 else 0
-    cash_change = cash_balances[i+1] - cash_balances[i]
-
-    results.append({
-        "月": f"{i+1}ヶ月目",
-        "スループット総量（万円）": tp_total,
-        "LT加重総和（日）": lt_total,
-        "加重平均キャッシュ生産性（TP/LT）": round(weighted_tp_lt, 2),
-        "現金増減額（万円）": cash_change
-    })
-
-result_df = pd.DataFrame(results)
+def build_ledger():
+    ledger = cash_ledger.MonthlyLedger.allocate([f"{i+1}ヶ月目" for i in range(months)],
+                                                ["スループット総量（万円）", "LT加重総和（日）",
+                                                 "加重平均キャッシュ生産性（TP/LT）", "現金増減額（万円）"])
+    for i in range(months):
+        tp_total, lt_total, weighted_tp_lt = cash_metrics.shipment_weighted(monthly_product_data[i])
+        cash_change = cash_balances[i+1] - cash_balances[i]
+
+        ledger["スループット総量（万円）"][i] = tp_total
+        ledger["LT加重総和（日）"][i] = lt_total
+        ledger["加重平均キャッシュ生産性（TP/LT）"][i] = round(weighted_tp_lt, 2)
+        ledger["現金増減額（万円）"][i] = cash_change
+    return ledger
+
+
+ledger = snapshot.result("ledger", (cash_balances, table_keys), build_ledger)
+
+result_df = ledger.frame()
 st.markdown("### 集計結果")
 st.dataframe(result_df, use_container_width=True)
 
 # 感度分析
 st.markdown("### 感度分析シミュレーション")
-improve_rate = st.slider("TP/LT 改善率（％）", min_value=-100, max_value=100, value=0, step=1)
-cash_injection = st.number_input("一括現金注入（万円）", value=0)
+restored_whatif = snapshot.restored("whatif", {})
+improve_rate = st.slider("TP/LT 改善率（％）", min_value=-100, max_value=100, value=restored_whatif.get("rate", 0), step=1)
+cash_injection = st.number_input("一括現金注入（万円）", value=restored_whatif.get("injection", 0))
+snapshot.keep("whatif", {"rate": improve_rate, "injection": cash_injection})
 
-adjusted_tp_lt = result_df["加重平均キャッシュ生産性（TP/LT）"] * (1 + improve_rate / 100)
-adjusted_y = result_df["現金増減額（万円）"] * (1 + improve_rate / 100) + (cash_injection / months if months > 0 else 0)
+tp_lt, cash_change = ledger["加重平均キャッシュ生産性（TP/LT）"], ledger["現金増減額（万円）"]
+bases = snapshot.result("bases", (cash_balances, table_keys),
+                        lambda: cash_whatif.build_basis(tp_lt, cash_change, cash_balances[-1], months))
+adjusted_tp_lt = cash_whatif.evaluate(bases["tp_lt"], improve_rate, cash_injection)
+adjusted_y = cash_whatif.evaluate(bases["cash_change"], improve_rate, cash_injection)
 
 # 将来残高の予測グラフ（散布図）
 st.markdown("### グラフ：加重平均キャッシュ生産性 vs 現金増減額（散布図）")
@@ -77,9 +133,7 @@ st.pyplot(fig1)
 
 # 将来残高予測
 st.markdown("### 将来12ヶ月の現金残高（シミュレーション）")
-future_balance = [cash_balances[-1]]
-for i in range(12):
-    future_balance.append(future_balance[-1] + adjusted_y.mean())
+future_balance = cash_whatif.future_at(bases, improve_rate, cash_injection)
 
 fig2, ax2 = plt.subplots()
 ax2.plot(range(13), future_balance, marker="o")
@@ -90,8 +144,14 @@ ax2.grid(True)
 st.pyplot(fig2)
 
 # ゼロ残高月数の予測
-zero_month = next((i for i, v in enumerate(future_balance) if v <= 0), None)
+zero_month = cash_whatif.zero_month(future_balance)
 if zero_month is not None:
     st.error(f"⚠️ 将来 {zero_month} ヶ月目に現金残高がゼロ以下になる可能性があります。")
 else:
     st.success("✅ 将来12ヶ月間で現金残高がゼロになることはありません。")
+
+# 日次残高（長期・複数事業体）での資金ショート確認
+st.markdown("### 日次 現金残高（保存済み）")
+cash_daily.show_stored_daily("forecast_daily")
+
+snapshot.save()
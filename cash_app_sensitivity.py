@@ -3,8 +3,13 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import cash_ledger
+import cash_metrics
+import cash_whatif
+import cash_engine
+import cash_trend
 
-plt.rcParams["font.family"] = "Noto Sans CJK JP"
+cash_engine.setup_fonts()
 
 st.title("キャッシュ生産性分析 + 製品別TP/LT傾向 + 感度分析 + 将来残高グラフ")
 
@@ -30,29 +35,20 @@ for i in range(months):
 # 製品別TP/LT傾向データ準備
 all_products = []
 
-results = []
+ledger = cash_ledger.MonthlyLedger.allocate([f"{i+1}ヶ月目" for i in range(months)],
+                                            ["スループット総量（万円）", "LT加重総和（日）",
+                                             "加重平均キャッシュ生産性（TP/LT）", "現金増減額（万円）"])
 for i in range(months):
-    df = monthly_product_data[i]
-    df = df[(df["TP（万円）"] > 0) & (df["LT（日）"] > 0) & (df["出荷数"] > 0)]
-
-    df["TP/LT"] = df["TP（万円）"] / df["LT（日）"]
-    df["月"] = f"{i+1}ヶ月目"
-    all_products.append(df[["月", "製品名", "TP（万円）", "LT（日）", "TP/LT", "出荷数"]])
-
-    tp_total = (df["TP（万円）"] * df["出荷数"]).sum()
-    lt_total = (df["LT（日）"] * df["出荷数"]).sum()
-    weighted_tp_lt = tp_total / lt_total if lt_total > 0 else 0
+    all_products.append(cash_metrics.product_rows(monthly_product_data[i], f"{i+1}ヶ月目"))
+    tp_total, lt_total, weighted_tp_lt = cash_metrics.shipment_weighted(monthly_product_data[i])
     cash_change = cash_balances[i+1] - cash_balances[i]
 
-    results.append({
-        "月": f"{i+1}ヶ月目",
-        "スループット総量（万円）": tp_total,
-        "LT加重総和（日）": lt_total,
-        "加重平均キャッシュ生産性（TP/LT）": round(weighted_tp_lt, 2),
-        "現金増減額（万円）": cash_change
-    })
+    ledger["スループット総量（万円）"][i] = tp_total
+    ledger["LT加重総和（日）"][i] = lt_total
+    ledger["加重平均キャッシュ生産性（TP/LT）"][i] = round(weighted_tp_lt, 2)
+    ledger["現金増減額（万円）"][i] = cash_change
 
-result_df = pd.DataFrame(results)
+result_df = ledger.frame()
 st.markdown("### 集計結果")
 st.dataframe(result_df, use_container_width=True)
 
@@ -60,39 +56,30 @@ st.dataframe(result_df, use_container_width=True)
 st.markdown("### 製品別TP/LT傾向")
 if all_products:
     product_df = pd.concat(all_products, ignore_index=True)
-    fig, ax = plt.subplots()
-    for name, group in product_df.groupby("製品名"):
-        ax.plot(group["月"], group["TP/LT"], marker="o", label=name)
-
-    ax.set_title("製品別TP/LT推移")
-    ax.set_xlabel("月")
-    ax.set_ylabel("TP/LT（万円/日）")
-    ax.grid(True)
-    ax.legend()
-    st.pyplot(fig)
+    cash_trend.show_product_trends(product_df)
 
 # 感度分析
 st.markdown("### 感度分析シミュレーション")
 improve_rate = st.slider("TP/LT 改善率（％）", min_value=-100, max_value=100, value=0, step=1)
 cash_injection = st.number_input("一括現金注入（万円）", value=0)
 
-adjusted_tp_lt = result_df["加重平均キャッシュ生産性（TP/LT）"] * (1 + improve_rate / 100)
-adjusted_y = result_df["現金増減額（万円）"] * (1 + improve_rate / 100) + (cash_injection / months if months > 0 else 0)
+bases = cash_whatif.build_basis(ledger["加重平均キャッシュ生産性（TP/LT）"], ledger["現金増減額（万円）"],
+                                cash_balances[-1], months)
+adjusted_tp_lt = cash_whatif.evaluate(bases["tp_lt"], improve_rate, cash_injection)
+adjusted_y = cash_whatif.evaluate(bases["cash_change"], improve_rate, cash_injection)
 
 # シミュレーション結果
 st.markdown("#### シミュレーション結果")
 sim_df = pd.DataFrame({
-    "月": result_df["月"],
-    "改善後キャッシュ生産性": adjusted_tp_lt.round(2),
-    "改善後現金増減額（万円）": adjusted_y.round(2)
+    "月": ledger.months,
+    "改善後キャッシュ生産性": np.round(adjusted_tp_lt, 2),
+    "改善後現金増減額（万円）": np.round(adjusted_y, 2)
 })
 st.dataframe(sim_df, use_container_width=True)
 
 # 将来残高の予測グラフ
 st.markdown("### グラフ：将来現金残高（シミュレーション）")
-future_balance = [cash_balances[-1]]
-for i in range(12):
-    future_balance.append(future_balance[-1] + adjusted_y.mean())
+future_balance = cash_whatif.future_at(bases, improve_rate, cash_injection)
 
 fig2, ax2 = plt.subplots()
 ax2.plot(range(13), future_balance, marker="o")
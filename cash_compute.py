@@ -0,0 +1,92 @@
+import numpy as np
+
+# 予測・感度分析・資金ショート判定の計算本体（streamlit に依存しない）。
+# 入出力は JSON にできる値（数値・文字列・リスト・辞書）だけにして、
+# 計算サービス（cash_service）のワーカープロセスでも画面のプロセスでもそのまま呼べるようにする。
+
+
+def _floats(values):
+    return [None if np.isnan(v) else float(v) for v in np.asarray(values, dtype=float)]
+
+
+# --- 平均増減ペースによる将来残高（app.py 手入力モード・cashflow_app_full.py） ---
+# rates は平均増減に掛ける改善率、deltas は平均増減に足す月あたりの額（製品ミックス最適化の増分など）
+def forecast(last_cash, changes, horizon=12, rates=(), deltas=()):
+    changes = np.asarray(changes, dtype=float)
+    changes = changes[~np.isnan(changes)]
+    avg = float(changes.mean()) if len(changes) else 0.0
+    steps = np.arange(1, horizon + 1)
+    scenarios = {str(rate): _floats(last_cash + avg * (1 + rate) * steps) for rate in rates}
+    return {
+        "平均増減": avg,
+        "ショートまでの月数": float(last_cash / abs(avg)) if avg < 0 else None,
+        "将来残高": _floats(last_cash + avg * steps),
+        "シナリオ": scenarios,
+        "加算シナリオ": {str(delta): _floats(last_cash + (avg + delta) * steps) for delta in deltas},
+    }
+
+
+# --- 加重平均TP/LTと現金増減の回帰による感度分析（cashflow_app_full.py） ---
+def sensitivity(x, y, rate):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    slope, intercept = np.polyfit(x, y, 1)
+    virtual_x = x * (1 + rate)
+    return {
+        "傾き": float(slope),
+        "切片": float(intercept),
+        "仮想TP/LT": _floats(virtual_x),
+        "仮想現金増減": _floats(virtual_x * slope + intercept),
+    }
+
+
+# --- 月別の現金増減からの資金ショート判定（cash_full_app.py） ---
+# months / changes は月別台帳（cash_ledger）の月ラベルと現金増減の列。累積和で一度に判定する
+def _first_negative(balances):
+    negative = balances < 0
+    return int(np.argmax(negative)) if negative.any() else None
+
+
+def estimate_shortage_month(months, changes):
+    i = _first_negative(np.cumsum(np.asarray(changes, dtype=float)))
+    return None if i is None else months[i]
+
+
+def estimate_precise_shortage_month(months, changes, starting_cash):
+    changes = np.asarray(changes, dtype=float)
+    balances = starting_cash + np.cumsum(changes)
+    i = _first_negative(balances)
+    if i is None:
+        return None
+    if changes[i] == 0:
+        return months[i]
+    # 線形補完：残高0になる割合を算出
+    current_cash = balances[i] - changes[i]
+    ratio = current_cash / abs(changes[i])
+    return f"{months[i]}の{ratio*100:.1f}%時点"
+
+
+def simulate_sensitivity(months, changes, starting_cash, tp_lt_ratio_range):
+    # 改善率 × 月 の残高を一度に求める（行 = 改善率）
+    ratios = np.asarray(tp_lt_ratio_range, dtype=float)
+    balances = starting_cash + np.cumsum(np.outer(1 + ratios, np.asarray(changes, dtype=float)), axis=1)
+    negative = balances < 0
+    first = negative.argmax(axis=1) if negative.shape[1] else np.zeros(len(ratios), dtype=int)
+    return [{
+        "改善率": f"{int(ratio*100)}%",
+        "資金ショート月": months[i] if hit else "ショートなし"
+    } for ratio, i, hit in zip(tp_lt_ratio_range, first, negative.any(axis=1))]
+
+
+def shortage(months, changes, starting_cash, ratios):
+    return {
+        "精密ショート": estimate_precise_shortage_month(months, changes, starting_cash),
+        "感度分析": simulate_sensitivity(months, changes, starting_cash, ratios),
+        "ショート月": estimate_shortage_month(months, changes),
+    }
+
+
+OPS = {
+    "forecast": forecast,
+    "sensitivity": sensitivity,
+    "shortage": shortage,
+}
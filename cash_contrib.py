@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import streamlit as st
+
+import cash_trend
+
+# 製品別の寄与分析：製品×月の行列と月次の現金増減ベクトルから、
+# 全製品の相関係数・回帰係数（傾き）を行列とベクトルの積だけで一度に求める。
+# 欠損（その月に行のない製品）は製品ごとにペアワイズで除外する。
+VALUES = {"TP/LT": "TP/LT（万円/日）", "スループット": "スループット（万円）"}
+MIN_MONTHS = 3
+
+
+def _moments(matrix, cash_change):
+    # 製品ごとの n, Σx, Σy, Σxx, Σyy, Σxy（x, y とも欠損のない月だけ）
+    y = np.asarray(cash_change, dtype=float)
+    mask = ~np.isnan(matrix) & ~np.isnan(y)[None, :]
+    x = np.where(mask, matrix, 0.0)
+    m = mask.astype(float)
+    y0 = np.nan_to_num(y)
+    return m.sum(axis=1), x.sum(axis=1), m @ y0, np.einsum("ij,ij->i", x, x), m @ (y0 * y0), x @ y0
+
+
+def _fit(n, sx, sy, sxx, syy, sxy, min_months):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+        slope = cov / var_x
+    # 丸め誤差で分散がわずかに残る定数系列は相関なしとする
+    flat = (var_x <= 1e-12 * np.maximum(sxx, 1.0)) | (var_y <= 1e-12 * np.maximum(syy, 1.0)) | (n < min_months)
+    return np.where(flat, np.nan, np.clip(corr, -1, 1)), np.where(flat, np.nan, slope)
+
+
+def contributions(products, matrix, cash_change, min_months=MIN_MONTHS):
+    n, sx, sy, sxx, syy, sxy = _moments(matrix, cash_change)
+    corr, slope = _fit(n, sx, sy, sxx, syy, sxy, min_months)
+    return pd.DataFrame({
+        "製品名": products,
+        "月数": n.astype(int),
+        "相関係数": corr,
+        "回帰係数": slope,
+        "決定係数": corr * corr,
+    })
+
+
+def rolling_correlation(matrix, cash_change, window, min_months=MIN_MONTHS):
+    # 各月を終点とする直近 window ヶ月の相関（製品×終点月）。月方向の累積和の差で全窓を一度に求める
+    y = np.asarray(cash_change, dtype=float)
+    mask = ~np.isnan(matrix) & ~np.isnan(y)[None, :]
+    x = np.where(mask, matrix, 0.0)
+    y0 = np.where(mask, np.nan_to_num(y)[None, :], 0.0)
+    terms = [mask.astype(float), x, y0, x * x, y0 * y0, x * y0]
+    window = min(window, matrix.shape[1])
+    sums = []
+    for t in terms:
+        cum = np.concatenate([np.zeros((len(t), 1)), np.cumsum(t, axis=1)], axis=1)
+        sums.append(cum[:, window:] - cum[:, :-window])
+    corr, _ = _fit(*sums, min(min_months, window))
+    return corr
+
+
+def top_contributors(table, n, column="相関係数"):
+    # 正・負それぞれの上位 n 製品（O(P) で取り出してから並べ替える）
+    score = table[column].to_numpy(dtype=float)
+    valid = np.flatnonzero(~np.isnan(score))
+    n = min(n, len(valid))
+    if n == 0:
+        return table.iloc[:0], table.iloc[:0]
+    pos = valid[np.argpartition(-score[valid], n - 1)[:n]]
+    neg = valid[np.argpartition(score[valid], n - 1)[:n]]
+    pos = pos[np.argsort(-score[pos])]
+    neg = neg[np.argsort(score[neg])]
+    return table.iloc[pos].reset_index(drop=True), table.iloc[neg].reset_index(drop=True)
+
+
+def csv_products(df):
+    # 月次CSV（cashflow_app_full.py）の行 → 月・製品名・TP/LT・スループット
+    tp = pd.to_numeric(df["スループット（TP）"], errors="coerce").to_numpy(dtype=float)
+    lt = pd.to_numeric(df["リードタイム（LT）"], errors="coerce").to_numpy(dtype=float)
+    qty = pd.to_numeric(df["出荷数"], errors="coerce").to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tp_lt = np.where(lt > 0, tp / lt, np.nan)
+    return pd.DataFrame({"月": df["月（YYYY-MM）"].to_numpy(), "製品名": df["製品名"].to_numpy(),
+                         "TP/LT": tp_lt, "スループット": tp * qty})
+
+
+# --- 画面 ---
+def show_contributions(product_df, months, cash_change, key):
+    col1, col2, col3 = st.columns(3)
+    value = col1.radio("製品の指標", list(VALUES), horizontal=True, key=f"{key}_value")
+    top_n = col2.number_input("表示する製品数", min_value=1, max_value=100, value=10, key=f"{key}_n")
+    window = col3.number_input("ローリング窓（ヶ月、0 = 全期間のみ）", min_value=0, max_value=max(len(months), 1),
+                               value=0, key=f"{key}_window")
+
+    products, months, matrix = cash_trend.product_month_matrix(product_df, value=value, months=months)
+    table = contributions(products, matrix, cash_change)
+    if table["相関係数"].notna().sum() == 0:
+        st.info(f"{MIN_MONTHS}ヶ月以上のデータがあり、値が変動している製品がありません。")
+        return
+
+    positive, negative = top_contributors(table, int(top_n))
+    left, right = st.columns(2)
+    left.markdown("**現金増減と正の相関が強い製品**")
+    left.dataframe(positive.round(3), use_container_width=True)
+    right.markdown("**現金増減と負の相関が強い製品**")
+    right.dataframe(negative.round(3), use_container_width=True)
+    st.caption(f"回帰係数：{VALUES[value]} が1増えたときの現金増減（{len(products)} 製品）")
+
+    if window >= 2 and len(months) >= window:
+        corr = rolling_correlation(matrix, cash_change, int(window))
+        names = pd.concat([positive["製品名"], negative["製品名"]]).drop_duplicates()
+        rows = pd.Index(products).get_indexer(names)
+        fig, ax = plt.subplots(figsize=(10, 0.35 * len(rows) + 1.5))
+        image = ax.imshow(corr[rows], aspect="auto", cmap="RdBu", vmin=-1, vmax=1)
+        ax.set_yticks(np.arange(len(rows)))
+        ax.set_yticklabels(list(names))
+        ends = list(months[window - 1:])
+        step = max(len(ends) // 12, 1)
+        ax.set_xticks(np.arange(0, len(ends), step))
+        ax.set_xticklabels(ends[::step], rotation=45, ha="right")
+        ax.set_title(f"直近{window}ヶ月のローリング相関（終点月）")
+        fig.colorbar(image, ax=ax)
+        st.pyplot(fig)
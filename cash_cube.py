@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import streamlit as st
+
+import cash_service
+import cash_store
+
+# 受注明細 → 出荷月×製品の集計キューブ。
+# 出荷月と品名のコードから (月, 製品) の通し番号を作り、スループット・出荷数・リードタイム・件数を
+# それぞれ1回の bincount で合計する（受注の行数によらず、以降の処理は月数×製品数の大きさで済む）。
+MEASURES = ["スループット", "出荷数", "リードタイム", "件数"]
+
+
+class OrderCube:
+    def __init__(self, months, products, sums):
+        self.months = list(months)
+        self.products = list(products)
+        self.sums = sums
+
+    # 月×製品のうち受注のあるセル：手入力モード・履歴と同じ TP（万円）/ LT（日）/ 出荷数 の形
+    def cells(self):
+        count = self.sums["件数"]
+        m, p = np.nonzero(count)
+        return pd.DataFrame({
+            "月": np.asarray(self.months, dtype=object)[m],
+            "製品名": np.asarray(self.products, dtype=object)[p],
+            "TP（万円）": self.sums["スループット"][m, p] / 10000,
+            "LT（日）": self.sums["リードタイム"][m, p] / count[m, p],
+            "出荷数": self.sums["出荷数"][m, p],
+        })
+
+    # 月別の合計と、手入力モードと同じTP加重の加重平均TP/LT：Σ(TP²/LT) / ΣTP
+    def monthly(self):
+        count = self.sums["件数"]
+        tp = self.sums["スループット"] / 10000
+        lt = np.divide(self.sums["リードタイム"], count, out=np.zeros_like(tp), where=count > 0)
+        valid = (count > 0) & (lt > 0)
+        numerator = np.divide(tp * tp, lt, out=np.zeros_like(tp), where=valid).sum(axis=1)
+        total_tp = np.where(valid, tp, 0.0).sum(axis=1)
+        orders = count.sum(axis=1)
+        return pd.DataFrame({
+            "月": self.months,
+            "受注件数": orders.astype(int),
+            "出荷数": self.sums["出荷数"].sum(axis=1),
+            "スループット（万円）": tp.sum(axis=1),
+            "平均LT（日）": np.divide(self.sums["リードタイム"].sum(axis=1), orders, out=np.zeros(len(orders)),
+                                  where=orders > 0),
+            "加重平均TP/LT": np.divide(numerator, total_tp, out=np.zeros(len(numerator)), where=total_tp > 0),
+        })
+
+
+def build_cube(df):
+    ship = df["出荷日"].to_numpy(dtype="datetime64[M]")
+    codes = df["品名"].cat.codes.to_numpy()
+    valid = ~np.isnat(ship) & (codes >= 0)
+    if not valid.any():
+        return OrderCube([], [], {name: np.zeros((0, 0)) for name in MEASURES})
+    ship, codes = ship[valid], codes[valid]
+
+    first = ship.min()
+    m_codes = (ship - first).astype(int)
+    n_months = int(m_codes.max()) + 1
+    n_products = len(df["品名"].cat.categories)
+    flat = m_codes * n_products + codes
+    size = n_months * n_products
+
+    qty = np.nan_to_num(df["出荷数"].to_numpy(dtype=float)[valid])
+    weights = {
+        "スループット": np.nan_to_num(df["スループット"].to_numpy(dtype=float)[valid]) * qty,
+        "出荷数": qty,
+        "リードタイム": np.nan_to_num(df["リードタイム"].to_numpy(dtype=float)[valid]),
+        "件数": None,
+    }
+    sums = {name: np.bincount(flat, weights=w, minlength=size).reshape(n_months, n_products)
+            for name, w in weights.items()}
+    months = np.arange(first, first + n_months).astype(str)
+    return OrderCube(months, df["品名"].cat.categories, sums)
+
+
+# --- 画面：日次シミュレーションの月末残高と突き合わせて、散布図・将来予測・履歴保存まで行う ---
+def show_monthly(cube, daily, key):
+    if not cube.months:
+        st.info("出荷日と品名のある受注がありません。")
+        return
+    monthly = cube.monthly()
+    if len(daily):
+        month_end = daily["現金残高"].resample("ME").last()
+        cash = pd.DataFrame({"月": month_end.index.strftime("%Y-%m"), "期末現金残高": month_end.to_numpy() / 10000})
+        cash["期首現金残高"] = cash["期末現金残高"].shift(1)
+        cash.loc[0, "期首現金残高"] = (daily["現金残高"].iloc[0] - daily["純増減"].iloc[0]) / 10000
+        monthly = monthly.merge(cash, on="月", how="left")
+        monthly["現金増減額（万円）"] = monthly["期末現金残高"] - monthly["期首現金残高"]
+    st.dataframe(monthly.round(2), use_container_width=True)
+    if "現金増減額（万円）" not in monthly:
+        return
+
+    chart = monthly.dropna(subset=["現金増減額（万円）"])
+    if chart.empty:
+        return
+    fig, ax = plt.subplots()
+    ax.scatter(chart["加重平均TP/LT"], chart["現金増減額（万円）"], color="blue")
+    for month, x, y in zip(chart["月"], chart["加重平均TP/LT"], chart["現金増減額（万円）"]):
+        ax.annotate(month, (x, y), textcoords="offset points", xytext=(5, 5), ha="left")
+    ax.set_xlabel("加重平均キャッシュ生産性")
+    ax.set_ylabel("現金増減額（万円）")
+    ax.set_title("出荷月別：加重平均キャッシュ生産性と現金増減額の関係")
+    ax.grid(True)
+    st.pyplot(fig)
+
+    forecast = cash_service.call("forecast", last_cash=float(chart["期末現金残高"].iloc[-1]),
+                                 changes=chart["現金増減額（万円）"].tolist())
+    if forecast["平均増減"] < 0:
+        st.warning(f"📉 平均月間現金減少 {forecast['平均増減']:,.1f}万円：資金ショートまで約 "
+                   f"{forecast['ショートまでの月数']:.1f} ヶ月")
+        fig2, ax2 = plt.subplots()
+        ax2.plot(range(1, len(forecast["将来残高"]) + 1), forecast["将来残高"], marker="o")
+        ax2.axhline(0, color="red", linestyle="--")
+        ax2.set_title("将来の現金残高予測（出荷月別集計から）")
+        ax2.set_xlabel("現在からの月数")
+        ax2.set_ylabel("予測現金残高（万円）")
+        ax2.grid(True)
+        st.pyplot(fig2)
+    else:
+        st.success("現在は資金ショートの兆候は見られません。")
+
+    # 手入力なしで「月別手入力で分析」の履歴として使えるように保存する
+    col1, col2 = st.columns([3, 1])
+    entity = col1.text_input("保存先の事業体", value=cash_store.DEFAULT_ENTITY, key=f"{key}_entity")
+    if col2.button("月別データを履歴に保存", key=f"{key}_save"):
+        cells = cube.cells()
+        by_month = {m: g for m, g in cells.groupby("月")}
+        for row in chart.itertuples(index=False):
+            cash_store.save_month(entity, row.月, float(row.期首現金残高), float(row.期末現金残高),
+                                  by_month.get(row.月))
+        st.success(f"{entity} の {len(chart)} ヶ月分を保存しました。")
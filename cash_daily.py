@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import streamlit as st
+
+import cash_daily_store
+
+# 受注明細からの日次キャッシュシミュレーション。
+# 生産開始日に変動費（材料費＋外注費）を支払い、出荷日＋回収サイトに売上を回収する。
+# 受注ごとのループではなく、日付オフセットへの bincount（scatter-add）で日次に集計する。
+# 日数は最初の日から最後の日までなので、入力ミスの日付（2204年など）1件で数十年分の配列になる。
+# 生産開始日の中央値から前後 WINDOW_DAYS 日を外れる受注は除外し、件数を返して画面で知らせる。
+WINDOW_DAYS = int(os.environ.get("CASH_DAILY_WINDOW_DAYS", "1830"))
+
+
+def _day_index(dates, origin):
+    return (dates - origin) // np.timedelta64(1, "D")
+
+
+# 戻り値は (日次の表, 期間外として除外した受注の件数)
+def simulate_daily_cash(df, opening_cash, payment_term_days=30):
+    start = df["生産開始日"].to_numpy(dtype="datetime64[D]")
+    ship = df["出荷日"].to_numpy(dtype="datetime64[D]")
+    qty = df["出荷数"].to_numpy(dtype=float)
+    cash_out = (df["材料費"].to_numpy(dtype=float) + df["外注費"].to_numpy(dtype=float)) * qty
+    cash_in = df["売上単価"].to_numpy(dtype=float) * qty
+
+    receipt = ship + np.timedelta64(int(payment_term_days), "D")
+    valid = ~(np.isnat(start) | np.isnat(ship) | np.isnan(cash_out) | np.isnan(cash_in))
+    excluded = 0
+    if valid.any():
+        center = np.median(start[valid].astype("int64"))
+        inside = ((np.abs(start.astype("int64") - center) <= WINDOW_DAYS)
+                  & (np.abs(receipt.astype("int64") - center) <= WINDOW_DAYS))
+        excluded = int((valid & ~inside).sum())
+        valid &= inside
+    if not valid.any():
+        return pd.DataFrame(columns=["入金", "出金", "純増減", "現金残高"], dtype=float,
+                            index=pd.DatetimeIndex([], name="日付")), excluded
+    start, receipt, cash_out, cash_in = start[valid], receipt[valid], cash_out[valid], cash_in[valid]
+
+    # 回収サイトが負のときは入金日が最初の生産開始日より前になるので、起点は両方の最小にする
+    origin = min(start.min(), receipt.min())
+    out_idx = _day_index(start, origin)
+    in_idx = _day_index(receipt, origin)
+    n_days = int(max(out_idx.max(), in_idx.max())) + 1
+
+    inflow = np.bincount(in_idx, weights=cash_in, minlength=n_days)
+    outflow = np.bincount(out_idx, weights=cash_out, minlength=n_days)
+    net = inflow - outflow
+    balance = opening_cash + np.cumsum(net)
+
+    return pd.DataFrame(
+        {"入金": inflow, "出金": outflow, "純増減": net, "現金残高": balance},
+        index=pd.date_range(pd.Timestamp(origin), periods=n_days, freq="D", name="日付"),
+    ), excluded
+
+
+def shortage_summary(daily):
+    balance = daily["現金残高"].to_numpy()
+    negative = balance < 0
+    first = daily.index[np.argmax(negative)] if negative.any() else None
+    low = int(np.argmin(balance)) if len(balance) else None
+    return {
+        "初回ショート日": first,
+        "最低残高": balance[low] if low is not None else None,
+        "最低残高日": daily.index[low] if low is not None else None,
+        "ショート日数": int(negative.sum()),
+    }
+
+
+def hidden_monthly_shortages(daily):
+    # 月末残高はプラスでも月中にマイナスとなる月（月次粒度では見えないショート）
+    monthly = daily["現金残高"].resample("ME").agg(["last", "min"])
+    monthly.columns = ["月末残高", "月中最低残高"]
+    monthly.index = monthly.index.strftime("%Y-%m")
+    monthly.index.name = "月"
+    return monthly[(monthly["月末残高"] >= 0) & (monthly["月中最低残高"] < 0)]
+
+
+# --- 保存済み日次残高の表示（期間指定は memmap のスライスで読む） ---
+def show_stored_daily(key):
+    entities = cash_daily_store.list_entities()
+    if not entities:
+        st.info("保存済みの日次残高はありません。CSV分析の日次シミュレーションから保存できます。")
+        return
+    entity = st.selectbox("事業体", entities, key=f"{key}_entity")
+    span = cash_daily_store.date_range(entity)
+    if span is None:
+        st.info(f"{entity} の日次残高はまだ1日も保存されていません。")
+        return
+    first, last = span
+    first, last = pd.Timestamp(first).date(), pd.Timestamp(last).date()
+    period = st.date_input("表示期間", value=(first, last), min_value=first, max_value=last, key=f"{key}_period")
+    if not isinstance(period, tuple) or len(period) != 2:
+        return
+
+    daily = cash_daily_store.to_frame(cash_daily_store.read(entity, period[0], period[1]))
+    summary = shortage_summary(daily)
+    if summary["初回ショート日"] is not None:
+        st.error(f"🚨 {summary['初回ショート日']:%Y-%m-%d} に現金残高がマイナス"
+                 f"（最低 {summary['最低残高']:,.0f} / {summary['最低残高日']:%Y-%m-%d}）")
+    else:
+        st.success("✅ 選択期間中に現金残高がマイナスになる日はありません。")
+
+    fig, ax = plt.subplots(figsize=(10, 4))
+    ax.plot(daily.index, daily["現金残高"], linewidth=1)
+    ax.axhline(0, color="red", linestyle="--")
+    ax.set_title(f"{entity}：日次 現金残高推移")
+    ax.set_xlabel("日付")
+    ax.set_ylabel("現金残高")
+    ax.grid(True)
+    st.pyplot(fig)
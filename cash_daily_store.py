@@ -0,0 +1,138 @@
+import os
+import struct
+import threading
+from collections import namedtuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+# 日次の現金残高・入出金を事業体ごとの固定レイアウトファイルに保存し、np.memmap で読む。
+# ファイル = 64バイトのヘッダ（識別子・起点日）＋ 1日1レコード（残高・入金・出金の float64）。
+# 日数はファイルサイズから求めるので、日の追加は末尾への追記だけで済む。
+DEFAULT_ROOT = os.environ.get("CASH_DAILY_STORE", "cash_daily")
+MAGIC = b"CASHDLY1"
+HEADER = struct.Struct("<8sq48x")
+RECORD = np.dtype([("残高", "<f8"), ("入金", "<f8"), ("出金", "<f8")])
+EPOCH = np.datetime64("1970-01-01", "D")
+
+DailySeries = namedtuple("DailySeries", ["origin", "records"])
+
+# 書き込みは事業体ごとに1つずつ（ヘッダの作成・上書き・追記が同じファイルに同時に走らないように）。
+# 書き込むのは Streamlit のサーバープロセスだけなので、プロセス内のロックで足りる
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock(path):
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _path(entity, root=None):
+    return os.path.join(root or DEFAULT_ROOT, quote(entity, safe="") + ".daily")
+
+
+def _read_origin(path):
+    with open(path, "rb") as f:
+        magic, origin = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"日次ストアの形式が不正です: {path}")
+    return EPOCH + np.timedelta64(origin, "D")
+
+
+def _day_count(path):
+    return (os.path.getsize(path) - HEADER.size) // RECORD.itemsize
+
+
+def list_entities(root=None):
+    root = root or DEFAULT_ROOT
+    if not os.path.isdir(root):
+        return []
+    return sorted(unquote(name[:-len(".daily")]) for name in os.listdir(root) if name.endswith(".daily"))
+
+
+# 保存済みの最初と最後の日。1日も保存されていなければ None
+def date_range(entity, root=None):
+    path = _path(entity, root)
+    origin = _read_origin(path)
+    n_days = _day_count(path)
+    if n_days == 0:
+        return None
+    return origin, origin + np.timedelta64(n_days - 1, "D")
+
+
+# --- 書き込み：既存期間はその場で上書き、以降の日は末尾に追記 ---
+def write(entity, daily, root=None):
+    path = _path(entity, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _lock(path):
+        _write(path, entity, daily, root)
+
+
+def _write(path, entity, daily, root):
+    dates = daily.index.to_numpy(dtype="datetime64[D]")
+    records = np.empty(len(daily), dtype=RECORD)
+    records["残高"] = daily["現金残高"].to_numpy(dtype=float)
+    records["入金"] = daily["入金"].to_numpy(dtype=float)
+    records["出金"] = daily["出金"].to_numpy(dtype=float)
+
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, int((dates[0] - EPOCH) // np.timedelta64(1, "D"))))
+    origin = _read_origin(path)
+    offsets = (dates - origin) // np.timedelta64(1, "D")
+    if (offsets < 0).any():
+        raise ValueError(f"{entity} の起点日 {origin} より前の日付は保存できません。")
+
+    n_days = _day_count(path)
+    inside = offsets < n_days
+    if inside.any():
+        mm = np.memmap(path, dtype=RECORD, mode="r+", offset=HEADER.size, shape=(n_days,))
+        mm[offsets[inside]] = records[inside]
+        mm.flush()
+        del mm
+
+    if (~inside).any():
+        positions = offsets[~inside] - n_days
+        tail = np.zeros(int(positions.max()) + 1, dtype=RECORD)
+        tail[positions] = records[~inside]
+        # 欠けている日は入出金ゼロ・残高は直前の日の値で埋める
+        filled = np.full(len(tail), -1)
+        filled[positions] = positions
+        np.maximum.accumulate(filled, out=filled)
+        previous = read(entity, root=root).records[-1]["残高"] if n_days else np.nan
+        tail["残高"] = np.where(filled >= 0, tail["残高"][np.maximum(filled, 0)], previous)
+        with open(path, "ab") as f:
+            f.write(tail.tobytes())
+
+
+def append_day(entity, date, balance, inflow=0.0, outflow=0.0, root=None):
+    daily = pd.DataFrame({"現金残高": [balance], "入金": [inflow], "出金": [outflow]},
+                         index=pd.DatetimeIndex([pd.Timestamp(date)]))
+    write(entity, daily, root=root)
+
+
+# --- 読み込み：指定期間のレコードをコピーせずに返す ---
+def read(entity, start=None, end=None, root=None):
+    path = _path(entity, root)
+    origin = _read_origin(path)
+    n_days = _day_count(path)
+    if n_days == 0:
+        return DailySeries(origin, np.empty(0, dtype=RECORD))
+    mm = np.memmap(path, dtype=RECORD, mode="r", offset=HEADER.size, shape=(n_days,))
+
+    i0 = 0 if start is None else int((np.datetime64(start, "D") - origin) // np.timedelta64(1, "D"))
+    i1 = n_days if end is None else int((np.datetime64(end, "D") - origin) // np.timedelta64(1, "D")) + 1
+    i0, i1 = max(i0, 0), min(max(i1, 0), n_days)
+    return DailySeries(origin + np.timedelta64(i0, "D"), mm[i0:i1])
+
+
+def to_frame(series):
+    # 描画・表示用（選択期間のみコピー）
+    index = pd.date_range(pd.Timestamp(series.origin), periods=len(series.records), freq="D", name="日付")
+    return pd.DataFrame({
+        "現金残高": series.records["残高"],
+        "入金": series.records["入金"],
+        "出金": series.records["出金"],
+    }, index=index)
@@ -0,0 +1,62 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import plotly.express as px
+import streamlit as st
+
+# 受注明細の製品別索引：取り込み時に品名ごとの行位置を並べ替えて一度だけ作り、
+# 製品の行は order[offsets[i]:offsets[i+1]] で取り出す（全体を絞り込み直さず、その製品の行数だけの処理）。
+
+
+class ProductIndex:
+    def __init__(self, names):
+        names = names.astype("category") if names.dtype != "category" else names
+        codes = names.cat.codes.to_numpy()
+        self.products = list(names.cat.categories)
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.products))
+        # 品名の欠けた行（コード -1）は先頭に並ぶので除く。同じ製品の中では元の行順を保つ
+        order = np.argsort(codes, kind="stable")[len(codes) - counts.sum():]
+        self.order = order.astype(np.int32) if len(codes) < 2**31 else order
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._position = {name: i for i, name in enumerate(self.products)}
+
+    def count(self, product):
+        i = self._position[product]
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    def positions(self, product):
+        i = self._position[product]
+        return self.order[self.offsets[i]:self.offsets[i + 1]]
+
+    def rows(self, df, product):
+        return df.take(self.positions(product))
+
+
+# --- 画面：選んだ製品の受注・リードタイム推移・バブルチャート ---
+def show_product_drilldown(df, index, key):
+    if not index.products:
+        st.info("品名のある行がありません。")
+        return
+    product = st.selectbox("製品", index.products, format_func=lambda p: f"{p}（{index.count(p):,}件）",
+                           key=f"{key}_product")
+    rows = index.rows(df, product)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("受注件数", f"{len(rows):,}")
+    col2.metric("スループット合計", f"{rows['スループット'].sum():,.0f}")
+    col3.metric("平均TP/LT", f"{rows['TP/LT'].mean():,.1f}")
+
+    st.dataframe(rows, use_container_width=True)
+
+    history = rows.dropna(subset=["出荷日"]).sort_values("出荷日")
+    if len(history):
+        fig, ax = plt.subplots(figsize=(10, 3))
+        ax.plot(history["出荷日"], history["リードタイム"], marker="o", linewidth=1)
+        ax.set_title(f"{product}：出荷日別のリードタイム")
+        ax.set_xlabel("出荷日")
+        ax.set_ylabel("リードタイム（日）")
+        ax.grid(True)
+        st.pyplot(fig)
+
+    fig = px.scatter(rows, x="TP/LT", y="スループット", size="出荷数",
+                     hover_data=["出荷日", "スループット", "TP/LT", "リードタイム"])
+    st.plotly_chart(fig, use_container_width=True, key=f"{key}_bubble")
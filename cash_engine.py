@@ -0,0 +1,177 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import matplotlib.pyplot as plt
+import matplotlib.font_manager as fm
+import pandas as pd
+import streamlit as st
+
+import cash_cube
+import cash_drilldown
+import cash_group
+import cash_jobs
+import cash_metrics
+import cash_parallel
+import cash_sample
+
+# 全ページで共有する計算エンジン。フォント設定・データセットキャッシュをプロセス内で一度だけ用意する
+JP_FONTS = ["IPAexGothic", "Noto Sans CJK JP", "IPAGothic", "TakaoGothic"]
+MAX_DATASETS = int(os.environ.get("CASH_ENGINE_MAX_DATASETS", "8"))
+
+Upload = namedtuple("Upload", ["name", "digest", "data"])
+
+_font_lock = threading.Lock()
+_font_ready = False
+
+
+# --- フォント設定（日本語対応） ---
+def setup_fonts():
+    global _font_ready
+    with _font_lock:
+        if _font_ready:
+            return
+        available_fonts = set(f.name for f in fm.fontManager.ttflist)
+        for font in JP_FONTS:
+            if font in available_fonts:
+                plt.rcParams["font.family"] = font
+                break
+        _font_ready = True
+
+
+# --- 解析済みデータセットのキャッシュ（プロセス全体・セッション横断） ---
+class Engine:
+    def __init__(self, max_datasets=MAX_DATASETS):
+        self.max_datasets = max_datasets
+        self._datasets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind, digest):
+        with self._lock:
+            key = (kind, digest)
+            if key not in self._datasets:
+                return None
+            self._datasets.move_to_end(key)
+            return self._datasets[key]
+
+    def put(self, kind, digest, value):
+        with self._lock:
+            self._datasets[(kind, digest)] = value
+            self._datasets.move_to_end((kind, digest))
+            while len(self._datasets) > self.max_datasets:
+                self._datasets.popitem(last=False)
+
+
+@st.cache_resource
+def get_engine():
+    setup_fonts()
+    return Engine()
+
+
+# --- アップロードの共有：一度アップロードしたファイルを他のページでも使う ---
+def remember_upload(kind, uploaded_file):
+    # 同じファイルかどうかはアップロードごとに振られる file_id で判定する（名前とサイズが同じ別ファイルもある）
+    uploads = st.session_state.setdefault("_cash_uploads", {})
+    file_ids = st.session_state.setdefault("_cash_upload_ids", {})
+    current = uploads.get(kind)
+    if current is not None and current.data is not None and file_ids.get(kind) == uploaded_file.file_id:
+        return current
+    data = uploaded_file.getvalue()
+    upload = Upload(uploaded_file.name, hashlib.blake2b(data, digest_size=16).hexdigest(), data)
+    uploads[kind] = upload
+    file_ids[kind] = uploaded_file.file_id
+    return upload
+
+
+def current_upload(kind):
+    return st.session_state.get("_cash_uploads", {}).get(kind)
+
+
+# 解析済みならキャッシュから返し、未解析ならバックグラウンドジョブで解析する。
+# 戻り値は (結果, ジョブ)。キャッシュヒット時のジョブは None。preview はジョブの途中結果の表示関数
+def load(kind, parser, label, preview=None):
+    upload = current_upload(kind)
+    if upload is None:
+        return None, None
+    engine = get_engine()
+    cached = engine.get(kind, upload.digest)
+    if cached is not None:
+        return cached, None
+    job = cash_jobs.submit(kind, upload.digest, parser, upload.data)
+    result = cash_jobs.wait_for(job, label, preview)
+    engine.put(kind, upload.digest, result)
+    return result, job
+
+
+# --- 解析処理（ジョブ関数） ---
+def detect_encoding(data, probe=2**20):
+    # 先頭の一部（行の区切りまで）だけで判定する。全体を decode すると大きなファイルで概算の表示が遅れる
+    head = data[:probe]
+    if len(data) > probe:
+        head = head[:head.rfind(b"\n") + 1] or head
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # 途中で切れた末尾の多バイト文字だけが読めない場合は UTF-8
+        if e.reason != "unexpected end of data":
+            return "shift-jis"
+    return "utf-8"
+
+
+def _read_orders(job, data, encoding):
+    if cash_parallel.enabled(data):
+        return cash_parallel.parse_orders(job, data, encoding)
+    job.report(0.0, "CSV解析")
+    buf = io.BytesIO(data)
+    chunks = []
+    for chunk in pd.read_csv(buf, encoding=encoding, chunksize=200_000):
+        chunks.append(chunk)
+        job.report(0.7 * buf.tell() / max(len(data), 1), "CSV解析")
+    df = pd.concat(chunks, ignore_index=True)
+
+    job.report(0.75, "派生指標")
+    return cash_metrics.add_order_metrics(df)
+
+
+def parse_orders(job, data):
+    encoding = detect_encoding(data)
+
+    # 大きなファイルは全件の解析の前にランダム標本で概算を出しておく
+    if len(data) > cash_sample.PREVIEW_BYTES:
+        job.report(0.0, "標本抽出")
+        sample, total_rows = cash_sample.sample_lines(data, encoding)
+        job.publish((cash_metrics.add_order_metrics(sample), total_rows))
+
+    try:
+        df = _read_orders(job, data, encoding)
+    except UnicodeDecodeError:
+        if encoding != "utf-8":
+            raise
+        # 先頭は UTF-8 として読めたが、後ろに Shift-JIS の行があった
+        df = _read_orders(job, data, "shift-jis")
+
+    job.report(0.85, "製品索引")
+    product_index = cash_drilldown.ProductIndex(df["品名"])
+
+    job.report(0.95, "月別集計")
+    return df, product_index, cash_cube.build_cube(df)
+
+
+def parse_monthly(job, data):
+    if cash_parallel.enabled(data):
+        return cash_parallel.parse_monthly(job, data)
+    job.report(0.0, "CSV解析")
+    df = pd.read_csv(io.BytesIO(data))
+
+    job.report(0.5, "月別集計")
+    return df, cash_metrics.monthly_weighted_tp_lt(df)
+
+
+def parse_group(job, data):
+    job.report(0.0, "CSV解析")
+    df = pd.read_csv(io.BytesIO(data))
+
+    job.report(0.5, "事業体×月の行列")
+    return cash_group.build_matrix(df)
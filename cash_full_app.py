@@ -1,18 +1,13 @@
-
 import streamlit as st
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import os
+import cash_engine
+import cash_alerts
+import cash_ledger
+import cash_service
 
-# フォント設定（日本語対応）
-import matplotlib.font_manager as fm
-jp_fonts = ["IPAexGothic", "Noto Sans CJK JP", "IPAGothic", "TakaoGothic"]
-available_fonts = set(f.name for f in fm.fontManager.ttflist)
-for font in jp_fonts:
-    if font in available_fonts:
-        plt.rcParams["font.family"] = font
-        break
+# 日本語フォント設定（統合アプリと共通）
+cash_engine.setup_fonts()
 
 st.title("キャッシュフロー分析アプリ（完全版）")
 
@@ -20,8 +15,9 @@ st.sidebar.header("分析期間と感度分析")
 months = st.sidebar.number_input("分析月数", min_value=1, max_value=24, value=6)
 tp_lt_change = st.sidebar.slider("TP/LT変化率（%）", -100, 100, 0) / 100.0
 
-# 月別データ入力
-monthly_data = []
+# 月別データ入力（月別台帳の各列を月数分確保して埋める）
+ledger = cash_ledger.MonthlyLedger.allocate([f"{i+1}ヶ月目" for i in range(months)],
+                                            ["期首現金", "期末現金", "現金増減", "スループット合計", "加重平均TP/LT"])
 for i in range(months):
     st.subheader(f"{i+1}ヶ月目データ")
     cash_start = st.number_input(f"期首現金（{i+1}ヶ月目）", key=f"start_{i}")
@@ -42,55 +38,39 @@ for i in range(months):
     total_qty = sum(p["qty"] for p in tp_lt_values)
     weighted_tp_lt = sum((p["tp_lt"] * p["qty"]) for p in tp_lt_values) / total_qty if total_qty else 0
 
-    monthly_data.append({
-        "期首現金": cash_start,
-        "期末現金": cash_end,
-        "現金増減": cash_end - cash_start,
-        "スループット合計": total_tp,
-        "加重平均TP/LT": weighted_tp_lt
-    })
+    ledger["期首現金"][i] = cash_start
+    ledger["期末現金"][i] = cash_end
+    ledger["現金増減"][i] = cash_end - cash_start
+    ledger["スループット合計"][i] = total_tp
+    ledger["加重平均TP/LT"][i] = weighted_tp_lt
 
-df = pd.DataFrame(monthly_data)
+df = ledger.frame()
 
 # グラフ：加重平均キャッシュ生産性 × 現金増減
 st.subheader("加重平均キャッシュ生産性 × 現金増減の関係")
 fig, ax = plt.subplots()
-x = df["加重平均TP/LT"]
-y = df["現金増減"]
-ax.scatter(x, y)
+ax.scatter(ledger["加重平均TP/LT"], ledger["現金増減"])
 ax.set_xlabel("加重平均キャッシュ生産性 (TP/LT)")
 ax.set_ylabel("現金増減額")
 st.pyplot(fig)
 
 # 将来予測
 st.subheader("資金ショート時期の予測")
-future_balance = df["期末現金"].tolist()
-zero_month = None
-for i, val in enumerate(future_balance):
-    if val < 0:
-        zero_month = i
-        break
+alert = cash_alerts.evaluate(df.assign(事業体="入力データ", 月=np.arange(len(ledger))), {"project": False}).iloc[0]
+zero_month = None if np.isnan(alert["ショート月"]) else int(alert["ショート月"])
 
 # メッセージ＆イラスト表示
-
-def show_image_and_message(image_file, message, color="info"):
-    image_path = os.path.join("images", image_file)
-    if os.path.exists(image_path):
-        st.image(image_path, width=120)
-    getattr(st, color)(message)
-
-
-if zero_month is not None:
-    if zero_month == 0:
-        show_image_and_message("danger.png", "💥 今月中に資金ショートの恐れがあります。即時対応を！", "error")
-    elif zero_month == 1:
-        show_image_and_message("warning.png", "⚠️ 1ヶ月以内に資金ショートの可能性があります。", "warning")
-    elif 2 <= zero_month <= 3:
-        show_image_and_message("alarm.png", f"🚨 {zero_month}ヶ月以内に現金枯渇が予測されます。", "warning")
-    elif 4 <= zero_month <= 11:
-        show_image_and_message("info.png", f"ℹ️ {zero_month}ヶ月後にショートが予測されます。", "info")
-else:
-    show_image_and_message("safe.png", "✅ 今後12ヶ月以内に資金ショートの心配はありません。", "success")
+messages = {
+    "danger": ("💥 今月中に資金ショートの恐れがあります。即時対応を！", "error"),
+    "warning": ("⚠️ 1ヶ月以内に資金ショートの可能性があります。", "warning"),
+    "alarm": (f"🚨 {zero_month}ヶ月以内に現金枯渇が予測されます。", "warning"),
+    "info": (f"ℹ️ {zero_month}ヶ月後にショートが予測されます。", "info"),
+    "safe": ("✅ 今後12ヶ月以内に資金ショートの心配はありません。", "success"),
+}
+level = cash_alerts.series_level(zero_month)
+if level is not None:
+    message, color = messages[level]
+    cash_alerts.show_image_and_message(level, message, color)
 
 # ダウンロード用データ
 st.subheader("データ出力")
@@ -99,60 +79,13 @@ st.download_button("📥 CSVとしてダウンロード", df.to_csv(index=False)
 
 
 
-def estimate_shortage_month(results):
-    balances = []
-    current_cash = None
-    for res in results:
-        cash_end = res["現金増減"]
-        balances.append(cash_end)
-
-    total_cash = 0
-    shortage_month = None
-    for i, res in enumerate(results):
-        total_cash += res["現金増減"]
-        if total_cash < 0:
-            shortage_month = res["月"]
-            break
-    return shortage_month
-
-
-
-# 各月のデータを処理
-metrics = calculate_metrics(monthly_data)
-
-# アプリ内でショート時期をチェックしてアラートを表示
-
-def estimate_precise_shortage_month(results, starting_cash):
-    current_cash = starting_cash
-    for i, res in enumerate(results):
-        cash_change = res["現金増減"]
-        next_cash = current_cash + cash_change
-        if next_cash < 0:
-            if cash_change == 0:
-                return res["月"]
-            # 線形補完：残高0になる割合を算出
-            ratio = current_cash / abs(cash_change)
-            return f"{res['月']}の{ratio*100:.1f}%時点"
-        current_cash = next_cash
-    return None
-
-def simulate_sensitivity(results, starting_cash, tp_lt_ratio_range):
-    scenarios = []
-    for ratio in tp_lt_ratio_range:
-        current_cash = starting_cash
-        shortage_month = None
-        for res in results:
-            simulated_cash_change = res["現金増減"] * (1 + ratio)
-            current_cash += simulated_cash_change
-            if current_cash < 0 and shortage_month is None:
-                shortage_month = res["月"]
-        scenarios.append({
-            "改善率": f"{int(ratio*100)}%",
-            "資金ショート月": shortage_month if shortage_month else "ショートなし"
-        })
-    return scenarios
-
-precise_shortage = estimate_precise_shortage_month(metrics, starting_cash)
+# ショート時期と感度分析は計算サービス（未設定ならこのプロセス）で台帳の列から求める
+starting_cash = float(ledger["期首現金"][0]) if len(ledger) else 0
+ratios = [r/100 for r in range(-100, 101, 25)]  # -100% ~ +100%まで25%刻み
+shortage = cash_service.call("shortage", months=ledger.months.tolist(), changes=ledger["現金増減"].tolist(),
+                             starting_cash=starting_cash, ratios=ratios)
+
+precise_shortage = shortage["精密ショート"]
 st.subheader("📉 資金ショート予測（精密版）")
 if precise_shortage:
     st.error(f"⚠️ 現金残高がマイナスになるタイミングは「{precise_shortage}」と予測されます。")
@@ -160,11 +93,10 @@ else:
     st.success("✅ 現在の現金残高と収支では、12ヶ月間資金ショートの心配はありません。")
 
 st.subheader("🔍 感度分析（TP/LT改善 vs 資金ショート月）")
-ratios = [r/100 for r in range(-100, 101, 25)]  # -100% ~ +100%まで25%刻み
-sensitivity_results = simulate_sensitivity(metrics, starting_cash, ratios)
+sensitivity_results = shortage["感度分析"]
 st.dataframe(sensitivity_results)
 
-shortage_month = estimate_shortage_month(metrics)
+shortage_month = shortage["ショート月"]
 if shortage_month:
     st.error(f"⚠️ 資金ショート（倒産リスク）は {shortage_month} に予測されます。至急の対応が必要です。")
 else:
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import streamlit as st
+
+# グループ連結：事業体×月の期末現金残高の行列から、グループ全体の残高・ショート時期・
+# 事業体ごとの寄与を行列演算で一度に求める（事業体ごとの Python ループなし）。
+# グループ内の資金移動（振替）はグループ合計では相殺され、事業体ごとの残高だけを動かす。
+HORIZON = 12
+TRANSFER_COLUMNS = ["送金元", "送金先", "月額", "開始（ヶ月後）", "月数"]
+# cashflow_app_full.py の月次CSV（製品行つき）と、一括アラートの事業体別CSVのどちらも読めるようにする
+ALIASES = {"月（YYYY-MM）": "月", "現金残高（期末）": "期末現金"}
+
+
+class GroupMatrix:
+    def __init__(self, entities, months, closing, dropped=()):
+        self.entities = list(entities)
+        self.months = list(months)
+        self.dropped = list(dropped)  # 期末現金が1件もなく除外した事業体
+        # 欠損月は前月値で埋める。最初の入力より前は NaN（まだグループに入っていない月）
+        self.balances = pd.DataFrame(closing).ffill(axis=1).to_numpy()
+        self.changes = np.diff(self.balances, axis=1, prepend=np.nan)
+        self.last_cash = self.balances[:, -1] if len(self.months) else np.zeros(len(self.entities))
+        counts = (~np.isnan(self.changes)).sum(axis=1)
+        self.avg_change = np.divide(np.nansum(self.changes, axis=1), counts, out=np.zeros(len(self.entities)),
+                                    where=counts > 0)
+
+    def group_balance(self):
+        return np.nansum(self.balances, axis=0)
+
+    # 平均増減ペースでの将来残高（行 = 事業体, 列 = 1..horizon ヶ月後）。transfers は事業体×月の振替額
+    def projection(self, horizon=HORIZON, transfers=None):
+        steps = np.arange(1, horizon + 1)
+        projected = self.last_cash[:, None] + self.avg_change[:, None] * steps[None, :]
+        if transfers is not None:
+            projected = projected + np.cumsum(transfers, axis=1)
+        return projected
+
+    def transfer_matrix(self, table, horizon=HORIZON):
+        # 振替表の各行を「送金元 −月額・送金先 +月額」を開始月から月数分に展開し、scatter-add で行列にする
+        transfers = np.zeros((len(self.entities), horizon))
+        if table is None or table.empty:
+            return transfers, 0
+        position = pd.Index(self.entities)
+        source = position.get_indexer(table["送金元"])
+        target = position.get_indexer(table["送金先"])
+        amount = pd.to_numeric(table["月額"], errors="coerce").to_numpy(dtype=float)
+        start = pd.to_numeric(table["開始（ヶ月後）"], errors="coerce").fillna(1).to_numpy(dtype=int) - 1
+        length = pd.to_numeric(table["月数"], errors="coerce").fillna(horizon).to_numpy(dtype=int)
+        valid = (source >= 0) & (target >= 0) & (source != target) & ~np.isnan(amount) & (length > 0)
+        source, target, amount, start, length = source[valid], target[valid], amount[valid], start[valid], length[valid]
+
+        rows = np.repeat(np.arange(len(amount)), length)
+        offset = np.arange(len(rows)) - np.repeat(np.cumsum(length) - length, length)
+        month = start[rows] + offset
+        inside = (month >= 0) & (month < horizon)
+        rows, month = rows[inside], month[inside]
+        np.add.at(transfers, (source[rows], month), -amount[rows])
+        np.add.at(transfers, (target[rows], month), amount[rows])
+        return transfers, int((~valid).sum())
+
+
+def _first_below(matrix, threshold=0.0):
+    # 行ごとに最初に閾値を下回る列（なければ NaN）
+    below = np.atleast_2d(matrix) < threshold
+    return np.where(below.any(axis=1), np.argmax(below, axis=1), np.nan)
+
+
+def build_matrix(frame):
+    frame = frame.rename(columns=ALIASES)
+    cash = pd.to_numeric(frame["期末現金"], errors="coerce").to_numpy(dtype=float)
+    ordinals = pd.PeriodIndex(frame["月"].astype(str), freq="M").asi8
+    names = frame["事業体"].astype(str)
+    # 製品行の多い月次CSVでは期末現金は各月の1行だけに入っている：欠損を除き、先に出てくる行を優先する。
+    # 期末現金が1件もない事業体は残高を決められない（グループ合計が NaN になる）ので除外する
+    valid = ~np.isnan(cash)
+    e_codes = np.full(len(frame), -1)
+    e_codes[valid], entities = pd.factorize(names[valid])
+    dropped = pd.unique(names[~names.isin(entities)])
+    if not valid.any():
+        return GroupMatrix(entities, [], np.zeros((len(entities), 0)), dropped)
+    first = ordinals[valid].min()
+    n_months = int(ordinals[valid].max() - first) + 1
+    closing = np.full((len(entities), n_months), np.nan)
+    closing[e_codes[valid][::-1], (ordinals[valid] - first)[::-1]] = cash[valid][::-1]
+    months = pd.PeriodIndex.from_ordinals(np.arange(first, first + n_months), freq="M").astype(str)
+    return GroupMatrix(entities, months, closing, dropped)
+
+
+def consolidate(matrix, transfers_table=None, horizon=HORIZON):
+    transfers, skipped = matrix.transfer_matrix(transfers_table, horizon)
+    standalone = matrix.projection(horizon)
+    pooled = matrix.projection(horizon, transfers)
+    group_history = matrix.group_balance()
+    # 振替はグループ合計で相殺されるので、グループの予測は振替の有無によらない
+    group_projection = standalone.sum(axis=0)
+
+    total_change = np.nansum(matrix.changes, axis=1)
+    group_total = total_change.sum()
+    entities = pd.DataFrame({
+        "事業体": matrix.entities,
+        "期末現金": matrix.last_cash,
+        "平均増減": matrix.avg_change,
+        "期間増減合計": total_change,
+        "グループ増減への寄与率": total_change / group_total if group_total != 0 else np.nan,
+        "単独ショート（ヶ月後）": _first_below(standalone) + 1,
+        "振替後ショート（ヶ月後）": _first_below(pooled) + 1,
+        "振替合計": transfers.sum(axis=1),
+    }).sort_values("期間増減合計", ignore_index=True)
+
+    history_short = _first_below(group_history)[0]
+    projected_short = _first_below(group_projection)[0]
+    return {
+        "entities": entities,
+        "group_history": group_history,
+        "group_projection": group_projection,
+        "history_short": None if np.isnan(history_short) else matrix.months[int(history_short)],
+        "projected_short": None if np.isnan(projected_short) else int(projected_short) + 1,
+        "skipped_transfers": skipped,
+    }
+
+
+# --- 画面 ---
+def show_consolidation(matrix, transfers_table, horizon, key):
+    if matrix.dropped:
+        st.warning(f"期末現金の入力がない事業体 {len(matrix.dropped)} 件を除外しました：{', '.join(matrix.dropped[:10])}"
+                   + (" ほか" if len(matrix.dropped) > 10 else ""))
+    if not matrix.months:
+        st.info("期末現金の入力がある行がありません。")
+        return
+    result = consolidate(matrix, transfers_table, horizon)
+    entities = result["entities"]
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("事業体数", f"{len(matrix.entities):,}")
+    col2.metric("グループ期末現金", f"{result['group_history'][-1]:,.0f}")
+    col3.metric("グループ平均増減", f"{matrix.avg_change.sum():,.0f}")
+    if result["history_short"] is not None:
+        col4.metric("グループショート", result["history_short"])
+    elif result["projected_short"] is not None:
+        col4.metric("グループショート", f"{result['projected_short']}ヶ月後")
+    else:
+        col4.metric("グループショート", "なし")
+
+    if result["history_short"] is not None:
+        st.error(f"🚨 グループ全体の現金残高が {result['history_short']} にマイナスになっています。")
+    elif result["projected_short"] is not None:
+        st.warning(f"⚠️ 現在の平均増減ペースでは、グループ全体で {result['projected_short']} ヶ月後に資金ショートします。")
+    else:
+        st.success(f"✅ グループ全体では今後{horizon}ヶ月間の資金ショートは予測されません。")
+
+    alone = entities["単独ショート（ヶ月後）"].notna()
+    pooled = entities["振替後ショート（ヶ月後）"].notna()
+    st.caption(f"単独でショートする事業体: {int(alone.sum())} / 振替後もショートする事業体: {int(pooled.sum())}")
+    if result["skipped_transfers"]:
+        st.warning(f"送金元・送金先・月額が正しくない振替 {result['skipped_transfers']} 行を除外しました。")
+
+    fig, ax = plt.subplots(figsize=(10, 4))
+    ax.plot(matrix.months, result["group_history"], marker="o", label="実績")
+    future = [str(p) for p in pd.period_range(matrix.months[-1], periods=horizon + 1, freq="M")[1:]]
+    ax.plot([matrix.months[-1]] + future, np.r_[result["group_history"][-1], result["group_projection"]],
+            linestyle="--", marker="o", label="予測（平均増減ペース）")
+    ax.axhline(0, color="red", linestyle="--")
+    step = max((len(matrix.months) + horizon) // 12, 1)
+    ax.set_xticks(ax.get_xticks()[::step])
+    ax.tick_params(axis="x", rotation=45)
+    ax.set_title("グループ連結：現金残高の推移と予測")
+    ax.set_ylabel("現金残高")
+    ax.legend()
+    ax.grid(True)
+    st.pyplot(fig)
+
+    st.dataframe(entities.round(3), use_container_width=True)
+    st.download_button("📥 事業体別の連結結果をCSVでダウンロード", entities.to_csv(index=False).encode("utf-8-sig"),
+                       file_name="cash_group.csv", key=f"{key}_download")
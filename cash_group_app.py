@@ -0,0 +1,41 @@
+import streamlit as st
+import pandas as pd
+import cash_engine
+import cash_group
+
+# 日本語フォント設定（統合アプリと共通）
+cash_engine.setup_fonts()
+
+st.title("グループ連結：資金ショート予測")
+st.caption("列：事業体, 月（YYYY-MM）, 現金残高（期末）… の月次CSV（cashflow_app_full.py の形式に事業体列を追加）。"
+           "事業体, 月, 期末現金 の形式でも読み込めます。")
+
+uploaded_file = st.file_uploader("事業体別の月次CSV", type=["csv"])
+if uploaded_file is not None:
+    cash_engine.remember_upload("group", uploaded_file)
+elif cash_engine.current_upload("group"):
+    st.caption(f"📄 {cash_engine.current_upload('group').name}（読み込み済み）")
+
+matrix, job = cash_engine.load("group", cash_engine.parse_group, "連結集計")
+if matrix is not None:
+    horizon = st.sidebar.slider("予測期間（ヶ月）", 1, 36, cash_group.HORIZON)
+
+    st.subheader("グループ内振替シナリオ")
+    st.caption("送金元から送金先へ、開始（ヶ月後）から月数の間、毎月「月額」を移します。グループ合計は変わりません。")
+    transfers = st.data_editor(
+        pd.DataFrame(columns=cash_group.TRANSFER_COLUMNS),
+        column_config={
+            "送金元": st.column_config.SelectboxColumn(options=matrix.entities),
+            "送金先": st.column_config.SelectboxColumn(options=matrix.entities),
+            "月額": st.column_config.NumberColumn(min_value=0.0),
+            "開始（ヶ月後）": st.column_config.NumberColumn(min_value=1, step=1, default=1),
+            "月数": st.column_config.NumberColumn(min_value=1, step=1, default=cash_group.HORIZON),
+        },
+        num_rows="dynamic",
+        key="group_transfers",
+    )
+
+    st.subheader("グループ連結結果")
+    cash_group.show_consolidation(matrix, transfers.dropna(subset=["送金元", "送金先", "月額"]), horizon, "group")
+else:
+    st.info("💡 事業体別の月次CSVをアップロードしてください。")
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+import cash_profiler
+
+# スクリプトスレッドの外で重い処理を動かすためのワーカー（プロセス内で共有）
+MAX_WORKERS = int(os.environ.get("CASH_JOB_WORKERS", "4"))
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="cash-job")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name, fingerprint):
+        self.name = name
+        self.fingerprint = fingerprint
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.partial = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.timings = []
+        self._segment = None
+        self._cancel_event = threading.Event()
+        self._future = None
+
+    # ジョブ関数から呼ぶ：進捗更新と同時に中止要求を確認する
+    def report(self, fraction, message=""):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message and message != self.message:
+            self._close_segment()
+            self._segment = (message, time.perf_counter(), cash_profiler.begin_peak())
+            self.message = message
+
+    # report() のメッセージ単位で区間時間とピークメモリを記録する（プロファイル用。ピークは測れた区間だけ）
+    def _close_segment(self):
+        if self._segment is not None:
+            message, t0, base = self._segment
+            self.timings.append((message, time.perf_counter() - t0, cash_profiler.end_peak(base)))
+            self._segment = None
+
+    # ジョブ関数から呼ぶ：完了前に表示できる途中結果（概算など）を渡す
+    def publish(self, partial):
+        self.partial = partial
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def done(self):
+        return self._future is not None and self._future.done()
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+
+def _run(job, fn, args, kwargs):
+    try:
+        job.result = fn(job, *args, **kwargs)
+        job.progress = 1.0
+    except JobCancelled:
+        job.message = "中止しました"
+    except Exception as e:
+        job.error = e
+    finally:
+        job._close_segment()
+        job.finished_at = time.time()
+
+
+# 同じ名前・同じ入力（fingerprint）のジョブはセッション内で再利用する。
+# ウィジェット操作による再実行で途中の計算を捨てないため。
+def submit(name, fingerprint, fn, *args, **kwargs):
+    jobs = st.session_state.setdefault("_cash_jobs", {})
+    job = jobs.get(name)
+    if job is not None and job.fingerprint == fingerprint:
+        return job
+    if job is not None and not job.done:
+        job.cancel()
+
+    job = Job(name, fingerprint)
+    job._future = _executor.submit(_run, job, fn, args, kwargs)
+    jobs[name] = job
+    return job
+
+
+def get(name):
+    return st.session_state.get("_cash_jobs", {}).get(name)
+
+
+def show_progress(job, label, has_partial=False):
+    @st.fragment(run_every=0.5)
+    def _poll():
+        # 完了したとき・途中結果が初めて届いたときはページ全体を再実行して表示を更新する
+        if job.done or (job.partial is not None and not has_partial):
+            st.rerun()
+        st.progress(job.progress, text=f"{label}：{job.message or '処理中'}（{job.elapsed:.0f}秒）")
+        if st.button("中止", key=f"_cancel_{job.name}"):
+            job.cancel()
+            st.rerun()
+
+    _poll()
+
+
+# 完了していれば結果を返し、未完了なら進捗（と preview があれば途中結果）を表示してスクリプトを止める
+def wait_for(job, label, preview=None):
+    if not job.done:
+        partial = job.partial if preview is not None else None
+        show_progress(job, label, has_partial=partial is not None)
+        if partial is not None:
+            preview(partial)
+        st.stop()
+    if job.cancelled:
+        st.info(f"{label}は中止されました。")
+        if st.button("再実行", key=f"_restart_{job.name}"):
+            st.session_state["_cash_jobs"].pop(job.name, None)
+            st.rerun()
+        st.stop()
+    if job.error is not None:
+        st.error(f"{label}でエラーが発生しました: {job.error}")
+        st.stop()
+    return job.result
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+# 月別台帳：月ラベルと、名前つきの数値列（numpy 配列）だけを持つ。
+# 集計・予測・感度分析・グラフの間は辞書のリストではなくこの台帳で受け渡し、
+# 表示が必要なときだけ frame() で DataFrame にする（列はコピーせずに渡す）。
+
+
+class MonthlyLedger:
+    def __init__(self, months, **fields):
+        self.months = np.asarray(months, dtype=object)
+        self.fields = {name: np.asarray(values, dtype=float) for name, values in fields.items()}
+
+    # 月数分の列を0で確保する（入力欄のループで ledger[列][i] = 値 と埋める）
+    @classmethod
+    def allocate(cls, months, names):
+        return cls(months, **{name: np.zeros(len(months)) for name in names})
+
+    def __len__(self):
+        return len(self.months)
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def __setitem__(self, name, values):
+        self.fields[name] = np.asarray(values, dtype=float)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def frame(self, columns=None, month_column="月"):
+        names = columns if columns is not None else list(self.fields)
+        return pd.DataFrame({month_column: self.months, **{name: self.fields[name] for name in names}}, copy=False)
+
+    # 散布図の各点に月ラベルを付ける
+    def annotate(self, ax, x, y, **kwargs):
+        for label, xi, yi in zip(self.months, self.fields[x], self.fields[y]):
+            ax.annotate(label, (xi, yi), **kwargs)
+
@@ -0,0 +1,249 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+import cash_engine
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 負荷試験：AppTest で複数セッションを同時に動かし、操作ごとの再実行時間を計測する。
+#   python cash_loadtest.py --scenario app --sessions 8 --iterations 3
+# アップロードは file_uploader を通さず、セッション状態 _cash_uploads に直接入れる（cash_engine と同じ形式）。
+HERE = os.path.dirname(os.path.abspath(__file__))
+TRACE_PATH = os.environ.get("CASH_LOADTEST_TRACE", "loadtest_trace.jsonl")
+
+
+# --- 試験データ（CSVを指定しない場合は乱数で作る） ---
+def synthetic_orders(rows=50_000, products=200, seed=0):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+    price = rng.uniform(1_000, 10_000, rows).round()
+    return pd.DataFrame({
+        "品名": [f"製品{i:04d}" for i in rng.integers(0, products, rows)],
+        "生産開始日": start.strftime("%Y-%m-%d"),
+        "出荷日": (start + pd.to_timedelta(rng.integers(1, 60, rows), unit="D")).strftime("%Y-%m-%d"),
+        "売上単価": price,
+        "材料費": (price * rng.uniform(0.2, 0.5, rows)).round(),
+        "外注費": (price * rng.uniform(0.0, 0.3, rows)).round(),
+        "出荷数": rng.integers(1, 100, rows),
+    }).to_csv(index=False).encode("utf-8")
+
+
+def synthetic_monthly(months=36, products=50, seed=0):
+    # products=None は製品名の列がない元の形式（1ヶ月1行）
+    rng = np.random.default_rng(seed)
+    labels = [str(p) for p in pd.period_range("2022-01", periods=months, freq="M")]
+    cash = 5_000 + np.cumsum(rng.normal(-50, 300, months))
+    per_month = products or 1
+    df = pd.DataFrame({
+        "月（YYYY-MM）": np.repeat(labels, per_month),
+        "製品名": np.tile([f"製品{i:03d}" for i in range(per_month)], months),
+        "スループット（TP）": rng.uniform(10, 100, months * per_month).round(1),
+        "リードタイム（LT）": rng.integers(1, 30, months * per_month),
+        "出荷数": rng.integers(0, 200, months * per_month),
+        "現金残高（期末）": np.repeat(cash.round(1), per_month),
+    })
+    if products is None:
+        df = df.drop(columns="製品名")
+    return df.to_csv(index=False).encode("utf-8")
+
+
+# --- 操作（AppTest のウィジェットをラベルで探して値を入れる） ---
+def _widget(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"ウィジェットが見つかりません: {label}")
+
+
+def set_value(kind, label, value):
+    return lambda at, files: _widget(getattr(at, kind), label).set_value(value)
+
+
+def upload(kind, source=None):
+    # source: 試験データの種類（省略時は kind と同じ）
+    def action(at, files):
+        uploads = dict(at.session_state["_cash_uploads"]) if "_cash_uploads" in at.session_state else {}
+        uploads[kind] = files[action.source]
+        at.session_state["_cash_uploads"] = uploads
+    action.job = kind
+    action.source = source or kind
+    return action
+
+
+# シナリオ：(スクリプト, [(操作名, 操作)]) 。操作 None は再実行のみ
+SCENARIOS = {
+    "app": ("app.py", [
+        ("初回表示", None),
+        ("アップロード", upload("orders")),
+        ("稼働日数変更", set_value("number_input", "制約工程の稼働可能日数（日）", 100.0)),
+        ("モード切替", set_value("radio", "モード選択", "月別手入力で分析")),
+        ("モード戻し", set_value("radio", "モード選択", "CSVファイルから分析")),
+    ]),
+    "cashflow": ("cashflow_app_full.py", [
+        ("初回表示", None),
+        ("アップロード", upload("monthly")),
+        ("改善率 +30%", set_value("slider", "TP/LT改善率（-100%〜+100%）", 0.3)),
+        ("改善率 -50%", set_value("slider", "TP/LT改善率（-100%〜+100%）", -0.5)),
+        ("期間切替", set_value("radio", "集計期間", "年度")),
+    ]),
+    "cashflow_baseline": ("cashflow_app_full.py", [
+        ("初回表示", None),
+        ("アップロード（製品名なし）", upload("monthly", "monthly_baseline")),
+        ("改善率 +30%", set_value("slider", "TP/LT改善率（-100%〜+100%）", 0.3)),
+        ("期間切替", set_value("radio", "集計期間", "年度")),
+    ]),
+    "full": ("cash_full_app.py", [
+        ("初回表示", None),
+        ("分析月数 12", set_value("number_input", "分析月数", 12)),
+        ("変化率 +30%", set_value("slider", "TP/LT変化率（%）", 30)),
+        ("変化率 -50%", set_value("slider", "TP/LT変化率（%）", -50)),
+    ]),
+}
+
+
+def _cached(at, action, files):
+    kind = getattr(action, "job", None)
+    if kind is None or cash_engine.get_engine().get(kind, files[action.source].digest) is not None:
+        return True
+    job = at.session_state["_cash_jobs"].get(kind) if "_cash_jobs" in at.session_state else None
+    if job is not None and job.done and (job.error is not None or job.cancelled):
+        raise RuntimeError(f"{kind} の解析に失敗しました: {job.error}")
+    return False
+
+
+def run_session(scenario, files, iterations, timeout, session_no):
+    script, steps = SCENARIOS[scenario]
+    records = []
+    at = AppTest.from_file(os.path.join(HERE, script), default_timeout=timeout)
+
+    def rerun(iteration, name):
+        t0 = time.perf_counter()
+        try:
+            at.run()
+            errors = len(at.exception)
+        except Exception as e:
+            # AppTest 自体の失敗（タイムアウトなど）も例外として数えて続行する
+            errors = 1
+            print(f"セッション{session_no} {name}: {type(e).__name__}: {e}")
+        records.append((session_no, iteration, name, time.perf_counter() - t0, errors))
+
+    for iteration in range(iterations):
+        for name, action in steps:
+            if action is not None:
+                action(at, files)
+            cached = _cached(at, action, files)
+            rerun(iteration, name)
+            # 解析ジョブの結果が共有キャッシュに入るまで再実行を繰り返す（画面の進捗ポーリングと同じ）
+            while not cached:
+                time.sleep(0.05)
+                cached = _cached(at, action, files)
+                rerun(iteration, f"{name}（待機）")
+    return at, records
+
+
+def _percentiles(seconds):
+    p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000
+    return {"回数": len(seconds), "p50(ms)": p50, "p95(ms)": p95, "p99(ms)": p99, "最大(ms)": seconds.max() * 1000}
+
+
+def _rss_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux は KB 単位
+
+
+def load_test(scenario, sessions=4, iterations=3, orders=None, monthly=None, unique_uploads=False,
+              memory=False, timeout=120):
+    base = {"orders": orders or synthetic_orders(), "monthly": monthly or synthetic_monthly(),
+            "monthly_baseline": synthetic_monthly(products=None)}
+
+    def files_for(session_no):
+        # 末尾の空行は read_csv で無視されるので、内容を変えずにセッションごとの別ファイルにできる
+        files = {}
+        for kind, data in base.items():
+            if unique_uploads:
+                data = data + b"\n" * (session_no + 1)
+            files[kind] = cash_engine.Upload(f"loadtest_{kind}.csv", hashlib.blake2b(data, digest_size=16).hexdigest(), data)
+        return files
+
+    # ウォームアップ（フォント・モジュール読み込み・共有キャッシュを埋める。計測対象外）
+    run_session(scenario, files_for(-1), 1, timeout, -1)
+
+    if memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [pool.submit(run_session, scenario, files_for(i), iterations, timeout, i) for i in range(sessions)]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+    per_session = None
+    if memory:
+        # セッション（AppTest とそのセッション状態）を保持したままの増分
+        per_session = (tracemalloc.get_traced_memory()[0] - baseline) / sessions / 2**20
+        tracemalloc.stop()
+
+    frame = pd.DataFrame([r for _, records in results for r in records],
+                         columns=["セッション", "反復", "操作", "秒", "例外"])
+    by_step = frame.groupby("操作", sort=False)["秒"].apply(lambda s: pd.Series(_percentiles(s.to_numpy()))).unstack()
+    return {
+        "scenario": scenario,
+        "sessions": sessions,
+        "iterations": iterations,
+        "reruns": len(frame),
+        "wall_seconds": wall,
+        "throughput_per_second": len(frame) / wall if wall > 0 else None,
+        "overall": _percentiles(frame["秒"].to_numpy()),
+        "errors": int(frame["例外"].sum()),
+        "memory_per_session_mb": per_session,
+        "peak_rss_mb": _rss_mb(),
+    }, by_step
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streamlit アプリの同時セッション負荷試験")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), nargs="+", default=sorted(SCENARIOS))
+    parser.add_argument("--sessions", type=int, default=4, help="同時セッション数")
+    parser.add_argument("--iterations", type=int, default=3, help="セッションごとの操作の繰り返し回数")
+    parser.add_argument("--orders", help="app.py 用の受注明細CSV（省略時は乱数データ）")
+    parser.add_argument("--monthly", help="cashflow_app_full.py 用の月次CSV（省略時は乱数データ）")
+    parser.add_argument("--unique-uploads", action="store_true", help="セッションごとに別ファイルとしてアップロードする")
+    parser.add_argument("--memory", action="store_true", help="tracemalloc でセッションあたりのメモリを計測する")
+    parser.add_argument("--timeout", type=float, default=120, help="1回の再実行のタイムアウト（秒）")
+    parser.add_argument("--trace", default=TRACE_PATH, help="結果の追記先（JSON Lines）。空文字で保存しない")
+    args = parser.parse_args()
+
+    read = lambda path: open(path, "rb").read() if path else None
+    for scenario in args.scenario:
+        summary, by_step = load_test(scenario, args.sessions, args.iterations, read(args.orders), read(args.monthly),
+                                     args.unique_uploads, args.memory, args.timeout)
+        overall = summary["overall"]
+        print(f"\n== {scenario}: {args.sessions} セッション × {args.iterations} 回 ==")
+        print(by_step.round(1).to_string())
+        print(f"全体: p50 {overall['p50(ms)']:.1f} ms / p95 {overall['p95(ms)']:.1f} ms / p99 {overall['p99(ms)']:.1f} ms, "
+              f"スループット {summary['throughput_per_second']:.1f} 回/秒, 例外 {summary['errors']} 件")
+        if summary["memory_per_session_mb"] is not None:
+            print(f"セッションあたりメモリ: {summary['memory_per_session_mb']:.1f} MB")
+        if summary["peak_rss_mb"] is not None:
+            print(f"ピークRSS: {summary['peak_rss_mb']:.0f} MB")
+        if args.trace:
+            summary["steps"] = json.loads(by_step.to_json(orient="index", force_ascii=False))
+            summary["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            with open(args.trace, "a", encoding="utf-8") as f:
+                f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
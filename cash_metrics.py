@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# 派生指標の計算。フィルタ済みスライスへの列追加（コピー＋SettingWithCopy警告）を避け、
+# 連続したnumpy配列上で in-place / out= 指定で計算する。
+
+
+def _col(df, name, dtype=float):
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=dtype, na_value=np.nan)
+
+
+# --- 受注明細（app.py のCSV） ---
+def add_order_metrics(df):
+    # 日付文字列の列は datetime64 に置き換えて元の文字列を解放する
+    df["生産開始日"] = pd.to_datetime(df["生産開始日"], errors="coerce")
+    df["出荷日"] = pd.to_datetime(df["出荷日"], errors="coerce")
+
+    # 日付が欠けた行（NaT）は整数除算の前に 0 日で埋め、結果を NaN に戻す（元の .dt.days と同じく欠損のまま）
+    delta = df["出荷日"].to_numpy() - df["生産開始日"].to_numpy()
+    missing = np.isnat(delta)
+    delta[missing] = np.timedelta64(0, "ns")
+    lt = np.where(missing, np.nan, delta // np.timedelta64(1, "D"))
+    np.maximum(lt, 1, out=lt, where=~missing)
+
+    # 列が既に float の場合 to_numpy は読み取り専用のビューを返すので、書き込み先はコピーにする
+    tp = _col(df, "売上単価").copy()
+    np.subtract(tp, _col(df, "材料費"), out=tp)
+    np.subtract(tp, _col(df, "外注費"), out=tp)
+
+    df["リードタイム"] = lt
+    df["スループット"] = tp
+    df["TP/LT"] = np.divide(tp, lt)
+    # 品名は繰り返しが多いのでカテゴリ型にしてメモリを削減
+    df["品名"] = df["品名"].astype("category")
+    return df
+
+
+# --- 月次CSV（cashflow_app_full.py）：月ごとの加重平均TP/LTと現金増減を一括集計 ---
+def monthly_sums(df):
+    # 月ごとの Σ(TP/LT×出荷数)・Σ出荷数・Σ(TP×出荷数)・最初の非欠損の期末現金（ファイル単位の差分取り込みでも使う）
+    codes, months = pd.factorize(df["月（YYYY-MM）"], sort=True)
+    valid = codes >= 0
+    codes = codes[valid]
+
+    tp = _col(df, "スループット（TP）")[valid]
+    lt = _col(df, "リードタイム（LT）")[valid]
+    qty = _col(df, "出荷数")[valid]
+
+    weighted = np.divide(tp, lt)
+    np.multiply(weighted, qty, out=weighted)
+    n = len(months)
+    numerator = np.bincount(codes, weights=np.nan_to_num(weighted, nan=0.0, posinf=0.0, neginf=0.0), minlength=n)
+    shipped = np.bincount(codes, weights=np.nan_to_num(qty, nan=0.0), minlength=n)
+    throughput = np.bincount(codes, weights=np.nan_to_num(tp * qty, nan=0.0), minlength=n)
+    cash = pd.Series(_col(df, "現金残高（期末）")[valid]).groupby(codes).first().reindex(range(n))
+
+    return pd.DataFrame({
+        "月": months,
+        "TP/LT×出荷数": numerator,
+        "出荷数": shipped,
+        "TP×出荷数": throughput,
+        "期末現金残高": cash.to_numpy(),
+    })
+
+
+def weighted_average(numerator, shipped):
+    numerator, shipped = np.asarray(numerator, dtype=float), np.asarray(shipped, dtype=float)
+    return np.divide(numerator, shipped, out=np.zeros(len(shipped)), where=shipped != 0).round(2)
+
+
+# 行の範囲ごとに求めた monthly_sums を1つにまとめる（parts は元の行順。期末現金は最初の非欠損）
+def combine_sums(parts):
+    sums = pd.concat(parts, ignore_index=True).groupby("月", sort=True)
+    combined = sums[["TP/LT×出荷数", "出荷数", "TP×出荷数"]].sum()
+    combined["期末現金残高"] = sums["期末現金残高"].first()
+    return combined.reset_index()
+
+
+def monthly_weighted_tp_lt(df):
+    return weighted_from_sums(monthly_sums(df))
+
+
+def weighted_from_sums(sums):
+    # 欠損月は前月までの値から差分を取る
+    cash = sums["期末現金残高"]
+    cash_diff = cash - cash.ffill().shift()
+
+    return pd.DataFrame({
+        "月": sums["月"],
+        "加重平均TP/LT": weighted_average(sums["TP/LT×出荷数"], sums["出荷数"]),
+        "期末現金残高": cash.to_numpy(),
+        "現金増減": cash_diff.to_numpy(),
+    })
+
+
+# --- data_editor の製品表（TP・LT・出荷数） ---
+def _editor_arrays(df, columns):
+    arrays = [_col(df, c) for c in columns]
+    mask = np.ones(len(df), dtype=bool)
+    for a in arrays:
+        mask &= a > 0
+    return arrays, mask
+
+
+def shipment_weighted(df):
+    # 出荷数加重：Σ(TP×出荷数) / Σ(LT×出荷数)
+    (tp, lt, qty), mask = _editor_arrays(df, ["TP（万円）", "LT（日）", "出荷数"])
+    tp_total = float(np.dot(tp[mask], qty[mask]))
+    lt_total = float(np.dot(lt[mask], qty[mask]))
+    weighted = tp_total / lt_total if lt_total > 0 else 0
+    return tp_total, lt_total, weighted
+
+
+def tp_weighted(df):
+    # TP加重：Σ(TP²/LT) / ΣTP（欠損行・LTが0以下の行は除外。履歴の集計 cash_rollup.store_measures と同じ）
+    tp, lt = _col(df, "TP（万円）"), _col(df, "LT（日）")
+    mask = ~np.isnan(tp) & (lt > 0) & df["製品名"].notna().to_numpy()
+    tp, lt = tp[mask], lt[mask]
+    total_tp = tp.sum()
+    return float(np.dot(tp, tp / lt) / total_tp) if total_tp > 0 else 0
+
+
+def tp_lt_sum(df):
+    # cash_weighted_app.py：ΣTP と Σ(TP/LT)
+    (tp, lt), mask = _editor_arrays(df, ["TP（万円）", "LT（日）"])
+    return float(tp[mask].sum()), float((tp[mask] / lt[mask]).sum())
+
+
+def product_rows(df, month):
+    # 有効な製品行だけを新しいフレームとして一度に構築する
+    (tp, lt, qty), mask = _editor_arrays(df, ["TP（万円）", "LT（日）", "出荷数"])
+    return pd.DataFrame({
+        "月": month,
+        "製品名": df["製品名"].to_numpy()[mask],
+        "TP（万円）": tp[mask],
+        "LT（日）": lt[mask],
+        "TP/LT": tp[mask] / lt[mask],
+        "出荷数": qty[mask],
+    })
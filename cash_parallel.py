@@ -0,0 +1,94 @@
+import io
+import os
+from concurrent.futures import as_completed
+
+import pandas as pd
+
+import cash_metrics
+import cash_workers
+
+# 大きなCSVの並列解析：ファイルを改行位置でそろえたバイト範囲に分け、各範囲に見出し行を付けて
+# プロセスプールで read_csv ＋ 派生指標の計算まで行い、元の行順で連結（月次CSVは月別合計も集約）する。
+# Shift-JIS の2バイト目は 0x40 以上なので、改行（0x0A）や引用符（0x22）の位置で切っても文字は割れない。
+# プールは起動時に cash_workers が作る（python cash_workers.py で起動したときだけ並列に解析する）。
+WORKERS = int(os.environ.get("CASH_PARSE_WORKERS", str(os.cpu_count() or 1)))
+MIN_BYTES = int(os.environ.get("CASH_PARSE_MIN_BYTES", str(64 * 2**20)))
+# ジョブの進捗表示の見出し（プロファイルの区間名にもなるので、画面側はこの名前で区間を割り当てる）
+ORDERS_STAGE = f"CSV解析・派生指標（{WORKERS}並列）"
+MONTHLY_STAGE = f"CSV解析・月別合計（{WORKERS}並列）"
+
+
+def start_workers():
+    return cash_workers.start("parse", WORKERS)
+
+
+def enabled(data):
+    return len(data) >= MIN_BYTES and cash_workers.get("parse") is not None
+
+
+def split_ranges(data, parts):
+    # 見出し行の後ろを parts 個に分ける。区切りは改行の直後で、引用符の中の改行（項目内改行）では切らない
+    start = data.find(b"\n") + 1
+    if start == 0 or start >= len(data):
+        return data[:start], [(start, len(data))]
+    quoted = b'"' in data
+    step = max((len(data) - start) // parts, 1)
+    ranges = []
+    position = start
+    while position < len(data):
+        end = data.find(b"\n", min(position + step, len(data) - 1)) + 1
+        while quoted and end > 0 and data.count(b'"', position, end) % 2:
+            end = data.find(b"\n", end) + 1
+        if end <= 0 or len(data) - end < step // 2:
+            end = len(data)
+        ranges.append((position, end))
+        position = end
+    return data[:start], ranges
+
+
+# --- ワーカープロセス側 ---
+def _read(header, body, encoding):
+    return pd.read_csv(io.BytesIO(header + body), encoding=encoding)
+
+
+def _parse_orders(header, body, encoding):
+    return cash_metrics.add_order_metrics(_read(header, body, encoding))
+
+
+def _parse_monthly(header, body, encoding):
+    df = _read(header, body, encoding)
+    return df, cash_metrics.monthly_sums(df)
+
+
+# --- 呼び出し側 ---
+def _map(job, worker, data, encoding, stage):
+    job.report(0.0, stage)
+    header, ranges = split_ranges(data, WORKERS)
+    futures = {cash_workers.submit("parse", worker, header, data[a:b], encoding): i for i, (a, b) in enumerate(ranges)}
+    results = [None] * len(ranges)
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            job.report(0.75 * done / len(ranges), stage)
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
+
+def parse_orders(job, data, encoding):
+    chunks = _map(job, _parse_orders, data, encoding, ORDERS_STAGE)
+    # 範囲ごとに品名のカテゴリが違うので、全体の品名（ソート済み）にそろえてからカテゴリ型のまま連結する
+    categories = chunks[0]["品名"].cat.categories
+    for chunk in chunks[1:]:
+        categories = categories.union(chunk["品名"].cat.categories)
+    for chunk in chunks:
+        chunk["品名"] = chunk["品名"].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def parse_monthly(job, data, encoding=None):
+    results = _map(job, _parse_monthly, data, encoding, MONTHLY_STAGE)
+    df = pd.concat([df for df, _ in results], ignore_index=True)
+    return df, cash_metrics.weighted_from_sums(cash_metrics.combine_sums([sums for _, sums in results]))
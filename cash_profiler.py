@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# 環境変数 CASH_PROFILE=1 またはURLの ?profile=1 で計測を有効化。
+# CASH_PROFILE_MEMORY=1 または ?profile=mem でステージごとのピークメモリも計測（tracemalloc）
+TRACE_PATH = os.environ.get("CASH_PROFILE_TRACE", "profile_trace.jsonl")
+STAGES = ("ingest", "derive", "aggregate", "forecast", "sensitivity", "render", "export")
+
+# tracemalloc のピークはプロセス全体で1つなので、ピークを測る区間は同時に1つだけにする。
+# 他のセッションやジョブが測っている間に始まった区間は待たずにピークを記録しない（None。表では空欄）
+_peak_lock = threading.Lock()
+
+
+def begin_peak():
+    if not tracemalloc.is_tracing() or not _peak_lock.acquire(blocking=False):
+        return None
+    tracemalloc.reset_peak()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def end_peak(base):
+    if base is None:
+        return None
+    peak = tracemalloc.get_traced_memory()[1] - base
+    _peak_lock.release()
+    return peak
+
+
+def enabled():
+    if os.environ.get("CASH_PROFILE", "0") not in ("", "0"):
+        return True
+    return st.query_params.get("profile", "0") not in ("", "0")
+
+
+def memory_enabled():
+    if os.environ.get("CASH_PROFILE_MEMORY", "0") not in ("", "0"):
+        return True
+    return st.query_params.get("profile") == "mem"
+
+
+class Profiler:
+    def __init__(self, app, active=None):
+        self.app = app
+        self.active = enabled() if active is None else active
+        self.memory = self.active and memory_enabled()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.run_id = uuid.uuid4().hex[:12]
+        self.records = []
+        self._t0 = time.perf_counter()
+
+    # 名前付きステージの処理時間を計測する
+    @contextmanager
+    def stage(self, name, detail=""):
+        if not self.active:
+            yield
+            return
+        base = begin_peak() if self.memory else None
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            peak = end_peak(base)
+            self.records.append({"stage": name, "detail": detail, "seconds": seconds, "peak_bytes": peak})
+
+    # バックグラウンドジョブ内の区間時間を取り込む（完了後に一度だけ）
+    def add_job(self, job, stages, default="ingest"):
+        if job is None or not self.active or getattr(job, "_profiled", False):
+            return
+        job._profiled = True
+        for message, seconds, peak in job.timings:
+            stage = stages.get(message, default) if isinstance(stages, dict) else stages
+            self.records.append({"stage": stage, "detail": f"[job] {message}", "seconds": seconds, "peak_bytes": peak})
+
+    def summary(self):
+        df = pd.DataFrame(self.records, columns=["stage", "detail", "seconds", "peak_bytes"])
+        df["ミリ秒"] = (df["seconds"] * 1000).round(1)
+        df["ピークMB"] = (df["peak_bytes"].astype(float) / 1e6).round(1)
+        if not self.memory:
+            df = df.drop(columns="ピークMB")
+        return df.drop(columns=["seconds", "peak_bytes"])
+
+    # 折りたたみパネルに表示し、トレースファイルへ1行追記する
+    def finish(self):
+        if not self.active:
+            return
+        total = time.perf_counter() - self._t0
+        with st.expander(f"⏱ 処理時間プロファイル（合計 {total * 1000:.0f} ms）"):
+            st.dataframe(self.summary(), use_container_width=True)
+
+        ctx = get_script_run_ctx()
+        trace = {
+            "ts": time.time(),
+            "app": self.app,
+            "session": ctx.session_id if ctx else None,
+            "run_id": self.run_id,
+            "total_seconds": total,
+            "stages": self.records,
+        }
+        with open(TRACE_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace, ensure_ascii=False) + "\n")
+
+
+def load_trace(path=None):
+    # トレースファイルを ステージ単位の表に展開（複数ユーザー分の集計用）
+    rows = []
+    with open(path or TRACE_PATH, encoding="utf-8") as f:
+        for line in f:
+            trace = json.loads(line)
+            for rec in trace["stages"]:
+                rows.append({"app": trace["app"], "session": trace["session"], "run_id": trace["run_id"], **rec})
+    return pd.DataFrame(rows)
@@ -0,0 +1,281 @@
+import argparse
+import base64
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import as_completed
+
+import matplotlib.image as mpimg
+import matplotlib.pyplot as plt
+import pandas as pd
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+import cash_compute
+import cash_metrics
+import cash_store
+import cash_workers
+
+# 事業体（工場）ごとの月次レポート：保存済み履歴から、画面と同じ将来残高予測・感度分析のグラフと
+# 製品別統計情報の表を静的な HTML / PDF に出力する。事業体ごとにプロセスプール（cash_workers）で並列に作り、
+# グラフの PNG は描画データのハッシュでキャッシュして、入力が変わらなければ描き直さない。
+OUTPUT_DIR = os.environ.get("CASH_REPORT_DIR", "reports")
+CACHE_DIR = os.environ.get("CASH_REPORT_CACHE", os.path.join(OUTPUT_DIR, ".figures"))
+WORKERS = int(os.environ.get("CASH_REPORT_WORKERS", str(os.cpu_count() or 1)))
+FORMATS = ["html", "pdf"]
+HORIZON = 12
+DPI = 120
+SCENARIOS = {
+    "現状維持 (0%)": 0.00,
+    "軽度改善 (+10%)": 0.10,
+    "中度改善 (+20%)": 0.20,
+    "高度改善 (+30%)": 0.30,
+}
+TABLE_ROWS = 32  # PDF の表の1ページあたりの行数
+RESULT_COLUMNS = ["事業体", "ファイル", "図（キャッシュ）", "図（描画）", "秒"]
+
+
+# --- 事業体ごとの集計（app.py の月別手入力モードと同じ計算） ---
+def entity_summary(entity, path=None):
+    cash = cash_store.load_cash(entity, path=path)
+    products = cash_store.load_products(entity, path=path)
+    weighted = {month: cash_metrics.tp_weighted(rows) for month, rows in products.groupby("月")}
+    monthly = cash.assign(**{
+        "加重平均TP/LT": cash["月"].map(weighted).fillna(0.0),
+        "現金増減額（万円）": cash["期末現金残高"] - cash["期首現金残高"],
+    })
+    last_cash = float(monthly["期末現金残高"].iloc[-1]) if len(monthly) else 0.0
+    forecast = cash_compute.forecast(last_cash, monthly["現金増減額（万円）"].tolist(), horizon=HORIZON,
+                                     rates=list(SCENARIOS.values()))
+
+    products = products.assign(**{"TP/LT": products["TP（万円）"] / products["LT（日）"]})
+    stats = products.groupby("製品名")[["TP（万円）", "TP/LT"]].agg(["mean", "max", "min", "std"])
+    stats.columns = [f"{column} {stat}" for column, stat in stats.columns]
+    return monthly, forecast, stats.reset_index()
+
+
+# --- グラフ（描画データのハッシュで PNG をキャッシュ） ---
+def _draw_forecast(ax, data):
+    ax.plot(range(1, HORIZON + 1), data["将来残高"], marker="o", linestyle="-")
+    ax.axhline(0, color="red", linestyle="--")
+    ax.set_title("将来の現金残高予測")
+    ax.set_xlabel("現在からの月数")
+    ax.set_ylabel("予測現金残高（万円）")
+    ax.grid(True)
+
+
+def _draw_sensitivity(ax, data):
+    for label, values in data["シナリオ"].items():
+        ax.plot(range(1, HORIZON + 1), values, marker="o", label=label)
+    ax.axhline(0, color="black", linestyle="--")
+    ax.set_title("TP/LT改善シナリオ別：将来の現金残高予測")
+    ax.set_xlabel("現在からの月数")
+    ax.set_ylabel("予測現金残高（万円）")
+    ax.legend()
+    ax.grid(True)
+
+
+CHARTS = {"forecast": _draw_forecast, "sensitivity": _draw_sensitivity}
+
+
+def figure_png(kind, data, cache_dir=CACHE_DIR):
+    # 戻り値は (PNG のバイト列, キャッシュから取れたか)。フォントが変われば別のキーになる
+    payload = json.dumps([kind, data, plt.rcParams["font.family"], DPI], sort_keys=True, ensure_ascii=False)
+    key = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+    path = os.path.join(cache_dir, f"{key}.png")
+    try:
+        with open(path, "rb") as f:
+            return f.read(), True
+    except FileNotFoundError:
+        pass
+
+    fig = Figure(figsize=(8, 4))
+    CHARTS[kind](fig.subplots(), data)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=DPI, bbox_inches="tight")
+    png = buf.getvalue()
+    # 同じ図を別のワーカーが同時に書いても壊れないように、一時ファイルから置き換える
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = _temp_path(path)
+    with open(tmp, "wb") as f:
+        f.write(png)
+    os.replace(tmp, path)
+    return png, False
+
+
+# プロセス・スレッドごとに別の一時ファイル名（プールがないときは同じプロセスの複数セッションが同時に書く）
+def _temp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+# --- 出力 ---
+def _summary_lines(entity, monthly, forecast):
+    if not len(monthly):
+        return [f"{entity} の保存済み履歴がありません。"]
+    lines = [
+        f"対象期間: {monthly['月'].iloc[0]} 〜 {monthly['月'].iloc[-1]}（{len(monthly)}ヶ月）",
+        f"現在の期末現金残高: {monthly['期末現金残高'].iloc[-1]:,.1f}万円",
+        f"平均月間現金増減: {forecast['平均増減']:,.1f}万円",
+    ]
+    if forecast["ショートまでの月数"] is not None:
+        lines.append(f"資金ショート予測: 約 {forecast['ショートまでの月数']:.1f} ヶ月後")
+    else:
+        lines.append("資金ショートの兆候は見られません。")
+    return lines
+
+
+def write_html(path, entity, lines, figures, monthly, stats):
+    images = "".join(
+        f"<h2>{html.escape(title)}</h2><img src=\"data:image/png;base64,{base64.b64encode(png).decode('ascii')}\">"
+        for title, png in figures)
+    body = f"""<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8"><title>{html.escape(entity)} 月次レポート</title>
+<style>body{{font-family:sans-serif;margin:2em}}table{{border-collapse:collapse;font-size:12px}}
+td,th{{border:1px solid #ccc;padding:2px 6px;text-align:right}}img{{max-width:100%}}</style></head>
+<body><h1>{html.escape(entity)} 月次レポート</h1>
+<ul>{"".join(f"<li>{html.escape(line)}</li>" for line in lines)}</ul>
+{images}
+<h2>製品別統計情報</h2>{stats.round(2).to_html(index=False, na_rep="")}
+<h2>月別データ</h2>{monthly.round(2).to_html(index=False, na_rep="")}
+</body></html>
+"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+
+
+def _table_pages(pdf, title, frame):
+    # 表はセルごとではなく列ごとに1つの複数行テキストで描く（ax.table より描画が一桁速い）
+    text = frame.round(2).astype(str).replace({"nan": "", "<NA>": ""})
+    width = 0.84 / max(len(text.columns), 1)
+    for start in range(0, max(len(text), 1), TABLE_ROWS):
+        page = text.iloc[start:start + TABLE_ROWS]
+        fig = Figure(figsize=(8.27, 11.69))
+        fig.text(0.08, 0.95, title if start == 0 else f"{title}（続き）", fontsize=12, va="top")
+        for i, column in enumerate(page.columns):
+            x = 0.08 + width * (i + 1) if i else 0.08
+            ha = "right" if i else "left"
+            fig.text(x, 0.91, column, fontsize=7, ha=ha, va="top", weight="bold", wrap=True)
+            fig.text(x, 0.88, "\n".join(page[column]), fontsize=7, ha=ha, va="top", linespacing=1.6)
+        pdf.savefig(fig)
+
+
+def write_pdf(path, entity, lines, figures, monthly, stats):
+    with PdfPages(path) as pdf:
+        fig = Figure(figsize=(8.27, 11.69))
+        fig.text(0.08, 0.95, f"{entity} 月次レポート", fontsize=16, va="top")
+        for i, line in enumerate(lines):
+            fig.text(0.08, 0.91 - i * 0.025, line, fontsize=10, va="top")
+        # キャッシュした PNG をそのまま貼る（PDF 用に描き直さない）
+        for i, (title, png) in enumerate(figures):
+            ax = fig.add_axes([0.05, 0.45 - i * 0.38, 0.9, 0.34])
+            ax.imshow(mpimg.imread(io.BytesIO(png)))
+            ax.axis("off")
+        pdf.savefig(fig)
+        _table_pages(pdf, "製品別統計情報", stats)
+        _table_pages(pdf, "月別データ", monthly)
+
+
+def file_stem(entity):
+    # ファイル名に使えない文字を置き換えると別の事業体と重なることがある（"B 工場" と "B_工場"）ので、
+    # 事業体名のハッシュを付けて区別する
+    stem = re.sub(r'[\\/:*?"<>|\s]', "_", entity)
+    return f"{stem}_{hashlib.blake2b(entity.encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+# --- ワーカープロセス側：1事業体分のレポート ---
+def _init_worker():
+    import cash_engine
+    cash_engine.setup_fonts()
+
+
+def render(entity, out_dir=OUTPUT_DIR, formats=FORMATS, path=None, cache_dir=CACHE_DIR):
+    t0 = time.perf_counter()
+    monthly, forecast, stats = entity_summary(entity, path)
+    figures, hits = [], 0
+    if len(monthly):
+        for kind, title, data in [
+            ("forecast", "将来の現金残高予測", {"将来残高": forecast["将来残高"]}),
+            ("sensitivity", "感度分析：TP/LT改善シナリオによる収支改善効果",
+             {"シナリオ": {label: forecast["シナリオ"][str(rate)] for label, rate in SCENARIOS.items()}}),
+        ]:
+            png, cached = figure_png(kind, data, cache_dir)
+            figures.append((title, png))
+            hits += cached
+
+    lines = _summary_lines(entity, monthly, forecast)
+    os.makedirs(out_dir, exist_ok=True)
+    files = []
+    for fmt in formats:
+        # 出力先は全セッション共通なので、書きかけのファイルを他のセッションが読まないよう一時ファイルから置き換える
+        out = os.path.join(out_dir, f"{file_stem(entity)}.{fmt}")
+        tmp = _temp_path(out)
+        (write_html if fmt == "html" else write_pdf)(tmp, entity, lines, figures, monthly, stats)
+        os.replace(tmp, out)
+        files.append(out)
+    return dict(zip(RESULT_COLUMNS, [entity, files, hits, len(figures) - hits, round(time.perf_counter() - t0, 2)]))
+
+
+# --- 呼び出し側：事業体ごとに並列で作る ---
+def start_workers():
+    return cash_workers.start("report", WORKERS, _init_worker)
+
+
+# cash_jobs のジョブ関数（job.report で進捗、中止されたら残りの依頼を取り消す）
+def generate(job, entities, out_dir=OUTPUT_DIR, formats=FORMATS, path=None):
+    results = []
+    if cash_workers.get("report") is None:
+        # ワーカーのプールがない（streamlit run で起動した）ときはこのスレッドで1事業体ずつ作る
+        _init_worker()
+        for done, entity in enumerate(entities, 1):
+            results.append(render(entity, out_dir, formats, path))
+            job.report(done / len(entities), f"{done}/{len(entities)} 事業体")
+        return pd.DataFrame(results, columns=RESULT_COLUMNS).sort_values("事業体", ignore_index=True)
+
+    futures = [cash_workers.submit("report", render, entity, out_dir, formats, path) for entity in entities]
+    try:
+        for done, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            job.report(done / max(len(futures), 1), f"{done}/{len(futures)} 事業体")
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return pd.DataFrame(results, columns=RESULT_COLUMNS).sort_values("事業体", ignore_index=True)
+
+
+class _Progress:
+    def report(self, fraction, message=""):
+        print(f"\r{message}", end="", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="事業体ごとの月次レポート（HTML / PDF）を並列に出力する")
+    parser.add_argument("entities", nargs="*", help="対象の事業体（省略時は保存済みの全事業体）")
+    parser.add_argument("--db", default=None, help="月別履歴（SQLite）。既定は CASH_STORE_PATH")
+    parser.add_argument("--out", default=OUTPUT_DIR)
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    if args.workers:
+        global WORKERS
+        WORKERS = args.workers
+
+    start_workers()
+    t0 = time.perf_counter()
+    entities = args.entities or cash_store.list_entities(args.db)
+    summary = generate(_Progress(), entities, args.out, args.format, args.db)
+    print()
+    print(summary.drop(columns="ファイル").to_string(index=False))
+    print(f"{len(summary)} 事業体 / {time.perf_counter() - t0:.1f}秒 "
+          f"（図のキャッシュ利用 {summary['図（キャッシュ）'].sum()} / 描画 {summary['図（描画）'].sum()}）")
+
+
+if __name__ == "__main__":
+    # ワーカーに渡す関数とプールは __main__ ではなく cash_report モジュールのものを使う
+    import cash_report
+    cash_report.main()
@@ -0,0 +1,69 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import streamlit as st
+import cash_engine
+import cash_jobs
+import cash_report
+import cash_store
+
+# 日本語フォント設定（統合アプリと共通）
+cash_engine.setup_fonts()
+
+
+def report_digests(contents):
+    return tuple((name, hashlib.blake2b(data, digest_size=16).hexdigest()) for name, data in contents)
+
+
+@st.cache_data(max_entries=4, show_spinner="ZIPを作成中…")
+def build_archive(digests, _contents):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in _contents:
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+st.title("月次レポートの一括作成")
+st.caption("保存済みの月別履歴から、事業体ごとに将来残高予測・感度分析のグラフと製品別統計情報の表を "
+           f"HTML / PDF で `{cash_report.OUTPUT_DIR}` に出力します。入力が変わっていないグラフは前回の画像を使います。")
+
+entities = cash_store.list_entities()
+if not entities:
+    st.info("保存済みの履歴がありません。「月別手入力で分析」などで月別データを保存してください。")
+    st.stop()
+
+selected = st.multiselect("対象の事業体", entities, default=entities)
+formats = st.multiselect("形式", cash_report.FORMATS, default=cash_report.FORMATS, format_func=str.upper)
+if st.button("レポートを作成", disabled=not (selected and formats)):
+    # 保存内容（signature）も含めて依頼を決める：同じ内容なら作成済みの結果をそのまま表示する
+    st.session_state["_report_request"] = (tuple(selected), tuple(formats),
+                                           tuple(cash_store.signature(e) for e in selected))
+
+request = st.session_state.get("_report_request")
+if request is not None:
+    targets, target_formats, _ = request
+    job = cash_jobs.submit("report", request, cash_report.generate, list(targets), cash_report.OUTPUT_DIR,
+                           list(target_formats))
+    summary = cash_jobs.wait_for(job, "レポート作成")
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("事業体数", f"{len(summary):,}")
+    col2.metric("所要時間", f"{job.elapsed:.1f}秒")
+    col3.metric("グラフのキャッシュ利用", f"{summary['図（キャッシュ）'].sum()} / "
+                f"{summary['図（キャッシュ）'].sum() + summary['図（描画）'].sum()}")
+    st.dataframe(summary.assign(ファイル=summary["ファイル"].map(", ".join)), use_container_width=True)
+
+    # ZIP はボタンを押したときだけ作り、同じ内容のレポートなら前回の ZIP を使う
+    if st.button("ZIPを作成"):
+        contents = []
+        for files in summary["ファイル"]:
+            for path in files:
+                with open(path, "rb") as f:
+                    contents.append((os.path.basename(path), f.read()))
+        st.session_state["_report_zip"] = (request, build_archive(report_digests(contents), contents))
+    archive = st.session_state.get("_report_zip")
+    if archive is not None and archive[0] == request:
+        st.download_button("📥 レポートをまとめてダウンロード（ZIP）", archive[1], file_name="cash_reports.zip")
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import cash_store
+
+# 月×製品の集計値を月方向に累積（先頭に0行）した索引。
+# 任意の期間 [i0, i1) の合計は cum[i1] - cum[i0] の1回の引き算で求まり、
+# 四半期・半期・年度・直近Nヶ月などの集計は期間数に比例する配列演算だけで済む。
+MEASURES = ["スループット", "加重分子", "加重分母"]
+PERIOD_KINDS = ["月", "四半期", "半期", "年度", "直近Nヶ月", "任意期間"]
+
+
+class PrefixIndex:
+    def __init__(self, months, products, measures, cash_change):
+        self.months = list(months)
+        self.products = products
+        # 月の通し番号（欠けている月があっても暦どおりに期間を切る）
+        self.ordinals = pd.PeriodIndex(self.months, freq="M").asi8
+        zero = lambda m: np.concatenate([np.zeros((1,) + m.shape[1:]), np.cumsum(m, axis=0)])
+        self._cum = {name: zero(np.asarray(m, dtype=float)) for name, m in measures.items()}
+        self._cum["現金増減"] = zero(np.nan_to_num(np.asarray(cash_change, dtype=float)))
+        self._cum["月数"] = zero(np.ones(len(self.months)))
+        # 全製品合計も累積しておく（期間の合計が製品数によらず1回の引き算になる）
+        self._totals = {name: cum.sum(axis=1) if cum.ndim == 2 else cum for name, cum in self._cum.items()}
+
+    # 期間ごとの製品別合計（行 = 期間, 列 = 製品）
+    def by_product(self, name, starts, ends):
+        cum = self._cum[name]
+        return cum[ends] - cum[starts]
+
+    # 期間ごとの全製品合計
+    def total(self, name, starts, ends):
+        cum = self._totals[name]
+        return cum[ends] - cum[starts]
+
+    def summary(self, labels, starts, ends):
+        starts, ends = np.asarray(starts, dtype=int), np.asarray(ends, dtype=int)
+        numerator = self.total("加重分子", starts, ends)
+        denominator = self.total("加重分母", starts, ends)
+        return pd.DataFrame({
+            "期間": labels,
+            "開始月": [self.months[i] if i < len(self.months) else None for i in starts],
+            "終了月": [self.months[i - 1] if i > 0 else None for i in ends],
+            "月数": self.total("月数", starts, ends).astype(int),
+            "スループット": self.total("スループット", starts, ends),
+            "加重平均TP/LT": np.divide(numerator, denominator, out=np.zeros(len(starts)), where=denominator != 0).round(2),
+            "現金増減": self.total("現金増減", starts, ends),
+        })
+
+    def product_breakdown(self, start, end):
+        numerator = self.by_product("加重分子", start, end)
+        denominator = self.by_product("加重分母", start, end)
+        return pd.DataFrame({
+            "製品名": self.products,
+            "スループット": self.by_product("スループット", start, end),
+            "加重平均TP/LT": np.divide(numerator, denominator, out=np.full(len(numerator), np.nan),
+                                     where=denominator != 0).round(2),
+        }).dropna(subset=["加重平均TP/LT"]).sort_values("スループット", ascending=False, ignore_index=True)
+
+
+def build_index(frame, cash):
+    # frame: 月・製品名・MEASURES（行は月×製品、重複は合算）／ cash: 月・現金増減
+    months = sorted(set(frame["月"]) | set(cash["月"]))
+    m_codes = pd.Index(months).get_indexer(frame["月"])
+    p_codes, products = pd.factorize(frame["製品名"].astype(str))
+    shape = (len(months), len(products))
+    flat = m_codes * len(products) + p_codes
+    measures = {
+        name: np.bincount(flat, weights=np.nan_to_num(frame[name].to_numpy(dtype=float)),
+                          minlength=shape[0] * shape[1]).reshape(shape)
+        for name in MEASURES
+    }
+    cash_change = np.zeros(len(months))
+    np.add.at(cash_change, pd.Index(months).get_indexer(cash["月"]),
+              np.nan_to_num(cash["現金増減"].to_numpy(dtype=float)))
+    return PrefixIndex(months, products, measures, cash_change)
+
+
+# --- 加重方法ごとの集計値 ---
+def store_measures(product_df):
+    # 手入力（app.py）と同じTP加重：Σ(TP²/LT) / ΣTP
+    tp = pd.to_numeric(product_df["TP（万円）"], errors="coerce").to_numpy(dtype=float)
+    lt = pd.to_numeric(product_df["LT（日）"], errors="coerce").to_numpy(dtype=float)
+    valid = (lt > 0) & ~np.isnan(tp)
+    return pd.DataFrame({
+        "月": product_df["月"].to_numpy(),
+        "製品名": product_df["製品名"].to_numpy(),
+        "スループット": np.where(valid, tp, 0.0),
+        "加重分子": np.divide(tp * tp, lt, out=np.zeros(len(tp)), where=valid),
+        "加重分母": np.where(valid, tp, 0.0),
+    })
+
+
+def csv_measures(df):
+    # 月次CSV（cashflow_app_full.py）と同じ出荷数加重：Σ(TP/LT×出荷数) / Σ出荷数。
+    # 製品名の列がない月次CSV（元の形式）は totals_measures と同じく全体のみ
+    tp = pd.to_numeric(df["スループット（TP）"], errors="coerce").to_numpy(dtype=float)
+    lt = pd.to_numeric(df["リードタイム（LT）"], errors="coerce").to_numpy(dtype=float)
+    qty = pd.to_numeric(df["出荷数"], errors="coerce").to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weighted = tp / lt * qty
+    return pd.DataFrame({
+        "月": df["月（YYYY-MM）"].to_numpy(),
+        "製品名": df["製品名"].to_numpy() if "製品名" in df.columns else "全体",
+        "スループット": tp * qty,
+        "加重分子": np.where(np.isfinite(weighted), weighted, 0.0),
+        "加重分母": qty,
+    })
+
+
+def totals_measures(totals):
+    # フォルダ監視（cash_watch）の月別合計：製品の内訳はなく全体のみ
+    return pd.DataFrame({
+        "月": totals["月"],
+        "製品名": "全体",
+        "スループット": totals["TP×出荷数"],
+        "加重分子": totals["TP/LT×出荷数"],
+        "加重分母": totals["出荷数"],
+    })
+
+
+# 保存済み履歴（事業体の全期間）の索引。signature が変わったときだけ作り直す
+@st.cache_data(show_spinner=False)
+def store_index(entity, signature):
+    products = cash_store.load_products(entity)
+    cash = cash_store.load_cash(entity)
+    cash["現金増減"] = cash["期末現金残高"] - cash["期首現金残高"]
+    return build_index(store_measures(products), cash)
+
+
+# 保存済み履歴の月別集計（期首・期末現金と、手入力モードと同じTP加重の加重平均TP/LT）
+@st.cache_data(show_spinner=False)
+def store_monthly(entity, signature):
+    cash = cash_store.load_cash(entity).set_index("月")
+    measures = store_measures(cash_store.load_products(entity)).groupby("月")[["加重分子", "加重分母"]].sum()
+    cash = cash.join(measures)
+    numerator, denominator = cash["加重分子"].fillna(0).to_numpy(), cash["加重分母"].fillna(0).to_numpy()
+    cash["加重平均TP/LT"] = np.divide(numerator, denominator, out=np.zeros(len(cash)), where=denominator > 0)
+    return cash[["期首現金残高", "期末現金残高", "加重平均TP/LT"]]
+
+
+# 月次CSVの索引（digest はアップロード内容のハッシュ）
+@st.cache_data(show_spinner=False)
+def csv_index(digest, _df, _result_df):
+    return build_index(csv_measures(_df), _result_df)
+
+
+# --- 期間の切り方：各期間の [開始, 終了) を月の位置で返す ---
+def period_bounds(index, kind, fiscal_start=4, trailing=12):
+    ordinals = index.ordinals
+    if len(ordinals) == 0:
+        return [], np.array([], dtype=int), np.array([], dtype=int)
+    if kind == "直近Nヶ月":
+        ends = np.arange(1, len(ordinals) + 1)
+        starts = np.searchsorted(ordinals, ordinals - trailing + 1)
+        return [f"{m}まで{trailing}ヶ月" for m in index.months], starts, ends
+
+    shifted = ordinals - (fiscal_start - 1)
+    year = 1970 + shifted // 12
+    if kind == "月":
+        keys, labels = ordinals, list(index.months)
+    elif kind == "四半期":
+        keys = shifted // 3
+        labels = [f"{y}年度 Q{q + 1}" for y, q in zip(year, shifted % 12 // 3)]
+    elif kind == "半期":
+        keys = shifted // 6
+        labels = [f"{y}年度 {'上期' if h == 0 else '下期'}" for y, h in zip(year, shifted % 12 // 6)]
+    else:
+        keys = shifted // 12
+        labels = [f"{y}年度" for y in year]
+    # 月は昇順なので同じキーは連続する
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return [labels[i] for i in starts], starts, ends
+
+
+# --- 画面：期間の切り替えは索引の引き算だけで再計算する ---
+def show_rollups(index, key):
+    if not index.months:
+        st.info("集計できる月がありません。")
+        return
+    col1, col2 = st.columns(2)
+    kind = col1.radio("集計期間", PERIOD_KINDS, horizontal=True, key=f"{key}_kind")
+    if kind in ("四半期", "半期", "年度"):
+        fiscal_start = col2.selectbox("期首月", list(range(1, 13)), index=3, format_func=lambda m: f"{m}月",
+                                      key=f"{key}_fiscal")
+        labels, starts, ends = period_bounds(index, kind, fiscal_start=fiscal_start)
+    elif kind == "直近Nヶ月":
+        trailing = col2.number_input("N（ヶ月）", min_value=1, max_value=120, value=12, key=f"{key}_n")
+        labels, starts, ends = period_bounds(index, kind, trailing=int(trailing))
+    elif kind == "任意期間":
+        first, last = col2.select_slider("期間", options=index.months, value=(index.months[0], index.months[-1]),
+                                         key=f"{key}_range")
+        start, end = index.months.index(first), index.months.index(last) + 1
+        labels, starts, ends = [f"{first}〜{last}"], np.array([start]), np.array([end])
+    else:
+        labels, starts, ends = period_bounds(index, kind)
+
+    summary = index.summary(labels, starts, ends)
+    st.dataframe(summary, use_container_width=True)
+    st.download_button("📥 期間別集計をCSVでダウンロード", summary.to_csv(index=False).encode("utf-8-sig"),
+                       file_name="cash_rollup.csv", key=f"{key}_download")
+
+    if len(index.products) > 1:
+        period = st.selectbox("製品別の内訳を表示する期間", range(len(labels)), index=len(labels) - 1,
+                              format_func=lambda i: labels[i], key=f"{key}_period")
+        st.dataframe(index.product_breakdown(starts[period], ends[period]), use_container_width=True)
@@ -0,0 +1,63 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+# 大きな受注CSVの概算表示：全件の解析が終わるまでの間、ファイル中のランダムな位置から拾った行で
+# 製品別統計とバブルチャートを先に出す（誤差幅つき）。全件の結果が出たら通常の表示に置き換わる。
+PREVIEW_BYTES = int(os.environ.get("CASH_PREVIEW_BYTES", str(50 * 2**20)))
+PREVIEW_ROWS = int(os.environ.get("CASH_PREVIEW_ROWS", "20000"))
+Z = 1.96  # 95% 信頼区間
+
+
+def sample_lines(data, encoding, size=PREVIEW_ROWS, seed=0):
+    # ランダムなバイト位置の「次の行」を取る。位置が当たった行は長い行ほど選ばれやすいが、
+    # その次の行は長さに依存しないので、ファイルの読み込みなしでほぼ一様な行の標本になる
+    header_end = data.find(b"\n") + 1
+    rng = np.random.default_rng(seed)
+    starts = set()
+    for offset in rng.integers(header_end, len(data), size):
+        start = data.find(b"\n", offset) + 1
+        if 0 < start < len(data):
+            starts.add(start)
+    lines = []
+    for start in sorted(starts):
+        end = data.find(b"\n", start)
+        lines.append(data[start:end if end >= 0 else len(data)].rstrip(b"\r"))
+    body = io.BytesIO(data[:header_end] + b"\n".join(lines))
+    sample = pd.read_csv(body, encoding=encoding, on_bad_lines="skip")
+    # 全体の行数は標本の平均行長から推定する
+    mean_length = np.mean([len(line) + 1 for line in lines]) if lines else 1
+    return sample, int((len(data) - header_end) / mean_length)
+
+
+def approximate_stats(sample, total_rows):
+    grouped = sample.groupby("品名", observed=True)[["スループット", "TP/LT"]]
+    n = grouped.count()["スループット"]
+    share = n / len(sample)
+    stats = pd.DataFrame({
+        "推定件数": (share * total_rows).round(),
+        "件数の誤差(±)": (Z * np.sqrt(share * (1 - share) / len(sample)) * total_rows).round(),
+    })
+    means, stds = grouped.mean(), grouped.std()
+    for column in ["スループット", "TP/LT"]:
+        stats[f"{column} 平均"] = means[column]
+        stats[f"{column} 誤差(±)"] = Z * stds[column] / np.sqrt(n)
+    stats["標本数"] = n
+    return stats.sort_values("推定件数", ascending=False)
+
+
+# --- 画面：解析ジョブの途中で表示する概算 ---
+def show_preview(preview):
+    sample, total_rows = preview
+    st.info(f"⏳ 全件を解析中です。先に約 {total_rows:,} 行中 {len(sample):,} 行のランダム標本から求めた概算を表示しています"
+            "（誤差は95%信頼区間）。")
+    st.subheader("製品別統計情報（概算）")
+    st.dataframe(approximate_stats(sample, total_rows), use_container_width=True)
+    st.subheader("キャッシュ生産性バブルチャート（標本）")
+    fig = px.scatter(sample, x="TP/LT", y="スループット", color="品名", size="出荷数",
+                     hover_data=["品名", "スループット", "TP/LT", "リードタイム"])
+    st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cash_compute
+
+# 計算サービス：cash_compute の計算を常駐ワーカープロセスのプールで実行するローカルHTTPサーバー。
+#   python cash_service.py --port 8765 --workers 4
+# 画面側は CASH_SERVICE_URL=http://127.0.0.1:8765 を設定すると call() がサービスに依頼し、
+# 未設定・接続できない場合はその場（画面のプロセス）で計算する。
+SERVICE_URL = os.environ.get("CASH_SERVICE_URL", "")
+TIMEOUT = float(os.environ.get("CASH_SERVICE_TIMEOUT", "30"))
+BATCH_WINDOW = float(os.environ.get("CASH_SERVICE_BATCH_MS", "5")) / 1000
+MAX_BATCH = 64
+CACHE_SIZE = int(os.environ.get("CASH_SERVICE_CACHE", "512"))
+
+
+def request_key(op, args):
+    payload = json.dumps([op, args], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# --- ワーカープロセス側 ---
+def _warm():
+    # 起動時に各ワーカーで pandas / numpy などの読み込みを済ませておく
+    return os.getpid()
+
+
+def _run_batch(requests):
+    results = []
+    for op, args in requests:
+        try:
+            results.append((True, cash_compute.OPS[op](**args)))
+        except Exception as e:
+            results.append((False, f"{type(e).__name__}: {e}"))
+    return results
+
+
+# --- サーバー側：短い時間窓で依頼をまとめ、同じ依頼は1回だけ計算してキャッシュする ---
+class Batcher:
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        for f in [self.pool.submit(_warm) for _ in range(workers)]:
+            f.result()
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "batches": 0, "computed": 0}
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._loop, name="cash-service-batcher", daemon=True).start()
+
+    def submit(self, op, args):
+        if op not in cash_compute.OPS:
+            raise KeyError(f"未対応の計算です: {op}")
+        key = request_key(op, args)
+        future = Future()
+        with self._lock:
+            self.stats["requests"] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                future.set_result(self._cache[key])
+                return future
+            if key in self._inflight:
+                # 計算中の同じ依頼には結果を相乗りさせる
+                self.stats["coalesced"] += 1
+                self._inflight[key].append(future)
+                return future
+            self._inflight[key] = [future]
+        self._queue.put((key, op, args))
+        return future
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # ワーカー数に分けて送る（1依頼ずつ送るよりプロセス間のやり取りが減る）
+            size = -(-len(batch) // self.workers)
+            for i in range(0, len(batch), size):
+                chunk = batch[i:i + size]
+                task = self.pool.submit(_run_batch, [(op, args) for _, op, args in chunk])
+                task.add_done_callback(lambda t, chunk=chunk: self._finish(chunk, t))
+            with self._lock:
+                self.stats["batches"] += 1
+
+    def _finish(self, chunk, task):
+        try:
+            results = task.result()
+        except Exception as e:
+            results = [(False, f"{type(e).__name__}: {e}")] * len(chunk)
+        with self._lock:
+            for (key, _, _), (ok, value) in zip(chunk, results):
+                futures = self._inflight.pop(key, [])
+                self.stats["computed"] += 1
+                if ok:
+                    self._cache[key] = value
+                    while len(self._cache) > CACHE_SIZE:
+                        self._cache.popitem(last=False)
+                for future in futures:
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(RuntimeError(value))
+
+
+class Handler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def _reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"ok": False, "error": "not found"})
+        self._reply(200, {"ok": True, "workers": self.batcher.workers, **self.batcher.stats})
+
+    def do_POST(self):
+        if self.path != "/compute":
+            return self._reply(404, {"ok": False, "error": "not found"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            result = self.batcher.submit(request["op"], request.get("args", {})).result(timeout=TIMEOUT)
+        except (KeyError, ValueError, RuntimeError) as e:
+            return self._reply(400, {"ok": False, "error": str(e)})
+        except Exception as e:
+            return self._reply(500, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+        self._reply(200, {"ok": True, "result": result})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    # 複数の画面から同時に依頼が来ても接続待ちで切られないようにする
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def serve(host="127.0.0.1", port=8765, workers=None):
+    Handler.batcher = Batcher(workers or os.cpu_count() or 2)
+    server = Server((host, port), Handler)
+    print(f"cash_service: http://{host}:{port} （ワーカー {Handler.batcher.workers}）")
+    server.serve_forever()
+
+
+# --- 画面側：サービスに依頼し、使えなければその場で計算する ---
+_log = logging.getLogger(__name__)
+_fallback_warned = False
+
+
+class ServiceError(Exception):
+    pass
+
+
+def call(op, **args):
+    global _fallback_warned
+    if SERVICE_URL:
+        body = json.dumps({"op": op, "args": args}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(SERVICE_URL.rstrip("/") + "/compute", data=body,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                return json.loads(response.read())["result"]
+        except urllib.error.HTTPError as e:
+            # 計算自体の失敗はその場で計算し直しても同じなのでそのまま伝える
+            raise ServiceError(json.loads(e.read()).get("error", str(e)))
+        except (urllib.error.URLError, OSError) as e:
+            if not _fallback_warned:
+                _log.warning("%s に接続できないためローカルで計算します（%s）", SERVICE_URL, e)
+                _fallback_warned = True
+    return cash_compute.OPS[op](**args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="キャッシュ分析の計算サービス")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（既定: CPU数）")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
@@ -0,0 +1,247 @@
+import hashlib
+import importlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import cash_ledger
+
+# セッションの入力と計算結果のスナップショット：接続が切れたりサーバーを再起動したりしても、
+# URL の ?sid= が同じなら入力欄・編集中の表・集計や予測の結果をそのまま戻す。
+# 数値の配列は内容のハッシュ名の .npy に1回だけ書き、戻すときは np.load(mmap_mode="r") で読む（コピーなし）。
+# それ以外（列名・文字列・スカラー）は state.json に持つ。
+SNAPSHOT_DIR = os.environ.get("CASH_SNAPSHOT_DIR", "cash_sessions")
+KEEP_DAYS = float(os.environ.get("CASH_SNAPSHOT_DAYS", "14"))
+# どの state.json からも参照されなくなった配列を消すまでの猶予（秒）。同じ sid の別タブが書いている途中の配列を残すため
+ARRAY_GRACE = 600
+_SID = re.compile(r"^[0-9a-f]{32}$")
+_MISSING = object()
+
+
+# --- 値 ⇔ JSON＋配列 ---
+def _array(values, arrays):
+    data = np.ascontiguousarray(values)
+    digest = hashlib.blake2b(data.tobytes(), digest_size=12)
+    digest.update(f"{data.dtype.str}{data.shape}".encode("ascii"))
+    name = digest.hexdigest()
+    arrays[name] = data
+    return {"npy": name}
+
+
+def _column(values, arrays):
+    values = np.asarray(values)
+    if values.dtype.kind in "biufmM":
+        return _array(values, arrays)
+    return {"list": [None if pd.isna(v) else _encode(v, arrays) for v in values]}
+
+
+def _encode(value, arrays):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return _column(value, arrays)
+    if isinstance(value, pd.DataFrame):
+        index = value.index
+        return {"frame": {
+            "columns": [str(c) for c in value.columns],
+            "data": [_column(value[c].to_numpy(), arrays) for c in value.columns],
+            "index": ({"range": [index.start, index.stop, index.step]} if isinstance(index, pd.RangeIndex)
+                      else _column(index.to_numpy(), arrays)),
+        }}
+    if isinstance(value, cash_ledger.MonthlyLedger):
+        return {"ledger": {"months": _column(value.months, arrays),
+                           "fields": {name: _array(v, arrays) for name, v in value.fields.items()}}}
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        cls = type(value)
+        return {"namedtuple": [cls.__module__, cls.__name__, [_encode(v, arrays) for v in value]]}
+    if isinstance(value, tuple):
+        return {"tuple": [_encode(v, arrays) for v in value]}
+    if isinstance(value, list):
+        return {"items": [_encode(v, arrays) for v in value]}
+    if isinstance(value, dict):
+        return {"dict": [[_encode(k, arrays), _encode(v, arrays)] for k, v in value.items()]}
+    raise TypeError(f"スナップショットに保存できない値です: {type(value).__name__}")
+
+
+def fingerprint(value):
+    # 入力の指紋：配列は内容のハッシュに置き換わるので、JSON のハッシュがそのまま内容のハッシュになる。
+    # 毎回の実行で求めるので、表そのものではなく表のキー（読み込み元と data_editor の差分など）を渡す
+    payload = json.dumps(_encode(value, {}), sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# --- セッションごとのスナップショット ---
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        self._stored = None
+        self._decoded = {}
+        self._values = {}
+        self._results = {}
+        self._written = None
+        self._damaged = False
+
+    def _load(self):
+        # 最初に必要になったときに1回だけ読む（このセッションの間、戻す値は変わらない）
+        if self._stored is None:
+            try:
+                with open(os.path.join(self.path, "state.json"), encoding="utf-8") as f:
+                    self._written = f.read()
+                self._stored = json.loads(self._written)
+            except (OSError, ValueError):
+                self._stored = {"values": {}, "results": {}}
+        return self._stored
+
+    def _decode(self, spec):
+        if not isinstance(spec, dict):
+            return spec
+        kind, body = next(iter(spec.items()))
+        if kind == "npy":
+            return np.load(os.path.join(self.path, f"{body}.npy"), mmap_mode="r")
+        if kind == "list":
+            return np.array([self._decode(v) for v in body], dtype=object)
+        if kind == "frame":
+            index = body["index"]
+            index = pd.RangeIndex(*index["range"]) if "range" in index else self._decode(index)
+            data = {c: self._decode(v) for c, v in zip(body["columns"], body["data"])}
+            return pd.DataFrame(data, index=index, copy=False)
+        if kind == "ledger":
+            return cash_ledger.MonthlyLedger(self._decode(body["months"]),
+                                             **{name: self._decode(v) for name, v in body["fields"].items()})
+        if kind == "namedtuple":
+            module, name, values = body
+            return getattr(importlib.import_module(module), name)(*[self._decode(v) for v in values])
+        if kind == "tuple":
+            return tuple(self._decode(v) for v in body)
+        if kind == "items":
+            return [self._decode(v) for v in body]
+        return {self._decode(k): self._decode(v) for k, v in body}
+
+    # 配列のファイルが消えた・壊れたときはスナップショットがないものとして扱う（default を返す）。
+    # 壊れた配列と同じ名前の配列は次の保存で書き直す
+    def _restore(self, spec, default):
+        try:
+            return self._decode(spec)
+        except (OSError, ValueError, EOFError):
+            self._damaged = True
+            return default
+
+    # 前回のセッションで保存した値（なければ default）。ウィジェットの初期値に使う
+    def restored(self, name, default=None):
+        if name not in self._decoded:
+            spec = self._load()["values"].get(name)
+            self._decoded[name] = default if spec is None else self._restore(spec, default)
+        return self._decoded[name]
+
+    def keep(self, name, value):
+        self._values[name] = value
+
+    # 入力（key）が前回と同じなら保存済みの計算結果を返し、違えば compute() で計算し直す
+    def result(self, name, key, compute):
+        key = fingerprint(key)
+        cached = self._results.get(name)
+        if cached is None:
+            stored = self._load()["results"].get(name)
+            if stored is not None and stored[0] == key:
+                value = self._restore(stored[1], _MISSING)
+                if value is not _MISSING:
+                    cached = (key, value)
+        if cached is None or cached[0] != key:
+            cached = (key, compute())
+        self._results[name] = cached
+        return cached[1]
+
+    # スクリプトの最後に呼ぶ：内容が変わったときだけ書く（配列は新しいものだけ）
+    def save(self):
+        arrays = {}
+        state = {
+            "values": {name: _encode(v, arrays) for name, v in self._values.items()},
+            "results": {name: [key, _encode(v, arrays)] for name, (key, v) in self._results.items()},
+        }
+        text = json.dumps(state, ensure_ascii=False, sort_keys=True)
+        if text == self._written:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        for name, data in arrays.items():
+            target = os.path.join(self.path, f"{name}.npy")
+            # 既にある配列は更新時刻だけ進める（別タブの掃除で消されないように）。消えていたら書き直す
+            if self._damaged or not _touch(target):
+                _replace(target, lambda f: np.save(f, data, allow_pickle=False))
+        _replace(os.path.join(self.path, "state.json"), lambda f: f.write(text.encode("utf-8")))
+        _sweep(self.path)
+        os.utime(os.path.dirname(self.path))
+        self._written = text
+        self._damaged = False
+
+
+def _replace(path, write):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _sweep(path):
+    # 今の state.json（同じ sid の別タブが書いたものかもしれない）が参照せず、猶予より古い配列だけを消す。
+    # 別のセッションが mmap で開いている配列は Windows では消せないので、そのときは次の機会に回す
+    try:
+        with open(os.path.join(path, "state.json"), encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return
+    limit = time.time() - ARRAY_GRACE
+    for entry in os.scandir(path):
+        if entry.name.endswith(".npy") and f'"{entry.name[:-4]}"' not in text:
+            try:
+                if entry.stat().st_mtime < limit:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _prune():
+    # 一定期間使われていないセッションのスナップショットを消す
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return
+    limit = time.time() - KEEP_DAYS * 86400
+    for entry in os.scandir(SNAPSHOT_DIR):
+        if entry.is_dir() and _SID.match(entry.name) and entry.stat().st_mtime < limit:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def session_id():
+    # URL の ?sid= を使う（なければ発行して URL に付ける）。ページを切り替えて消えたら付け直す
+    sid = st.session_state.get("_snapshot_sid") or st.query_params.get("sid", "")
+    if not _SID.match(sid):
+        sid = uuid.uuid4().hex
+        _prune()
+    st.session_state["_snapshot_sid"] = sid
+    if st.query_params.get("sid") != sid:
+        st.query_params["sid"] = sid
+    return sid
+
+
+def session(page):
+    sid = session_id()
+    snapshots = st.session_state.setdefault("_snapshots", {})
+    if page not in snapshots:
+        snapshots[page] = Snapshot(os.path.join(SNAPSHOT_DIR, sid, page))
+    return snapshots[page]
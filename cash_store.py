@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+# 月別履歴の保存先（SQLite）。環境変数で切り替え可能
+DEFAULT_DB_PATH = os.environ.get("CASH_STORE_PATH", "cash_history.db")
+DEFAULT_ENTITY = "本社"
+
+PRODUCT_COLUMNS = ["製品名", "TP（万円）", "LT（日）", "出荷数"]
+
+# 事業体 × 月 × 製品 の主キー（=索引）で範囲検索できるようにする
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS monthly_cash (
+    entity     TEXT NOT NULL,
+    month      TEXT NOT NULL,
+    cash_start REAL,
+    cash_end   REAL,
+    PRIMARY KEY (entity, month)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS product_month (
+    entity  TEXT NOT NULL,
+    month   TEXT NOT NULL,
+    product TEXT NOT NULL,
+    tp      REAL,
+    lt      REAL,
+    qty     REAL,
+    PRIMARY KEY (entity, month, product)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_product_month_product
+    ON product_month (entity, product, month);
+
+CREATE TABLE IF NOT EXISTS revision (
+    entity TEXT NOT NULL PRIMARY KEY,
+    rev    INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+_initialized = set()
+
+
+def _connect(path=None):
+    path = path or DEFAULT_DB_PATH
+    conn = sqlite3.connect(path, timeout=30)
+    if path not in _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _initialized.add(path)
+    return conn
+
+
+# --- 書き込み ---
+def _bump(conn, entity):
+    # 書き込みのたびに事業体の版数を上げる（同じトランザクションの中で）。
+    # 版数は書き込み時刻（ナノ秒）以上にして、DBを作り直しても前の版数と重ならないようにする
+    conn.execute("INSERT INTO revision VALUES (?, ?) "
+                 "ON CONFLICT (entity) DO UPDATE SET rev = MAX(rev + 1, excluded.rev)", (entity, time.time_ns()))
+
+
+def save_month(entity, month, cash_start, cash_end, products=None, path=None):
+    rows = []
+    if products is not None and len(products):
+        df = products.dropna(subset=["製品名"])
+        df = df[df["製品名"].astype(str).str.strip() != ""]
+        qty = df["出荷数"] if "出荷数" in df else pd.Series(0, index=df.index)
+        rows = list(zip(
+            [entity] * len(df), [month] * len(df),
+            df["製品名"].astype(str),
+            pd.to_numeric(df["TP（万円）"], errors="coerce").astype(float),
+            pd.to_numeric(df["LT（日）"], errors="coerce").astype(float),
+            pd.to_numeric(qty, errors="coerce").fillna(0).astype(float),
+        ))
+
+    with closing(_connect(path)) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO monthly_cash VALUES (?, ?, ?, ?)",
+            (entity, month, cash_start, cash_end),
+        )
+        # 月単位で製品行を置き換える（削除された行も反映）
+        conn.execute("DELETE FROM product_month WHERE entity = ? AND month = ?", (entity, month))
+        conn.executemany("INSERT OR REPLACE INTO product_month VALUES (?, ?, ?, ?, ?, ?)", rows)
+        _bump(conn, entity)
+
+
+def save_cash_history(entity, cash_df, path=None):
+    # cash_df: 月 / 期首現金残高 / 期末現金残高 の表をまとめて保存
+    rows = [
+        (entity, r[0], r[1], r[2])
+        for r in cash_df[["月", "期首現金残高", "期末現金残高"]].itertuples(index=False)
+    ]
+    with closing(_connect(path)) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO monthly_cash VALUES (?, ?, ?, ?)", rows)
+        _bump(conn, entity)
+
+
+# --- 読み込み（索引付き範囲検索） ---
+def _range_clause(start, end):
+    clause, params = "", []
+    if start:
+        clause += " AND month >= ?"
+        params.append(start)
+    if end:
+        clause += " AND month <= ?"
+        params.append(end)
+    return clause, params
+
+
+def load_cash(entity, start=None, end=None, path=None):
+    clause, params = _range_clause(start, end)
+    with closing(_connect(path)) as conn:
+        return pd.read_sql_query(
+            "SELECT month AS 月, cash_start AS 期首現金残高, cash_end AS 期末現金残高 "
+            "FROM monthly_cash WHERE entity = ?" + clause + " ORDER BY month",
+            conn, params=[entity] + params,
+        )
+
+
+def load_products(entity, start=None, end=None, product=None, path=None):
+    clause, params = _range_clause(start, end)
+    if product is not None:
+        clause += " AND product = ?"
+        params.append(product)
+    with closing(_connect(path)) as conn:
+        return pd.read_sql_query(
+            "SELECT month AS 月, product AS 製品名, tp AS 'TP（万円）', lt AS 'LT（日）', qty AS 出荷数 "
+            "FROM product_month WHERE entity = ?" + clause + " ORDER BY month, product",
+            conn, params=[entity] + params,
+        )
+
+
+def load_month(entity, month, path=None):
+    cash = load_cash(entity, month, month, path=path)
+    products = load_products(entity, month, month, path=path)[PRODUCT_COLUMNS].reset_index(drop=True)
+    if cash.empty:
+        return None, None, products
+    return cash.iloc[0]["期首現金残高"], cash.iloc[0]["期末現金残高"], products
+
+
+def list_entities(path=None):
+    with closing(_connect(path)) as conn:
+        rows = conn.execute("SELECT DISTINCT entity FROM monthly_cash ORDER BY entity").fetchall()
+    return [r[0] for r in rows]
+
+
+def list_months(entity, path=None):
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(
+            "SELECT month FROM monthly_cash WHERE entity = ? ORDER BY month", (entity,)
+        ).fetchall()
+    return [r[0] for r in rows]
+
+
+def signature(entity, path=None):
+    # 事業体の保存内容が変わったかどうかの判定用（書き込みごとに上がる版数。未保存なら 0）
+    with closing(_connect(path)) as conn:
+        row = conn.execute("SELECT rev FROM revision WHERE entity = ?", (entity,)).fetchone()
+    return row[0] if row else 0
+
+
+def month_labels(start, count):
+    # "2024-11" から count ヶ月分の "YYYY-MM" を生成
+    return [str(p) for p in pd.period_range(start=start, periods=count, freq="M")]
@@ -2,9 +2,13 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
+import cash_ledger
+import cash_metrics
+import cash_engine
+import cash_contrib
 
 # フォント設定（日本語対応）
-plt.rcParams["font.family"] = "Noto Sans CJK JP"
+cash_engine.setup_fonts()
 
 st.title("出荷量を加味したキャッシュフロー生産性と現金増減の関係分析")
 
@@ -30,28 +34,24 @@ for i in range(months):
     monthly_product_data[i] = df
 
 # 3. 集計処理
-results = []
+ledger = cash_ledger.MonthlyLedger.allocate([f"{i+1}ヶ月目" for i in range(months)],
+                                            ["スループット総量（万円）", "LT加重総和（日）",
+                                             "加重平均キャッシュ生産性（TP/LT）", "現金増減額（万円）"])
+all_products = []
 
 for i in range(months):
-    df = monthly_product_data[i]
-    df = df[(df["TP（万円）"] > 0) & (df["LT（日）"] > 0) & (df["出荷数"] > 0)]
-
-    tp_total = (df["TP（万円）"] * df["出荷数"]).sum()
-    lt_total = (df["LT（日）"] * df["出荷数"]).sum()
-    weighted_tp_lt = tp_total / lt_total if lt_total > 0 else 0
+    all_products.append(cash_metrics.product_rows(monthly_product_data[i], f"{i+1}ヶ月目"))
+    tp_total, lt_total, weighted_tp_lt = cash_metrics.shipment_weighted(monthly_product_data[i])
     cash_change = cash_balances[i+1] - cash_balances[i]
 
-    results.append({
-        "月": f"{i+1}ヶ月目",
-        "スループット総量（万円）": tp_total,
-        "LT加重総和（日）": lt_total,
-        "加重平均キャッシュ生産性（TP/LT）": round(weighted_tp_lt, 2),
-        "現金増減額（万円）": cash_change
-    })
+    ledger["スループット総量（万円）"][i] = tp_total
+    ledger["LT加重総和（日）"][i] = lt_total
+    ledger["加重平均キャッシュ生産性（TP/LT）"][i] = round(weighted_tp_lt, 2)
+    ledger["現金増減額（万円）"][i] = cash_change
 
 # 4. 表形式で表示
 st.markdown("### 集計結果")
-result_df = pd.DataFrame(results)
+result_df = ledger.frame()
 st.dataframe(result_df, use_container_width=True)
 
 # 5. グラフ表示
@@ -61,19 +61,24 @@ x = result_df["加重平均キャッシュ生産性（TP/LT）"]
 y = result_df["現金増減額（万円）"]
 ax.scatter(x, y, s=100)
 
-# 回帰直線
-if len(x) >= 2:
+# 回帰直線（全月が同じ値だと傾きが定まらないので描かない）
+if len(x) >= 2 and x.nunique() >= 2:
     import numpy as np
     slope, intercept = np.polyfit(x, y, 1)
     ax.plot(x, slope * x + intercept, linestyle="--", color="gray", label="回帰直線")
     ax.legend()
 
 # ラベル
-for i, row in result_df.iterrows():
-    ax.annotate(row["月"], (row["加重平均キャッシュ生産性（TP/LT）"], row["現金増減額（万円）"]))
+ledger.annotate(ax, "加重平均キャッシュ生産性（TP/LT）", "現金増減額（万円）")
 
 ax.set_xlabel("加重平均キャッシュ生産性（TP/LT）")
 ax.set_ylabel("現金増減額（万円）")
 ax.set_title("月別：出荷量加味キャッシュ生産性と現金変動の関係")
 ax.grid(True)
 st.pyplot(fig)
+
+# 6. 製品別の寄与分析
+st.markdown("### 製品別の寄与分析：どの製品のTP/LTが現金増減と連動しているか")
+product_df = pd.concat(all_products, ignore_index=True)
+product_df["スループット"] = product_df["TP（万円）"] * product_df["出荷数"]
+cash_contrib.show_contributions(product_df, ledger.months, ledger["現金増減額（万円）"], "tp_weighted_contrib")
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import streamlit as st
+from matplotlib.collections import LineCollection
+
+# 製品別TP/LT推移：製品×月の行列に一度だけピボットし、選択・描画は行列演算で行う
+SELECTION_MODES = {
+    "上位N（直近TP/LT）": "top",
+    "下位N（直近TP/LT）": "bottom",
+    "変動上位N（TP/LT変化幅）": "movers",
+    "全製品": "all",
+}
+LEGEND_MAX = 15
+
+
+def product_month_matrix(product_df, value="TP/LT", months=None):
+    # 月は入力順（"1ヶ月目", "2ヶ月目", ...）を保つ。同一月の重複製品は平均
+    # months を渡すとその順・その列数にそろえる（製品行のない月は全製品 NaN、months にない月の行は無視）
+    pcodes, products = pd.factorize(product_df["製品名"].astype(str))
+    if months is None:
+        mcodes, months = pd.factorize(product_df["月"])
+    else:
+        months = pd.Index(months)
+        mcodes = months.get_indexer(product_df["月"])
+    n_products, n_months = len(products), len(months)
+
+    keep = mcodes >= 0
+    flat = (pcodes * n_months + mcodes)[keep]
+    values = product_df[value].to_numpy(dtype=float)[keep]
+    sums = np.bincount(flat, weights=values, minlength=n_products * n_months)
+    counts = np.bincount(flat, minlength=n_products * n_months)
+    matrix = np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+    return products, months, matrix.reshape(n_products, n_months)
+
+
+def _last_valid(matrix):
+    # 各製品の最後の非欠損値
+    valid = ~np.isnan(matrix)
+    last = matrix.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    return matrix[np.arange(len(matrix)), last]
+
+
+def _first_valid(matrix):
+    first = np.argmax(~np.isnan(matrix), axis=1)
+    return matrix[np.arange(len(matrix)), first]
+
+
+def select_products(matrix, mode, n):
+    n_products = len(matrix)
+    if mode == "all" or n >= n_products:
+        return np.arange(n_products)
+
+    if mode == "movers":
+        score = np.abs(_last_valid(matrix) - _first_valid(matrix))
+    elif mode == "bottom":
+        score = -_last_valid(matrix)
+    else:
+        score = _last_valid(matrix)
+    score = np.nan_to_num(score, nan=-np.inf)
+
+    # O(P) で上位N件を取り出してから、その中だけ並べ替える
+    idx = np.argpartition(score, n_products - n)[n_products - n:]
+    return idx[np.argsort(score[idx])[::-1]]
+
+
+def draw_trends(ax, months, matrix, labels):
+    n_products, n_months = matrix.shape
+    x = np.broadcast_to(np.arange(n_months, dtype=float), matrix.shape)
+    segments = np.stack([x, matrix], axis=-1)
+
+    colors = plt.cm.tab20(np.arange(n_products) % 20)
+    lines = LineCollection(segments, colors=colors, linewidths=1.5 if n_products <= LEGEND_MAX else 0.6,
+                           alpha=1.0 if n_products <= LEGEND_MAX else 0.4)
+    ax.add_collection(lines)
+    if n_products <= LEGEND_MAX:
+        ax.scatter(x.ravel(), matrix.ravel(), c=np.repeat(colors, n_months, axis=0), s=15)
+        handles = [plt.Line2D([], [], color=c, marker="o") for c in colors]
+        ax.legend(handles, list(labels), fontsize="small")
+
+    ax.set_xticks(np.arange(n_months))
+    ax.set_xticklabels(list(months))
+    ax.set_xlim(-0.2, max(n_months - 0.8, 0.2))
+    finite = matrix[np.isfinite(matrix)]
+    if finite.size:
+        pad = (finite.max() - finite.min()) * 0.05 or 1.0
+        ax.set_ylim(finite.min() - pad, finite.max() + pad)
+
+
+def show_product_trends(product_df):
+    products, months, matrix = product_month_matrix(product_df)
+    if len(products) == 0:
+        return
+
+    col1, col2 = st.columns([3, 1])
+    label = col1.selectbox("表示する製品", list(SELECTION_MODES), key="trend_mode")
+    top_n = col2.number_input("N", min_value=1, max_value=max(len(products), 1),
+                              value=min(10, len(products)), key="trend_n")
+    idx = select_products(matrix, SELECTION_MODES[label], top_n)
+
+    fig, ax = plt.subplots()
+    draw_trends(ax, months, matrix[idx], products[idx])
+    ax.set_title(f"製品別TP/LT推移（{len(idx)} / {len(products)} 製品）")
+    ax.set_xlabel("月")
+    ax.set_ylabel("TP/LT（万円/日）")
+    ax.grid(True)
+    st.pyplot(fig)
@@ -0,0 +1,192 @@
+import bisect
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import cash_metrics
+
+# 月次CSVを置くフォルダを監視し、新しく届いたファイルだけを取り込む。
+# ファイルごとの月別合計を保持し、変わった月の集計・現金増減の連鎖・回帰の十分統計量だけを更新する。
+DEFAULT_DIR = os.environ.get("CASH_WATCH_DIR", "monthly_inbox")
+POLL_SECONDS = float(os.environ.get("CASH_WATCH_INTERVAL", "5"))
+MAX_WATCHES = int(os.environ.get("CASH_WATCH_MAX", "8"))
+
+
+class WatchFolder:
+    def __init__(self, directory):
+        self.directory = directory
+        self.version = 0
+        self.errors = {}
+        self._files = {}    # ファイル名 → (更新時刻, サイズ)
+        self._parts = {}    # ファイル名 → そのファイルの月別合計
+        self._months = []   # 取り込み済みの月（昇順）
+        self._sums = {}     # 月 → [[Σ(TP/LT×出荷数), Σ出荷数, Σ(TP×出荷数)], {その月を含むファイル名: 期末現金}]
+        self._rows = {}     # 月 → (加重平均TP/LT, 期末現金残高, 現金増減)
+        self._points = {}   # 月 → 回帰に入っている (x, y)
+        self._stats = np.zeros(5)  # n, Σx, Σy, Σxx, Σxy
+        self._lock = threading.Lock()
+
+    # --- フォルダの走査：追加・更新・削除されたファイルだけを処理する ---
+    def refresh(self):
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return []
+            seen = {}
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith(".csv"):
+                        stat = entry.stat()
+                        seen[entry.name] = (stat.st_mtime_ns, stat.st_size)
+
+            changed = sorted(name for name, sig in seen.items() if self._files.get(name) != sig)
+            removed = sorted(set(self._files) - set(seen))
+            if not changed and not removed:
+                return []
+
+            touched, ingested = set(), []
+            for name in removed:
+                touched |= self._drop(name)
+                self._files.pop(name)
+                self.errors.pop(name, None)
+            for name in changed:
+                try:
+                    part = cash_metrics.monthly_sums(pd.read_csv(os.path.join(self.directory, name)))
+                except Exception as e:
+                    # 書き込み途中のファイルなどは次回の走査で再試行する
+                    self.errors[name] = str(e)
+                    continue
+                touched |= self._drop(name)
+                touched |= self._add(name, part)
+                self._files[name] = seen[name]
+                self.errors.pop(name, None)
+                ingested.append(name)
+
+            if touched:
+                self._update(touched)
+                self.version += 1
+            return ingested
+
+    def _drop(self, name):
+        part = self._parts.pop(name, None)
+        if part is None:
+            return set()
+        for month, *totals, _ in part.itertuples(index=False):
+            sums = self._sums[month]
+            sums[0] = [a - b for a, b in zip(sums[0], totals)]
+            sums[1].pop(name, None)
+        return set(part["月"])
+
+    def _add(self, name, part):
+        self._parts[name] = part
+        for month, *totals, cash in part.itertuples(index=False):
+            if month not in self._sums:
+                self._sums[month] = [[0.0] * len(totals), {}]
+                bisect.insort(self._months, month)
+            sums = self._sums[month]
+            sums[0] = [a + b for a, b in zip(sums[0], totals)]
+            sums[1][name] = cash
+        return set(part["月"])
+
+    # 変わった月以降だけ現金増減の連鎖をたどり直す（月末の追加なら最終月のみ）
+    def _update(self, touched):
+        start = min(touched)
+        for month in [m for m in touched if not self._sums[m][1]]:
+            # どのファイルにも残っていない月（翌月以降の増減は取り直す）
+            self._months.remove(month)
+            del self._sums[month]
+            self._rows.pop(month, None)
+            self._set_point(month, None)
+
+        start = bisect.bisect_left(self._months, start)
+        previous = np.nan
+        for month in reversed(self._months[:start]):
+            if not np.isnan(self._rows[month][1]):
+                previous = self._rows[month][1]
+                break
+        for month in self._months[start:]:
+            (numerator, shipped, _), cash_by_file = self._sums[month]
+            x = float(cash_metrics.weighted_average([numerator], [shipped])[0])
+            # 同じ月が複数ファイルにある場合はファイル名順で最初の非欠損の期末現金
+            cash = next((cash_by_file[f] for f in sorted(cash_by_file) if not np.isnan(cash_by_file[f])), np.nan)
+            diff = cash - previous
+            row = (x, cash, diff)
+            if month not in touched and self._rows.get(month) == row:
+                # 以降の月は前月残高が変わらないので打ち切り
+                if not np.isnan(cash):
+                    break
+            self._rows[month] = row
+            self._set_point(month, None if np.isnan(diff) else (x, diff))
+            if not np.isnan(cash):
+                previous = cash
+
+    def _set_point(self, month, point):
+        old = self._points.pop(month, None)
+        if old is not None:
+            x, y = old
+            self._stats -= (1, x, y, x * x, x * y)
+        if point is not None:
+            x, y = point
+            self._stats += (1, x, y, x * x, x * y)
+            self._points[month] = point
+
+    # --- 結果 ---
+    def result(self):
+        with self._lock:
+            rows = [self._rows[m] for m in self._months]
+            return pd.DataFrame(rows, columns=["加重平均TP/LT", "期末現金残高", "現金増減"]).assign(月=self._months)[
+                ["月", "加重平均TP/LT", "期末現金残高", "現金増減"]]
+
+    def totals(self):
+        # 月別の Σ(TP/LT×出荷数)・Σ出荷数・Σ(TP×出荷数)（期間別集計の索引用）
+        with self._lock:
+            return pd.DataFrame([self._sums[m][0] for m in self._months],
+                                columns=["TP/LT×出荷数", "出荷数", "TP×出荷数"]).assign(月=self._months)
+
+    def fit(self):
+        # 現金増減 = 傾き × 加重平均TP/LT + 切片（np.polyfit 1次と同じ最小二乗解）
+        with self._lock:
+            n, sx, sy, sxx, sxy = self._stats
+        if n < 1:
+            return None
+        denominator = n * sxx - sx * sx
+        slope = (n * sxy - sx * sy) / denominator if abs(denominator) > 1e-9 * max(n * sxx, 1.0) else 0.0
+        return {"件数": int(round(n)), "傾き": slope, "切片": (sy - slope * sx) / n, "平均現金増減": sy / n}
+
+    def files(self):
+        with self._lock:
+            return pd.DataFrame(
+                [(name, len(self._parts[name])) for name in sorted(self._parts)],
+                columns=["ファイル", "月数"])
+
+
+# 監視できるのは CASH_WATCH_DIR とその下のフォルダだけ。入力されたパスはシンボリックリンクを解決してから確かめる
+def resolve(directory):
+    root = os.path.realpath(DEFAULT_DIR)
+    path = os.path.realpath(directory)
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"監視できるのは {root} とその下のフォルダだけです。")
+    return path
+
+
+# 監視中のフォルダはセッションをまたいで共有し、古いものから MAX_WATCHES 個を超えた分は捨てる
+@st.cache_resource(max_entries=MAX_WATCHES)
+def _watch(path):
+    return WatchFolder(path)
+
+
+def get_watch(directory):
+    return _watch(resolve(directory))
+
+
+# 一定間隔でフォルダを確認し、他のセッションの取り込みも含めて更新があればページを再描画する
+@st.fragment(run_every=POLL_SECONDS)
+def poll(watch, seen_key):
+    watch.refresh()
+    if watch.version != st.session_state.get(seen_key):
+        st.rerun()
+    st.caption(f"📂 {watch.directory} を {POLL_SECONDS:g} 秒ごとに確認しています")
+    for name, message in watch.errors.items():
+        st.warning(f"{name} を読み込めませんでした（次回再試行）：{message}")
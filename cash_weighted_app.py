@@ -2,10 +2,12 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-from matplotlib import font_manager as fm
+import cash_ledger
+import cash_metrics
+import cash_engine
 
 # 日本語フォント設定
-plt.rcParams['font.family'] = 'Noto Sans CJK JP'
+cash_engine.setup_fonts()
 
 st.title("キャッシュ生産性と現金増減の分析")
 
@@ -32,33 +34,25 @@ for i in range(months):
     monthly_product_data[i] = df
 
 # --- 計算処理 ---
-results = []
+ledger = cash_ledger.MonthlyLedger.allocate([f"{i+1}ヶ月目" for i in range(months)],
+                                            ["TP合計（万円）", "加重平均キャッシュ生産性（TP/LT）", "現金増減額（万円）"])
 
 for i in range(months):
-    df = monthly_product_data[i]
-    df = df[(df["TP（万円）"] > 0) & (df["LT（日）"] > 0)]
-    tp_total = df["TP（万円）"].sum()
-    weighted_avg = (df["TP（万円）"] / df["LT（日）"]).sum()
-    cash_diff = cash_data[i+1] - cash_data[i]
-    results.append({
-        "月": f"{i+1}ヶ月目",
-        "TP合計（万円）": tp_total,
-        "加重平均キャッシュ生産性（TP/LT）": weighted_avg,
-        "現金増減額（万円）": cash_diff
-    })
+    tp_total, weighted_avg = cash_metrics.tp_lt_sum(monthly_product_data[i])
+    ledger["TP合計（万円）"][i] = tp_total
+    ledger["加重平均キャッシュ生産性（TP/LT）"][i] = weighted_avg
+    ledger["現金増減額（万円）"][i] = cash_data[i+1] - cash_data[i]
 
 # --- 表示 ---
 st.markdown("### 3. 分析結果")
-result_df = pd.DataFrame(results)
+result_df = ledger.frame()
 st.dataframe(result_df, use_container_width=True)
 
 # --- グラフ表示 ---
 st.markdown("### 4. グラフ分析")
 fig, ax = plt.subplots()
-ax.scatter(result_df["加重平均キャッシュ生産性（TP/LT）"], result_df["現金増減額（万円）"], s=100)
-
-for i, row in result_df.iterrows():
-    ax.annotate(row["月"], (row["加重平均キャッシュ生産性（TP/LT）"], row["現金増減額（万円）"]))
+ax.scatter(ledger["加重平均キャッシュ生産性（TP/LT）"], ledger["現金増減額（万円）"], s=100)
+ledger.annotate(ax, "加重平均キャッシュ生産性（TP/LT）", "現金増減額（万円）")
 
 ax.set_xlabel("加重平均キャッシュ生産性")
 ax.set_ylabel("現金増減額")
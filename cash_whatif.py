@@ -0,0 +1,47 @@
+from collections import namedtuple
+
+import numpy as np
+import streamlit as st
+
+# 感度分析（TP/LT改善率・一括現金注入）の結果は両パラメータに対して線形なので、
+# データセットごとに「基準値」と「各パラメータ1単位あたりの寄与」を一度だけ求め、
+# スライダー操作時は 基準 + 改善率×寄与 + 注入額×寄与 の小さな線形結合で評価する。
+LinearBasis = namedtuple("LinearBasis", ["base", "per_rate", "per_injection"])
+HORIZON = 12
+RATES = np.arange(-100, 101)
+
+
+@st.cache_data(show_spinner=False)
+def build_basis(tp_lt, cash_change, last_cash, months, horizon=HORIZON, rate_on_cash=True):
+    tp_lt = np.asarray(tp_lt, dtype=float)
+    cash_change = np.asarray(cash_change, dtype=float)
+    per_month_injection = 1.0 / months if months > 0 else 0.0
+    steps = np.arange(horizon + 1, dtype=float)
+
+    # 改善率は％単位（1 = +1%）
+    cash_per_rate = cash_change / 100 if rate_on_cash else np.zeros_like(cash_change)
+    mean_change = cash_change.mean() if len(cash_change) else 0.0
+    mean_per_rate = cash_per_rate.mean() if len(cash_per_rate) else 0.0
+    # 将来残高：現在残高 + 経過月数 × 平均現金増減
+    future = LinearBasis(last_cash + steps * mean_change, steps * mean_per_rate, steps * per_month_injection)
+    return {
+        "tp_lt": LinearBasis(tp_lt, tp_lt / 100, np.zeros_like(tp_lt)),
+        "cash_change": LinearBasis(cash_change, cash_per_rate, np.full_like(cash_change, per_month_injection)),
+        "future": future,
+        "future_by_rate": future.base + RATES[:, None] * future.per_rate,
+    }
+
+
+def evaluate(basis, rate, injection):
+    return basis.base + rate * basis.per_rate + injection * basis.per_injection
+
+
+# スライダー全範囲（改善率 -100%〜+100%）の将来残高を事前計算した表から引く
+def future_at(bases, rate, injection):
+    row = int(round(rate)) - RATES[0]
+    return bases["future_by_rate"][row] + injection * bases["future"].per_injection
+
+
+def zero_month(future_balance):
+    below = np.asarray(future_balance) <= 0
+    return int(np.argmax(below)) if below.any() else None
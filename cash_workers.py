@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# ワーカープロセスの起動口：大きなCSVの並列解析（cash_parallel）とレポートの並列作成（cash_report）のプール。
+# spawn の子プロセスは起動したときの親の __main__ を読み直す。Streamlit は実行中のスクリプト（streamlit_app.py）を
+# __main__ に置くので、プールは Streamlit を動かす前（このファイルや cash_report.py をスクリプトとして起動したとき）に
+# 作って全ワーカーを起動しておく。ワーカーが落ちたプールは次の依頼のときに同じ設定で作り直す
+# （streamlit_app.py の本体は if __name__ == "__main__": の中なので、子プロセスが読み直しても何もしない）。
+#   python cash_workers.py [streamlit run のオプション]    # streamlit run streamlit_app.py ＋ ワーカー
+# プールがない（streamlit run で起動した）ときは、各処理を呼び出し元のスレッドで順に行う。
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_pools = {}   # 名前 → プール
+_specs = {}   # 名前 → (ワーカー数, initializer)
+_lock = threading.Lock()
+
+
+def _create(workers, initializer):
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=initializer)
+    # プールは依頼が来たときに足りない分のワーカーを起動するので、ここで全ワーカー分の依頼を出して起動しきっておく
+    for future in [pool.submit(os.getpid) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+# 起動するスクリプトの if __name__ == "__main__": の中から呼ぶ（子プロセスはそのスクリプトを読み直すだけで何もしない）
+def start(name, workers, initializer=None):
+    if workers < 2:
+        return None
+    pool = _create(workers, initializer)
+    with _lock:
+        _pools[name] = pool
+        _specs[name] = (workers, initializer)
+    return pool
+
+
+def get(name):
+    with _lock:
+        return _pools.get(name)
+
+
+# 依頼を出す。ワーカーが落ちていたらプールを作り直して1回だけ出し直す
+def submit(name, fn, *args):
+    pool = get(name)
+    try:
+        return pool.submit(fn, *args)
+    except BrokenProcessPool:
+        return _restart(name, pool).submit(fn, *args)
+
+
+def _restart(name, broken):
+    with _lock:
+        # 他のスレッドが先に作り直していればそれを使う
+        if _pools.get(name) is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            _pools[name] = _create(*_specs[name])
+        return _pools[name]
+
+
+def run(argv):
+    import cash_parallel
+    import cash_report
+    from streamlit.web import cli
+
+    cash_parallel.start_workers()
+    cash_report.start_workers()
+    cli.main(["run", os.path.join(HERE, "streamlit_app.py"), *argv], prog_name="streamlit")
+
+
+if __name__ == "__main__":
+    # プールはモジュール cash_workers に持たせる（__main__ として読み込んだこのファイルとは別のモジュールになる）
+    import cash_workers
+    cash_workers.run(sys.argv[1:])
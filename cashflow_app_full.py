@@ -1,10 +1,15 @@
-
 import streamlit as st
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
+import cash_profiler
+import cash_engine
+import cash_watch
+import cash_rollup
+import cash_contrib
+import cash_service
+import cash_parallel
 
 st.set_page_config(page_title="キャッシュフロー倒産予測", layout="wide")
+cash_engine.setup_fonts()
 st.title("🏭 月別キャッシュフロー生産性・倒産予測・感度分析")
 
 st.markdown("""
@@ -16,43 +21,54 @@ st.markdown("""
 4. TP/LT感度分析シミュレーション  
 """)
 
-uploaded_file = st.file_uploader("📥 CSVファイルをアップロード", type=["csv"])
-
-if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
-    st.success("✅ ファイルを読み込みました")
-    st.dataframe(df)
-
-    df['現金残高（期末）'] = pd.to_numeric(df['現金残高（期末）'], errors='coerce')
-    df['スループット（TP）'] = pd.to_numeric(df['スループット（TP）'], errors='coerce')
-    df['リードタイム（LT）'] = pd.to_numeric(df['リードタイム（LT）'], errors='coerce')
-    df['出荷数'] = pd.to_numeric(df['出荷数'], errors='coerce')
-
-    results = []
-    months = sorted(df['月（YYYY-MM）'].unique())
-    prev_cash = None
-
-    for month in months:
-        sub_df = df[df['月（YYYY-MM）'] == month]
-        sub_df['TP/LT'] = sub_df['スループット（TP）'] / sub_df['リードタイム（LT）']
-        sub_df['weighted'] = sub_df['TP/LT'] * sub_df['出荷数']
-        total_shipped = sub_df['出荷数'].sum()
-        weighted_avg = sub_df['weighted'].sum() / total_shipped if total_shipped else 0
-        cash = sub_df['現金残高（期末）'].dropna().values
-        cash = cash[0] if len(cash) > 0 else None
-        cash_diff = cash - prev_cash if prev_cash is not None and cash is not None else None
-        prev_cash = cash if cash is not None else prev_cash
-        results.append({
-            "月": month,
-            "加重平均TP/LT": round(weighted_avg, 2),
-            "期末現金残高": cash,
-            "現金増減": cash_diff
-        })
-
-    result_df = pd.DataFrame(results)
+profiler = cash_profiler.Profiler("cashflow_app_full")
+source = st.radio("データの取り込み方法", ["CSVアップロード", "フォルダ監視"], horizontal=True)
+result_df = fit = None
+
+if source == "CSVアップロード":
+    uploaded_file = st.file_uploader("📥 CSVファイルをアップロード", type=["csv"])
+    if uploaded_file is not None:
+        cash_engine.remember_upload("monthly", uploaded_file)
+    elif cash_engine.current_upload("monthly"):
+        st.caption(f"📄 {cash_engine.current_upload('monthly').name}（読み込み済み）")
+
+    loaded, job = cash_engine.load("monthly", cash_engine.parse_monthly, "月別集計")
+    if loaded is not None:
+        df, result_df = loaded
+        rollup_index = cash_rollup.csv_index(cash_engine.current_upload("monthly").digest, df, result_df)
+        profiler.add_job(job, {"CSV解析": "ingest", cash_parallel.MONTHLY_STAGE: "ingest"}, default="aggregate")
+        st.success("✅ ファイルを読み込みました")
+        with profiler.stage("render", "st.dataframe"):
+            st.dataframe(df)
+else:
+    # 月次CSVをフォルダに置くと、新しいファイルの月だけを追加で集計する
+    directory = st.text_input("📂 監視するフォルダ", value=cash_watch.DEFAULT_DIR)
+    try:
+        watch = cash_watch.get_watch(directory)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    with profiler.stage("ingest", "フォルダ差分取り込み"):
+        watch.refresh()
+    seen_key = f"_cash_watch_seen:{watch.directory}"
+    st.session_state[seen_key] = watch.version
+    cash_watch.poll(watch, seen_key)
+    files = watch.files()
+    with st.expander(f"取り込み済みファイル（{len(files)}件）"):
+        st.dataframe(files, use_container_width=True)
+    if files.empty:
+        st.info(f"💡 {watch.directory} に月次CSVを置くと自動で取り込みます。")
+    else:
+        result_df, fit = watch.result(), watch.fit()
+        rollup_index = cash_rollup.build_index(cash_rollup.totals_measures(watch.totals()), result_df)
+
+if result_df is not None:
     st.subheader("📈 月別指標")
     st.dataframe(result_df)
 
+    st.subheader("📅 期間別集計")
+    cash_rollup.show_rollups(rollup_index, "full_rollup")
+
     # グラフ1：散布図（加重平均TP/LT vs 現金増減）
     st.subheader("📉 散布図：加重平均キャッシュ生産性 vs 現金増減額")
     chart_df = result_df.dropna()
@@ -60,12 +76,29 @@ if uploaded_file is not None:
     ax.scatter(chart_df["加重平均TP/LT"], chart_df["現金増減"])
     ax.set_xlabel("加重平均TP/LT")
     ax.set_ylabel("現金増減額")
-    st.pyplot(fig)
+    with profiler.stage("render", "散布図"):
+        st.pyplot(fig)
+
+    if source == "CSVアップロード":
+        # 製品別の行はアップロードしたCSVのみ（フォルダ監視は月別合計だけを保持）
+        st.subheader("🔍 製品別の寄与分析：現金増減と連動する製品")
+        if "製品名" not in df.columns:
+            st.info("💡 CSVに「製品名」列を加えると、製品別の寄与分析を表示します。")
+        else:
+            with profiler.stage("aggregate", "製品別寄与"):
+                cash_contrib.show_contributions(cash_contrib.csv_products(df), result_df["月"],
+                                                result_df["現金増減"].to_numpy(), "full_contrib")
 
     # 倒産時期予測
     st.subheader("⚠️ 倒産（資金ショート）時期の予測")
-    current_cash = result_df.iloc[-1]["期末現金残高"]
-    avg_diff = result_df["現金増減"].dropna().mean()
+    with profiler.stage("forecast", "平均減少ペース"):
+        current_cash = result_df.iloc[-1]["期末現金残高"]
+        # フォルダ監視では取り込み時に更新した累計から求める
+        if fit:
+            avg_diff = fit["平均現金増減"]
+        else:
+            avg_diff = cash_service.call("forecast", last_cash=float(current_cash),
+                                         changes=result_df["現金増減"].tolist())["平均増減"]
     if avg_diff < 0:
         months_until_shortage = int(current_cash / abs(avg_diff))
         st.warning(f"❌ 資金ショートまで約 {months_until_shortage} ヶ月です（平均減少額: {int(avg_diff)}円/月）")
@@ -75,11 +108,18 @@ if uploaded_file is not None:
     # 感度分析
     st.subheader("📊 感度分析：TP/LTの改善による現金への影響")
     rate_change = st.slider("TP/LT改善率（-100%〜+100%）", -1.0, 1.0, 0.0, 0.1)
-    sim_df = chart_df.copy()
-    sim_df["仮想TP/LT"] = sim_df["加重平均TP/LT"] * (1 + rate_change)
-
-    slope, intercept = np.polyfit(sim_df["加重平均TP/LT"], sim_df["現金増減"], 1)
-    sim_df["仮想現金増減"] = sim_df["仮想TP/LT"] * slope + intercept
+    with profiler.stage("sensitivity", "回帰＋シミュレーション"):
+        sim_df = chart_df.copy()
+        sim_df["仮想TP/LT"] = sim_df["加重平均TP/LT"] * (1 + rate_change)
+
+        if fit:
+            slope, intercept = fit["傾き"], fit["切片"]
+            sim_df["仮想現金増減"] = sim_df["仮想TP/LT"] * slope + intercept
+        else:
+            # 回帰は計算サービス（未設定ならこのプロセス）で行う。同じ入力は結果キャッシュから返る
+            sensitivity = cash_service.call("sensitivity", x=sim_df["加重平均TP/LT"].tolist(),
+                                            y=sim_df["現金増減"].tolist(), rate=rate_change)
+            sim_df["仮想現金増減"] = sensitivity["仮想現金増減"]
 
     fig2, ax2 = plt.subplots()
     ax2.scatter(sim_df["仮想TP/LT"], sim_df["仮想現金増減"], color="green", label="仮想現金増減")
@@ -87,7 +127,10 @@ if uploaded_file is not None:
     ax2.set_ylabel("仮想現金増減額")
     ax2.axhline(0, color="gray", linestyle="--")
     ax2.legend()
-    st.pyplot(fig2)
+    with profiler.stage("render", "感度分析"):
+        st.pyplot(fig2)
 
-else:
+elif source == "CSVアップロード":
     st.info("💡 CSVファイルをアップロードしてください。")
+
+profiler.finish()
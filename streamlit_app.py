@@ -0,0 +1,32 @@
+import streamlit as st
+import cash_engine
+
+# --- 統合アプリ（マルチページ） ---
+# 各分析スクリプトを1プロセスのページとして束ね、計算エンジン・データセットキャッシュ・
+# フォント設定を全ページで共有する。各スクリプトは単体でも `streamlit run` で起動できる。
+# 本体は if __name__ == "__main__": の中に置く（cash_workers のワーカープロセスがこのファイルを読み直しても何もしない）。
+if __name__ == "__main__":
+    st.set_page_config(page_title="キャッシュ生産性分析", layout="wide")
+    cash_engine.get_engine()
+
+    pages = {
+        "CSV分析": [
+            st.Page("app.py", title="キャッシュ生産性 × 資金ショート予測", icon="🏭", default=True),
+            st.Page("cashflow_app_full.py", title="月別キャッシュフロー・倒産予測", icon="📈"),
+        ],
+        "月別入力": [
+            st.Page("cash_app_forecast.py", title="将来残高予測", icon="🔮"),
+            st.Page("cash_app_sensitivity.py", title="感度分析", icon="📊"),
+            st.Page("cash_product_app.py", title="製品別TP/LT傾向", icon="📦"),
+            st.Page("cash_tp_weighted_app.py", title="出荷量加重TP/LT", icon="⚖️"),
+            st.Page("cash_weighted_app.py", title="加重平均TP/LT", icon="🧮"),
+        ],
+        "資金ショート警告": [
+            st.Page("cash_alert_app.py", title="資金ショート警告", icon="🚨"),
+            st.Page("cash_full_app.py", title="キャッシュフロー分析（完全版）", icon="🗂️"),
+            st.Page("cash_group_app.py", title="グループ連結", icon="🏢"),
+            st.Page("cash_report_app.py", title="月次レポート一括作成", icon="🖨️"),
+        ],
+    }
+
+    st.navigation(pages).run()